@@ -18,6 +18,8 @@ from pystart.common import (  # TODO: try to get rid of this
     ALL_EXPLAINED_STATUS_CODE,
     IGNORED_FILES_AND_DIRS,
     PROCESS_ACK,
+    TEXT_WIRE_FORMAT,
+    WIRE_FORMAT_ENV_VAR,
     BackendEvent,
     CommandToBackend,
     EOFCommand,
@@ -51,6 +53,9 @@ class BaseBackend(ABC):
         self._interrupt_lock = threading.Lock()
         self._last_progress_reporting_time = 0
         self._last_sent_output = ""
+        # front-end tells which message format it can read
+        # (not leaving it in the environment of user programs)
+        self._wire_format = os.environ.pop(WIRE_FORMAT_ENV_VAR, TEXT_WIRE_FORMAT)
         self._init_command_reader()
 
     def _init_command_reader(self):
@@ -188,7 +193,7 @@ class BaseBackend(ABC):
                 return InlineResponse(command_name=command.name, **args)
 
     def send_message(self, msg: MessageFromBackend) -> None:
-        sys.stdout.write(serialize_message(msg) + "\n")
+        sys.stdout.write(serialize_message(msg, wire_format=self._wire_format) + "\n")
         sys.stdout.flush()
 
     def _send_output(self, data, stream_name):
@@ -7,12 +7,13 @@ import sys
 import time
 import tkinter as tk
 from logging import getLogger
-from tkinter import messagebox
-from typing import Dict, Union  # @UnusedImport
+from tkinter import messagebox, ttk
+from typing import Dict, Optional, Union  # @UnusedImport
 
 from pystart import get_workbench, roughparse, tktextext, ui_utils
-from pystart.common import TextRange
+from pystart.common import BreakpointInfo, TextRange
 from pystart.languages import tr
+from pystart.misc_utils import running_on_mac_os
 from pystart.tktextext import EnhancedText
 from pystart.ui_utils import EnhancedTextWithLogging, ask_string, compute_tab_stops
 
@@ -20,6 +21,8 @@ _syntax_options = {}  # type: Dict[str, Union[str, int]]
 # BREAKPOINT_SYMBOL = "•" # Bullet
 # BREAKPOINT_SYMBOL = "○" # White circle
 BREAKPOINT_SYMBOL = "●"  # Black circle
+# for breakpoints with condition, hit count or log message
+CONDITIONAL_BREAKPOINT_SYMBOL = "◆"  # Black diamond
 
 OLD_MAC_LINEBREAK = re.compile("\r(?!\n)")
 UNIX_LINEBREAK = re.compile("(?<!\r)\n")
@@ -175,8 +178,16 @@ class CodeView(tktextext.EnhancedTextFrame):
         self._reload_theme_options()
         self._start_toggle_breakpoint_index = None
         self._last_toggle_breakpoint_time = 0
+        # Properties of non-plain breakpoints by the name of the text tag marking their line.
+        # (Tags keep following the line when the text gets edited.)
+        self._breakpoint_infos: Dict[str, BreakpointInfo] = {}
+        self._breakpoint_info_tag_counter = 0
         self._gutter.bind("<Button-1>", self._start_toggle_breakpoint, True)
         self._gutter.bind("<ButtonRelease-1>", self._consider_toggle_breakpoint, True)
+        self._gutter.bind("<Button-3>", self._edit_breakpoint_properties, True)
+        if running_on_mac_os():
+            self._gutter.bind("<2>", self._edit_breakpoint_properties, True)
+            self._gutter.bind("<Control-1>", self._edit_breakpoint_properties, True)
         # self.text.tag_configure("breakpoint_line", background="pink")
         self._gutter.tag_configure("breakpoint", foreground="crimson")
 
@@ -301,20 +312,89 @@ class CodeView(tktextext.EnhancedTextFrame):
         end_index = index + " lineend"
 
         if self.text.tag_nextrange("breakpoint_line", start_index, end_index):
-            self.text.tag_remove("breakpoint_line", start_index, end_index)
-        else:
-            line_content = self.text.get(start_index, end_index).strip()
-            if line_content and line_content[0] != "#":
-                self.text.tag_add("breakpoint_line", start_index, end_index)
+            self._remove_breakpoint(start_index, end_index)
+        elif self._can_have_breakpoint(start_index, end_index):
+            self._set_breakpoint(start_index, end_index, BreakpointInfo())
 
         self.update_gutter(clean=True)
         self._last_toggle_breakpoint_time = time.time()
 
+    def _edit_breakpoint_properties(self, event):
+        index = "@%d,%d" % (event.x, event.y)
+        start_index = index + " linestart"
+        end_index = index + " lineend"
+
+        if not self._can_have_breakpoint(start_index, end_index):
+            return
+
+        # remember the line, because the dialog may change the view
+        start_index = self.text.index(start_index)
+        end_index = self.text.index(end_index)
+        lineno = int(start_index.split(".")[0]) + self._first_line_number - 1
+
+        dlg = BreakpointPropertiesDialog(
+            self.winfo_toplevel(),
+            lineno,
+            self._get_breakpoint_info(start_index, end_index) or BreakpointInfo(),
+        )
+        ui_utils.show_dialog(dlg, self.winfo_toplevel())
+        if dlg.result is not None:
+            self._set_breakpoint(start_index, end_index, dlg.result)
+            self.update_gutter(clean=True)
+
+        return "break"
+
+    def _can_have_breakpoint(self, start_index, end_index):
+        line_content = self.text.get(start_index, end_index).strip()
+        return line_content and line_content[0] != "#"
+
+    def _set_breakpoint(self, start_index, end_index, breakpoint_info: BreakpointInfo) -> None:
+        self._remove_breakpoint(start_index, end_index)
+        self.text.tag_add("breakpoint_line", start_index, end_index)
+        if not breakpoint_info.is_plain():
+            self._breakpoint_info_tag_counter += 1
+            tag = "breakpoint_info_%d" % self._breakpoint_info_tag_counter
+            self._breakpoint_infos[tag] = breakpoint_info
+            self.text.tag_add(tag, start_index, end_index)
+
+    def _remove_breakpoint(self, start_index, end_index) -> None:
+        self.text.tag_remove("breakpoint_line", start_index, end_index)
+        tag = self._get_breakpoint_info_tag(start_index, end_index)
+        if tag is not None:
+            self.text.tag_delete(tag)
+            del self._breakpoint_infos[tag]
+
+    def _forget_deleted_breakpoint_infos(self) -> None:
+        for tag in list(self._breakpoint_infos):
+            if not self.text.tag_ranges(tag):
+                # the line was deleted
+                self.text.tag_delete(tag)
+                del self._breakpoint_infos[tag]
+
+    def _get_breakpoint_info_tag(self, start_index, end_index) -> Optional[str]:
+        for tag in self._breakpoint_infos:
+            if self.text.tag_nextrange(tag, start_index, end_index):
+                return tag
+
+        return None
+
+    def _get_breakpoint_info(self, start_index, end_index) -> Optional[BreakpointInfo]:
+        if not self.text.tag_nextrange("breakpoint_line", start_index, end_index):
+            return None
+
+        tag = self._get_breakpoint_info_tag(start_index, end_index)
+        if tag is None:
+            return BreakpointInfo()
+        else:
+            return self._breakpoint_infos[tag]
+
     def _clean_selection(self):
         self.text.tag_remove("sel", "1.0", "end")
         self._gutter.tag_remove("sel", "1.0", "end")
 
     def _text_changed(self, event):
+        if self.text._last_event_changed_line_count:
+            self._forget_deleted_breakpoint_infos()
         self.update_gutter(
             clean=self.text._last_event_changed_line_count
             and self.text.tag_ranges("breakpoint_line")
@@ -329,10 +409,13 @@ class CodeView(tktextext.EnhancedTextFrame):
 
             yield str(lineno), ()
 
-            if self.text.tag_nextrange("breakpoint_line", linestart, linestart + " lineend"):
+            breakpoint_info = self._get_breakpoint_info(linestart, linestart + " lineend")
+            if breakpoint_info is None:
+                yield " ", ()
+            elif breakpoint_info.is_plain():
                 yield BREAKPOINT_SYMBOL, ("breakpoint",)
             else:
-                yield " ", ()
+                yield CONDITIONAL_BREAKPOINT_SYMBOL, ("breakpoint",)
 
     def select_range(self, text_range):
         self.text.tag_remove("sel", "1.0", tk.END)
@@ -363,8 +446,16 @@ class CodeView(tktextext.EnhancedTextFrame):
     def get_breakpoint_line_numbers(self):
         result = set()
         for num_line in self._gutter.get("1.0", "end").splitlines():
-            if BREAKPOINT_SYMBOL in num_line:
-                result.add(int(num_line.replace(BREAKPOINT_SYMBOL, "")))
+            for symbol in [BREAKPOINT_SYMBOL, CONDITIONAL_BREAKPOINT_SYMBOL]:
+                if symbol in num_line:
+                    result.add(int(num_line.replace(symbol, "")))
+        return result
+
+    def get_breakpoints(self) -> Dict[int, BreakpointInfo]:
+        result = {}
+        for lineno in self.get_breakpoint_line_numbers():
+            linestart = "%d.0" % (lineno - self._first_line_number + 1)
+            result[lineno] = self._get_breakpoint_info(linestart, linestart + " lineend")
         return result
 
     def get_selected_range(self):
@@ -402,6 +493,66 @@ class CodeView(tktextext.EnhancedTextFrame):
             self._gutter.tag_configure("breakpoint", _syntax_options["breakpoint"])
 
 
+class BreakpointPropertiesDialog(ui_utils.CommonDialogEx):
+    def __init__(self, master, lineno: int, breakpoint_info: BreakpointInfo):
+        super().__init__(master)
+        self.result: Optional[BreakpointInfo] = None
+
+        margin = self.get_large_padding()
+        spacing = margin // 2
+
+        self.title(tr("Breakpoint at line %d") % lineno)
+
+        self._condition_var = tk.StringVar(value=breakpoint_info.condition or "")
+        self._hit_count_var = tk.StringVar(
+            value="" if breakpoint_info.hit_count is None else str(breakpoint_info.hit_count)
+        )
+        self._log_message_var = tk.StringVar(value=breakpoint_info.log_message or "")
+
+        fields = [
+            (tr("Stop only when this expression is true"), self._condition_var),
+            (tr("Stop only from this hit on"), self._hit_count_var),
+            (
+                tr("Don't stop, but print this message ({expressions} get evaluated)"),
+                self._log_message_var,
+            ),
+        ]
+        for i, (label, var) in enumerate(fields):
+            ttk.Label(self.main_frame, text=label).grid(
+                row=2 * i, column=1, columnspan=2, sticky="w", padx=margin, pady=(margin, 0)
+            )
+            entry = ttk.Entry(self.main_frame, textvariable=var, width=50)
+            entry.grid(row=2 * i + 1, column=1, columnspan=2, sticky="we", padx=margin)
+            entry.bind("<Return>", self.on_ok, True)
+            entry.bind("<KP_Enter>", self.on_ok, True)
+            if i == 0:
+                entry.focus_set()
+
+        self.ok_button = ttk.Button(
+            self.main_frame, text=tr("OK"), command=self.on_ok, default="active"
+        )
+        self.ok_button.grid(row=6, column=1, padx=(margin, spacing), pady=margin, sticky="e")
+        self.cancel_button = ttk.Button(self.main_frame, text=tr("Cancel"), command=self.on_close)
+        self.cancel_button.grid(row=6, column=2, padx=(0, margin), pady=margin, sticky="e")
+
+        self.main_frame.columnconfigure(1, weight=1)
+
+    def on_ok(self, event=None):
+        hit_count = self._hit_count_var.get().strip()
+        if hit_count and (not hit_count.isdigit() or int(hit_count) < 1):
+            messagebox.showerror(
+                tr("Invalid hit count"), tr("Hit count must be a positive integer"), master=self
+            )
+            return
+
+        self.result = BreakpointInfo(
+            condition=self._condition_var.get().strip() or None,
+            hit_count=int(hit_count) if hit_count else None,
+            log_message=self._log_message_var.get() or None,
+        )
+        self.destroy()
+
+
 def set_syntax_options(syntax_options):
     global _syntax_options
     _syntax_options = syntax_options
@@ -19,9 +19,16 @@ logger = getLogger(__name__)
 STRING_PSEUDO_FILENAME = "<string>"
 REPL_PSEUDO_FILENAME = "<stdin>"
 MESSAGE_MARKER = "\x02"
+BINARY_MESSAGE_MARKER = "\x03"
+TEXT_WIRE_FORMAT = "text"
+BINARY_WIRE_FORMAT = "binary"
+# Set by the front-end when it is able to read binary messages
+WIRE_FORMAT_ENV_VAR = "PYSTART_WIRE_FORMAT"
 OBJECT_LINK_START = "[object_link_for_thonny=%d]"
 OBJECT_LINK_END = "[/object_link_for_thonny]"
 PROCESS_ACK = "OK"
+# how many elements or entries get_object_info returns at once
+OBJECT_INFO_PAGE_SIZE = 500
 ALL_EXPLAINED_STATUS_CODE = 193
 
 NBSP = "\u00a0"
@@ -79,6 +86,22 @@ class DistInfo:
     complete: bool = True
 
 
+@dataclass(frozen=True)
+class BreakpointInfo:
+    """Properties of a breakpoint. Default values give an unconditional breakpoint"""
+
+    # expression, which must hold for stopping
+    condition: Optional[str] = None
+    # stop only from this hit (counting the hits where condition holds)
+    hit_count: Optional[int] = None
+    # if given, then the breakpoint doesn't stop, but prints the message.
+    # Expressions in braces get evaluated like in f-strings.
+    log_message: Optional[str] = None
+
+    def is_plain(self) -> bool:
+        return self.condition is None and self.hit_count is None and self.log_message is None
+
+
 class Record:
     def __init__(self, **kw):
         self.__dict__.update(kw)
@@ -248,11 +271,21 @@ class InlineResponse(MessageFromBackend):
         self.event_type = self.command_name + "_response"
 
 
-def serialize_message(msg: Record, max_line_length=65536) -> str:
+def serialize_message(
+    msg: Record, max_line_length=65536, wire_format: str = TEXT_WIRE_FORMAT
+) -> str:
     # I want to transfer only ASCII chars because encodings are not reliable
     # (eg. can't find a way to specify PYTHONIOENCODING for cx_freeze'd program)
     # The possibility for splitting message into several lines is required because of
     # default (safe) window size in Paramiko (https://github.com/pystart/thonny/issues/1680)
+    if wire_format == BINARY_WIRE_FORMAT:
+        try:
+            return _serialize_binary_message(msg, max_line_length)
+        except (TypeError, ValueError):
+            # Message contains something the compact encoding doesn't know about.
+            # The text format can express anything with a re-evaluable repr.
+            logger.debug("Falling back to text format for %s", type(msg).__name__)
+
     msg_str = ascii(msg)
 
     lines = []
@@ -263,6 +296,13 @@ def serialize_message(msg: Record, max_line_length=65536) -> str:
 
 
 def parse_message(msg_string: str) -> Record:
+    if not msg_string.strip():
+        # eg. an empty line read from the pipe
+        raise ValueError("Empty message")
+
+    if msg_string[0] == BINARY_MESSAGE_MARKER:
+        return _parse_binary_message(msg_string)
+
     # DataFrames may have nan
     # pylint: disable=unused-variable
     nan = float("nan")  # @UnusedVariable
@@ -274,6 +314,306 @@ def parse_message(msg_string: str) -> Record:
     return eval(msg_string[msg_start:].replace("\n", ""))
 
 
+# Binary wire format
+# ------------------
+# Frame: BINARY_MESSAGE_MARKER + <payload length> + " " + <payload>, where payload is
+# base64 of marshal (format version 4, readable by all supported Pythons) and may be split
+# into several lines just like the text format.
+# Records and namedtuples are marshalled as tuples tagged with a reserved bytes object
+# in the first position. Plain tuples starting with such a bytes object get escaped.
+
+_WIRE_RECORD_TAG = b"\x00R"
+_WIRE_NAMEDTUPLE_TAG = b"\x00N"
+_WIRE_DATACLASS_TAG = b"\x00D"
+_WIRE_TUPLE_TAG = b"\x00T"
+_WIRE_MARSHAL_VERSION = 4
+
+_WIRE_NAMEDTUPLES = [ValueInfo, FrameInfo, TextRange]
+_WIRE_NAMEDTUPLE_INDICES = {cls: i for i, cls in enumerate(_WIRE_NAMEDTUPLES)}
+_WIRE_DATACLASSES = {"DistInfo": DistInfo, "BreakpointInfo": BreakpointInfo}
+_WIRE_ATOMIC_TYPES = {str, int, float, bool, type(None), bytes, complex}
+_wire_record_classes: Dict[str, type] = {}
+
+
+def _to_wire(value):
+    cls = value.__class__
+    if cls in _WIRE_ATOMIC_TYPES:
+        return value
+    elif cls is list:
+        return [_to_wire(item) for item in value]
+    elif cls is dict:
+        return {_to_wire(key): _to_wire(item) for key, item in value.items()}
+    elif cls is tuple:
+        result = tuple([_to_wire(item) for item in value])
+        if result and result[0].__class__ is bytes and result[0][:1] == b"\x00":
+            return (_WIRE_TUPLE_TAG,) + result
+        return result
+    elif cls is set or cls is frozenset:
+        return cls([_to_wire(item) for item in value])
+    elif cls in _WIRE_NAMEDTUPLE_INDICES:
+        return (
+            _WIRE_NAMEDTUPLE_TAG,
+            _WIRE_NAMEDTUPLE_INDICES[cls],
+            tuple([_to_wire(item) for item in value]),
+        )
+    elif isinstance(value, Record):
+        return (
+            _WIRE_RECORD_TAG,
+            cls.__name__,
+            {key: _to_wire(item) for key, item in value.__dict__.items()},
+        )
+    elif _WIRE_DATACLASSES.get(cls.__name__) is cls:
+        return (
+            _WIRE_DATACLASS_TAG,
+            cls.__name__,
+            {key: _to_wire(item) for key, item in value.__dict__.items()},
+        )
+    else:
+        raise TypeError("Can't encode %s in binary wire format" % cls.__name__)
+
+
+def _get_wire_record_class(name: str) -> type:
+    if name not in _wire_record_classes:
+        todo = [Record]
+        while todo:
+            cls = todo.pop()
+            _wire_record_classes.setdefault(cls.__name__, cls)
+            todo.extend(cls.__subclasses__())
+
+    return _wire_record_classes[name]
+
+
+def _from_wire(value):
+    cls = value.__class__
+    if cls is list:
+        return [_from_wire(item) for item in value]
+    elif cls is dict:
+        return {_from_wire(key): _from_wire(item) for key, item in value.items()}
+    elif cls is tuple:
+        if value and value[0].__class__ is bytes:
+            tag = value[0]
+            if tag == _WIRE_RECORD_TAG:
+                record_class = _get_wire_record_class(value[1])
+                # Don't call __init__, the dict already contains the final state
+                record = record_class.__new__(record_class)
+                record.__dict__.update({key: _from_wire(item) for key, item in value[2].items()})
+                return record
+            elif tag == _WIRE_NAMEDTUPLE_TAG:
+                return _WIRE_NAMEDTUPLES[value[1]](*[_from_wire(item) for item in value[2]])
+            elif tag == _WIRE_DATACLASS_TAG:
+                dataclass_class = _WIRE_DATACLASSES[value[1]]
+                return dataclass_class(
+                    **{key: _from_wire(item) for key, item in value[2].items()}
+                )
+            elif tag == _WIRE_TUPLE_TAG:
+                return tuple([_from_wire(item) for item in value[1:]])
+        return tuple([_from_wire(item) for item in value])
+    elif cls is set or cls is frozenset:
+        return cls([_from_wire(item) for item in value])
+    else:
+        return value
+
+
+def _serialize_binary_message(msg: Record, max_line_length: int) -> str:
+    import binascii
+    import marshal
+
+    payload = binascii.b2a_base64(
+        marshal.dumps(_to_wire(msg), _WIRE_MARSHAL_VERSION), newline=False
+    ).decode("ascii")
+
+    if len(payload) > max_line_length:
+        payload = "\n".join(
+            payload[i : i + max_line_length] for i in range(0, len(payload), max_line_length)
+        )
+        payload_length = len(payload) - payload.count("\n")
+    else:
+        payload_length = len(payload)
+
+    return BINARY_MESSAGE_MARKER + str(payload_length) + " " + payload
+
+
+def _parse_binary_message(msg_string: str) -> Record:
+    import binascii
+    import marshal
+
+    msg_start = msg_string.index(" ")
+    payload = msg_string[msg_start + 1 :].replace("\n", "").replace("\r", "")
+    assert int(msg_string[1:msg_start]) == len(payload)
+    return _from_wire(marshal.loads(binascii.a2b_base64(payload)))
+
+
+# Stack deltas
+# ------------
+# Most of the stack in a DebuggerResponse is usually known to the front-end from the previous
+# response. StackEncoder (back-end) and StackDecoder (front-end) keep matching caches, which
+# are valid until the next ToplevelResponse. In an encoded DebuggerResponse, "frame_sources"
+# maps source keys to the sources not sent before, and the stack consists of
+#   * ids of the frames, which are equal to their version in the previous stack,
+#   * FrameInfos with source key in place of the source, locals as delta against the previous
+#     version of the same frame and globals as delta against last sent globals of the module.
+
+
+def get_variables_delta(
+    old: Dict[str, ValueInfo], new: Dict[str, ValueInfo]
+) -> Dict[str, Optional[ValueInfo]]:
+    """Returns the changed names. Removed names are mapped to None."""
+    delta: Dict[str, Optional[ValueInfo]] = {
+        name: info for name, info in new.items() if old.get(name) != info
+    }
+    for name in old:
+        if name not in new:
+            delta[name] = None
+    return delta
+
+
+def apply_variables_delta(
+    variables: Dict[str, ValueInfo], delta: Dict[str, Optional[ValueInfo]]
+) -> Dict[str, ValueInfo]:
+    """Returns new variables dict with changes applied. None in delta means removed name."""
+    result = dict(variables)
+    for name, info in delta.items():
+        if info is None:
+            result.pop(name, None)
+        else:
+            result[name] = info
+    return result
+
+
+class StackEncoder:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self._frames: Dict[int, FrameInfo] = {}
+        self._globals: Dict[Optional[str], Dict[str, ValueInfo]] = {}
+        self._sources: Dict[Tuple, str] = {}
+
+    def encode(self, msg: Record) -> None:
+        sources = {}
+        frames = {}
+        stack = []
+        for frame in msg["stack"]:
+            frame = frame._replace(source=self._encode_source(frame, sources))
+            prev_frame = self._frames.get(frame.id)
+            frames[frame.id] = frame
+            if frame == prev_frame:
+                stack.append(frame.id)
+                continue
+
+            stack.append(
+                frame._replace(
+                    locals=_encode_variables(
+                        prev_frame.locals if prev_frame else None, frame.locals
+                    ),
+                    globals=_encode_variables(self._globals.get(frame.module_name), frame.globals),
+                )
+            )
+            self._globals[frame.module_name] = frame.globals
+
+        self._frames = frames
+        msg["stack"] = stack
+        msg["frame_sources"] = sources
+
+    def _encode_source(self, frame: FrameInfo, sources: Dict[Tuple, str]) -> Optional[Tuple]:
+        if frame.source is None:
+            return None
+
+        try:
+            mtime = os.path.getmtime(frame.filename)
+        except (OSError, TypeError):
+            mtime = None
+
+        key = (frame.filename, frame.firstlineno, frame.code_name, mtime)
+        sent_source = self._sources.get(key)
+        if sent_source is not frame.source and sent_source != frame.source:
+            sources[key] = self._sources[key] = frame.source
+
+        return key
+
+
+class StackDecoder:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self._frames: Dict[int, FrameInfo] = {}
+        self._globals: Dict[Optional[str], Dict[str, ValueInfo]] = {}
+        self._sources: Dict[Tuple, str] = {}
+
+    def decode(self, msg: Record) -> None:
+        if "frame_sources" not in msg:
+            # not encoded
+            return
+
+        self._sources.update(msg["frame_sources"])
+        del msg["frame_sources"]
+        frames = {}
+        stack = []
+        for entry in msg["stack"]:
+            if isinstance(entry, int):
+                frame = self._frames[entry]
+            else:
+                prev_frame = self._frames.get(entry.id)
+                frame = entry._replace(
+                    locals=_decode_variables(
+                        prev_frame.locals if prev_frame else None, entry.locals
+                    ),
+                    globals=_decode_variables(self._globals.get(entry.module_name), entry.globals),
+                )
+                self._globals[frame.module_name] = frame.globals
+
+            frames[frame.id] = frame
+            stack.append(frame._replace(source=self._sources.get(frame.source)))
+
+        self._frames = frames
+        msg["stack"] = stack
+
+
+def _encode_variables(
+    prev_variables: Optional[Dict[str, ValueInfo]], variables: Optional[Dict[str, ValueInfo]]
+) -> Optional[Dict[str, Optional[ValueInfo]]]:
+    if prev_variables is None or variables is None:
+        return variables
+    return get_variables_delta(prev_variables, variables)
+
+
+def _decode_variables(
+    prev_variables: Optional[Dict[str, ValueInfo]],
+    variables: Optional[Dict[str, Optional[ValueInfo]]],
+) -> Optional[Dict[str, ValueInfo]]:
+    if prev_variables is None or variables is None:
+        return variables
+    return apply_variables_delta(prev_variables, variables)
+
+
+# Line sets
+# ---------
+# Coverage data describes sets of line numbers as bitmaps, where bit (lineno % 8) of byte
+# (lineno // 8) tells whether the line belongs to the set.
+
+
+def lines_to_bitmap(lines: Iterable[int]) -> bytes:
+    lines = list(lines)
+    if not lines:
+        return b""
+
+    result = bytearray(max(lines) // 8 + 1)
+    for lineno in lines:
+        result[lineno >> 3] |= 1 << (lineno & 7)
+    return bytes(result)
+
+
+def bitmap_to_lines(bitmap: bytes) -> List[int]:
+    result = []
+    for i, byte in enumerate(bitmap):
+        if byte:
+            for bit in range(8):
+                if byte & (1 << bit):
+                    result.append(i * 8 + bit)
+    return result
+
+
 def normpath_with_actual_case(name: str) -> str:
     """In Windows return the path with the case it is stored in the filesystem"""
     if not os.path.exists(name):
@@ -739,6 +1079,24 @@ def read_one_incoming_message_str(line_reader):
     if msg_str == "":
         return ""
 
+    if msg_str.startswith(BINARY_MESSAGE_MARKER):
+        header, _, first_part = msg_str.partition(" ")
+        try:
+            payload_length = int(header[1:])
+        except ValueError:
+            # not a message frame
+            return msg_str
+
+        received_length = len(first_part.rstrip("\r\n"))
+        while received_length < payload_length:
+            line = line_reader()
+            if line == "":
+                break
+            msg_str += line
+            received_length += len(line.rstrip("\r\n"))
+
+        return msg_str
+
     if not msg_str.startswith(MESSAGE_MARKER):
         return msg_str
 
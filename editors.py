@@ -1516,9 +1516,9 @@ def get_current_breakpoints():
 
     for editor in get_workbench().get_editor_notebook().get_all_editors():
         if editor.is_local():
-            linenos = editor.get_code_view().get_breakpoint_line_numbers()
-            if linenos:
-                result[editor.get_target_path()] = linenos
+            breakpoints = editor.get_code_view().get_breakpoints()
+            if breakpoints:
+                result[editor.get_target_path()] = breakpoints
 
     return result
 
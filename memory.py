@@ -2,13 +2,15 @@
 
 import tkinter as tk
 import tkinter.font as tk_font
+from typing import Optional
 
 from pystart import get_workbench, ui_utils
-from pystart.common import ValueInfo
+from pystart.common import OBJECT_INFO_PAGE_SIZE, ValueInfo
 from pystart.languages import tr
 from pystart.ui_utils import TreeFrame
 
 MAX_REPR_LENGTH_IN_GRID = 100
+MAX_LOADED_CONTENT_ROWS = 4 * OBJECT_INFO_PAGE_SIZE
 
 
 def format_object_id(object_id):
@@ -37,6 +39,75 @@ class MemoryFrame(TreeFrame):
         font.configure(underline=True)
         self.tree.tag_configure("hovered", font=font)
 
+        # Frames showing long content fetch it page by page, when user scrolls near either
+        # end of the loaded rows. Rows far from the visible area get removed, so that
+        # the tree holds at most MAX_LOADED_CONTENT_ROWS rows.
+        self.tree.configure(yscrollcommand=self._on_tree_yscroll)
+        # content index of the first row
+        self._content_offset = 0
+        self._content_total = 0
+        self._content_page_requested = False
+
+    def _clear_tree(self):
+        TreeFrame._clear_tree(self)
+        self._content_offset = 0
+        self._content_total = 0
+        self._content_page_requested = False
+
+    def request_content_page(self, offset: int, limit: int) -> None:
+        """Subclasses which use start_content_page should override it"""
+
+    def start_content_page(self, offset: int, row_count: int) -> Optional[int]:
+        """Returns the tree index for the first row of the page starting at given content
+        offset, or None if the page doesn't fit to the loaded rows anymore"""
+        loaded_count = len(self.tree.get_children())
+        if offset == self._content_offset + loaded_count:
+            return loaded_count
+        elif offset + row_count == self._content_offset and loaded_count:
+            return 0
+        else:
+            # allow requesting again
+            self._content_page_requested = False
+            return None
+
+    def finish_content_page(self, offset: int, row_count: int, total: int) -> None:
+        """Drops the rows furthest from the new page and keeps the view on the same rows"""
+        self._content_total = total
+        self._content_page_requested = False
+
+        children = self.tree.get_children()
+        top_index = round(float(self.tree.yview()[0]) * len(children))
+        excess = len(children) - MAX_LOADED_CONTENT_ROWS
+        if offset < self._content_offset:
+            # the page was added to the beginning
+            self._content_offset = offset
+            top_index += row_count
+            if excess > 0:
+                self.tree.delete(*children[-excess:])
+        elif excess > 0:
+            self.tree.delete(*children[:excess])
+            self._content_offset += excess
+            top_index -= excess
+
+        new_count = len(self.tree.get_children())
+        if new_count:
+            self.tree.yview_moveto(max(top_index, 0) / new_count)
+
+    def _on_tree_yscroll(self, first, last):
+        self.vert_scrollbar.set(first, last)
+        if self._content_page_requested:
+            return
+
+        # also happens after inserting rows, so view gets filled even when page is small
+        loaded_end = self._content_offset + len(self.tree.get_children())
+        if loaded_end < self._content_total and float(last) >= 0.9:
+            self._content_page_requested = True
+            self.request_content_page(loaded_end, OBJECT_INFO_PAGE_SIZE)
+        elif self._content_offset > 0 and float(first) <= 0.1:
+            self._content_page_requested = True
+            offset = max(self._content_offset - OBJECT_INFO_PAGE_SIZE, 0)
+            self.request_content_page(offset, self._content_offset - offset)
+
     def stop_debugging(self):
         self._clear_tree()
 
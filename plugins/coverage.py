@@ -0,0 +1,316 @@
+import base64
+import hashlib
+import json
+import math
+import os.path
+import tkinter as tk
+from array import array
+from logging import getLogger
+from typing import Dict, Optional
+
+from pystart import get_pystart_user_dir, get_runner, get_workbench
+from pystart.common import bitmap_to_lines, path_startswith, universal_relpath
+from pystart.languages import tr
+from pystart.ui_utils import TreeFrame, ems_to_pixels
+
+logger = getLogger(__name__)
+
+COVERAGE_FORMAT = "pystart-coverage"
+COVERAGE_FORMAT_VERSION = 1
+
+_store: Optional["CoverageStore"] = None
+
+
+class FileCoverage:
+    """Coverage of one version of a file.
+
+    Sets of lines are bitmaps (see pystart.common.lines_to_bitmap). Counts, if present,
+    are hit counts of the executable lines in the order of line numbers.
+    """
+
+    def __init__(self, source_hash: str, lines: bytes, executed: bytes, counts=None):
+        self.source_hash = source_hash
+        self.lines = bytes(lines)
+        self.executed = bytearray(executed)
+        self.counts = None if counts is None else array("Q", counts)
+
+    def merge(self, other: "FileCoverage") -> bool:
+        """Adds the data of another run of the same file version. Returns False
+        if the other data is about different version of the file"""
+        if other.source_hash != self.source_hash or other.lines != self.lines:
+            return False
+
+        if len(other.executed) > len(self.executed):
+            self.executed.extend(bytes(len(other.executed) - len(self.executed)))
+        for i, byte in enumerate(other.executed):
+            self.executed[i] |= byte
+
+        if self.counts is None:
+            self.counts = other.counts
+        elif other.counts is not None:
+            for i, count in enumerate(other.counts):
+                self.counts[i] += count
+
+        return True
+
+    def get_line_count(self) -> int:
+        return sum(bin(byte).count("1") for byte in self.lines)
+
+    def get_executed_line_count(self) -> int:
+        return sum(bin(a & b).count("1") for a, b in zip(self.lines, self.executed))
+
+    def get_heat(self) -> Dict[int, Optional[float]]:
+        executed = set(bitmap_to_lines(self.executed))
+        lines = bitmap_to_lines(self.lines)
+        if self.counts is not None:
+            max_count = max(self.counts, default=0)
+        else:
+            max_count = 0
+
+        result = {}
+        for i, lineno in enumerate(lines):
+            if lineno not in executed:
+                result[lineno] = None
+            elif max_count > 1 and self.counts[i]:
+                # logarithmic scale makes difference between rarely run lines visible
+                result[lineno] = math.log(self.counts[i]) / math.log(max_count)
+            else:
+                result[lineno] = 0.0
+        return result
+
+    def to_json(self) -> Dict:
+        return {
+            "source_hash": self.source_hash,
+            "lines": base64.b64encode(self.lines).decode("ascii"),
+            "executed": base64.b64encode(self.executed).decode("ascii"),
+            "counts": None if self.counts is None else self.counts.tolist(),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "FileCoverage":
+        return cls(
+            data["source_hash"],
+            base64.b64decode(data["lines"]),
+            base64.b64decode(data["executed"]),
+            data["counts"],
+        )
+
+
+class CoverageStore:
+    """Merged coverage of all runs, saved to disk after each run"""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._files: Dict[str, FileCoverage] = {}
+        self._load()
+
+    def get_files(self) -> Dict[str, FileCoverage]:
+        return self._files
+
+    def get_file_coverage(self, path: str) -> Optional[FileCoverage]:
+        return self._files.get(os.path.normcase(path))
+
+    def add_run(self, files: Dict[str, Dict]) -> None:
+        for path, data in files.items():
+            key = os.path.normcase(path)
+            coverage = FileCoverage(data["source_hash"], data["lines"], data["executed"], data["counts"])
+            old_coverage = self._files.get(key)
+            if old_coverage is None or not old_coverage.merge(coverage):
+                # data about previous versions of the file is not useful anymore
+                self._files[key] = coverage
+
+        self._save()
+
+    def clear(self) -> None:
+        self._files = {}
+        self._save()
+
+    def _load(self) -> None:
+        if not os.path.isfile(self._path):
+            return
+
+        try:
+            with open(self._path, encoding="utf-8") as fp:
+                data = json.load(fp)
+            if (
+                data.get("format") != COVERAGE_FORMAT
+                or data.get("version") != COVERAGE_FORMAT_VERSION
+            ):
+                logger.warning("Ignoring coverage data in unknown format")
+                return
+            self._files = {
+                path: FileCoverage.from_json(file_data)
+                for path, file_data in data["files"].items()
+            }
+        except Exception:
+            logger.exception("Could not load coverage data from %r", self._path)
+
+    def _save(self) -> None:
+        data = {
+            "format": COVERAGE_FORMAT,
+            "version": COVERAGE_FORMAT_VERSION,
+            "files": {path: coverage.to_json() for path, coverage in self._files.items()},
+        }
+        try:
+            with open(self._path, "w", encoding="utf-8") as fp:
+                json.dump(data, fp)
+        except OSError:
+            logger.exception("Could not save coverage data to %r", self._path)
+
+
+class CoverageView(TreeFrame):
+    def __init__(self, master):
+        TreeFrame.__init__(self, master, columns=("file", "lines", "covered", "percent", "path"))
+
+        self.tree.column("file", width=ems_to_pixels(25), anchor=tk.W, stretch=True)
+        self.tree.column("lines", width=ems_to_pixels(6), anchor=tk.E, stretch=False)
+        self.tree.column("covered", width=ems_to_pixels(6), anchor=tk.E, stretch=False)
+        self.tree.column("percent", width=ems_to_pixels(6), anchor=tk.E, stretch=False)
+        self.tree["displaycolumns"] = ("file", "lines", "covered", "percent")
+
+        self.tree.heading("file", text=tr("File"), anchor=tk.W)
+        self.tree.heading("lines", text=tr("Lines"), anchor=tk.E)
+        self.tree.heading("covered", text=tr("Covered"), anchor=tk.E)
+        self.tree.heading("percent", text=tr("Coverage"), anchor=tk.E)
+
+        self.context_menu.add_command(label=tr("Clear coverage data"), command=_clear_coverage)
+
+        get_workbench().bind("CoverageUpdated", self._update, True)
+        self._update()
+
+    def _update(self, event=None):
+        self._clear_tree()
+        files = _get_store().get_files()
+        cwd = get_workbench().get_local_cwd()
+        for path in sorted(files):
+            coverage = files[path]
+            line_count = coverage.get_line_count()
+            executed_count = coverage.get_executed_line_count()
+            self.tree.insert(
+                "",
+                "end",
+                values=(
+                    universal_relpath(path, cwd) if path_startswith(path, cwd) else path,
+                    line_count,
+                    executed_count,
+                    "%.0f%%" % (100 * executed_count / line_count) if line_count else "",
+                    path,
+                ),
+            )
+
+    def on_select(self, event):
+        iid = self.tree.focus()
+        if iid:
+            path = self.tree.set(iid, "path")
+            if os.path.isfile(path):
+                get_workbench().get_editor_notebook().show_file(path)
+
+
+def _get_store() -> CoverageStore:
+    global _store
+    if _store is None:
+        _store = CoverageStore(os.path.join(get_pystart_user_dir(), "coverage.json"))
+    return _store
+
+
+def _compute_file_hash(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as fp:
+            return hashlib.sha1(fp.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _update_editor_heat(editor) -> None:
+    if not editor.winfo_exists():
+        return
+
+    code_view = editor.get_code_view()
+    path = editor.get_target_path()
+    coverage = None
+    if path is not None and not editor.is_modified() and os.path.isfile(path):
+        coverage = _get_store().get_file_coverage(path)
+        if coverage is not None and coverage.source_hash != _compute_file_hash(path):
+            coverage = None
+
+    code_view.set_gutter_heat({} if coverage is None else coverage.get_heat())
+
+
+def _update_all_editors(event=None) -> None:
+    for editor in get_workbench().get_editor_notebook().get_all_editors():
+        _update_editor_heat(editor)
+
+
+def _on_editor_event(event) -> None:
+    # Open and Save happen before the content of the editor or the file gets updated
+    editor = event.editor
+    get_workbench().after_idle(lambda: _update_editor_heat(editor))
+
+
+def _on_text_change(event) -> None:
+    # line numbers in the data are not valid for edited text
+    for editor in get_workbench().get_editor_notebook().get_all_editors():
+        if editor.get_text_widget() is event.widget:
+            editor.get_code_view().set_gutter_heat({})
+
+
+def _on_coverage_data(msg) -> None:
+    _get_store().add_run(msg.files)
+    get_workbench().event_generate("CoverageUpdated")
+    _update_all_editors()
+
+
+def _clear_coverage() -> None:
+    _get_store().clear()
+    get_workbench().event_generate("CoverageUpdated")
+    _update_all_editors()
+
+
+def _toggle_count_hits() -> None:
+    var = get_workbench().get_variable("coverage.count_hits")
+    var.set(not var.get())
+
+
+def _run_with_coverage() -> None:
+    get_workbench().show_view("CoverageView", set_focus=False)
+    get_runner().execute_current("Coverage")
+
+
+def _run_with_coverage_enabled() -> bool:
+    return (
+        get_workbench().get_editor_notebook().get_current_editor() is not None
+        and get_runner().get_backend_proxy()
+        and get_runner().get_backend_proxy().can_debug()
+    )
+
+
+# Coverage commands go after the debug commands in the Run menu
+load_order_key = "zz"
+
+
+def load_plugin() -> None:
+    get_workbench().set_default("coverage.count_hits", False)
+    get_workbench().add_view(CoverageView, tr("Coverage"), "s", visible_by_default=False)
+    get_workbench().add_command(
+        "run_with_coverage",
+        "run",
+        tr("Run current script with coverage"),
+        _run_with_coverage,
+        caption=tr("Coverage"),
+        tester=_run_with_coverage_enabled,
+        group=11,
+    )
+    get_workbench().add_command(
+        "toggle_coverage_hit_counts",
+        "run",
+        tr("Count line hits in coverage (slower)"),
+        _toggle_count_hits,
+        flag_name="coverage.count_hits",
+        group=11,
+    )
+
+    get_workbench().bind("CoverageData", _on_coverage_data, True)
+    get_workbench().bind("Open", _on_editor_event, True)
+    get_workbench().bind("Save", _on_editor_event, True)
+    get_workbench().bind("SaveAs", _on_editor_event, True)
+    get_workbench().bind_class("EditorCodeViewText", "<<TextChange>>", _on_text_change, True)
@@ -1,20 +1,27 @@
 # Frontend plugin is in cpython_frontend.py
+import _thread
 import ast
+import atexit
 import builtins
+import contextlib
 import functools
 import importlib.util
 import inspect
 import io
+import itertools
 import os.path
 import queue
 import re
 import site
 import subprocess
 import sys
+import threading
+import time
 import tokenize
 import traceback
 import types
 import warnings
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple, Union
 
 import __main__
@@ -22,12 +29,14 @@ import pystart
 from pystart import report_time
 from pystart.backend import MainBackend, logger
 from pystart.common import (
+    OBJECT_INFO_PAGE_SIZE,
     OBJECT_LINK_END,
     OBJECT_LINK_START,
     REPL_PSEUDO_FILENAME,
     STRING_PSEUDO_FILENAME,
     BackendEvent,
     CommandToBackend,
+    DebuggerResponse,
     DistInfo,
     EOFCommand,
     FrameInfo,
@@ -36,6 +45,7 @@ from pystart.common import (
     InlineResponse,
     InputSubmission,
     MessageFromBackend,
+    StackEncoder,
     TextRange,
     ToplevelCommand,
     ToplevelResponse,
@@ -54,11 +64,45 @@ from pystart.common import (
     try_get_base_executable,
     update_system_path,
 )
+from pystart.plugins.cpython_backend.cp_code_cache import CodeCache
+from pystart.plugins.cpython_backend.cp_heap import ObjectHeap
+from pystart.plugins.cpython_backend.cp_repr import bounded_repr
 
 _REPL_HELPER_NAME = "_pystart_repl_print"
 
 _CONFIG_FILENAME = os.path.join(pystart.get_pystart_user_dir(), "backend_configuration.ini")
 
+# Program output gets buffered and sent in bigger chunks
+OUTPUT_BUFFER_SIZE = 4096
+OUTPUT_FLUSH_INTERVAL = 0.02
+
+# Object inspector shows more than variables view, but still not everything
+OBJECT_INFO_MAX_REPR_LENGTH = 100000
+
+# Number of code locations, which keep their source info cached
+SOURCE_INFO_CACHE_SIZE = 256
+
+# Number of recently compiled scripts and shell commands, which keep their code in memory
+COMPILED_CODE_CACHE_SIZE = 64
+# Increase when compilation of scripts or shell commands changes
+COMPILATION_VERSION = 1
+
+# repr of these doesn't change as long as the object stays the same
+_STABLE_REPR_TYPES = {
+    int,
+    float,
+    complex,
+    bool,
+    str,
+    bytes,
+    range,
+    type(None),
+    type,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.ModuleType,
+}
+
 
 _backend = None
 
@@ -81,14 +125,33 @@ class MainCPythonBackend(MainBackend):
         self._source_preprocessors = []
         self._ast_postprocessors = []
         self._main_dir = os.path.dirname(sys.modules["pystart"].__file__)
-        self._heap = {}  # WeakValueDictionary would be better, but can't store reference to None
-        self._source_info_by_frame = {}
-        self._init_help()
-        self._install_fake_streams()
-        self._install_repl_helper()
+        self._heap = ObjectHeap()
+        # name -> (value, ValueInfo) as last sent to the front-end. None means next export is full.
+        self._exported_main_globals: Optional[Dict[str, Tuple[object, ValueInfo]]] = None
+        # (filename, firstlineno, code name, mtime, size) -> (source, firstlineno, in_library)
+        self._source_info_cache = OrderedDict()
+        # (mode, filename, source) -> code object
+        self._compiled_code_cache = OrderedDict()
+        # Run starts a new process, so scripts need to be cached also on disk
+        self._compiled_code_disk_cache = CodeCache(
+            os.path.join(pystart.get_pystart_user_dir(), "compiled_code_cache"),
+            COMPILATION_VERSION,
+        )
+        # filename -> (mtime, size) or None. Files get checked again after each response.
+        self._source_file_versions = {}
+        # (collection, sorted elements) of last sorted paging request
+        self._sorted_collection = None
+        # leaves out of DebuggerResponses what the front-end already knows
+        self._stack_encoder = StackEncoder()
         self._current_executor = None
+        self._memory_tracker = None
         self._io_level = 0
         self._tty_mode = True
+        self._io_animation_required = False
+        self._init_output_buffer()
+        self._init_help()
+        self._install_fake_streams()
+        self._install_repl_helper()
         self._tcl = None
 
         update_system_path(os.environ, get_augmented_system_path(get_exe_dirs()))
@@ -153,7 +216,8 @@ class MainCPythonBackend(MainBackend):
         return self._incoming_message_queue.get()
 
     def add_object_info_tweaker(self, tweaker):
-        """Tweaker should be 2-argument function taking value and export record"""
+        """Tweaker should be 2-argument function taking value and export record.
+        It may also replace the bounded repr in the record."""
         self._object_info_tweakers.append(tweaker)
 
     def add_import_handler(self, module_name, handler):
@@ -257,6 +321,7 @@ class MainCPythonBackend(MainBackend):
         self._input_queue.put(msg)
 
     def _handle_eof_command(self, msg: EOFCommand) -> None:
+        self._flush_output_buffer()
         sys.exit(0)
 
     def _handle_normal_command(self, cmd: CommandToBackend) -> None:
@@ -269,7 +334,6 @@ class MainCPythonBackend(MainBackend):
         logger.debug("Handling normal command %r in cpython_backend", cmd.name)
 
         if isinstance(cmd, ToplevelCommand):
-            self._source_info_by_frame = {}
             self._input_queue = queue.Queue()
 
         super()._handle_normal_command(cmd)
@@ -459,9 +523,9 @@ class MainCPythonBackend(MainBackend):
 
     def _cmd_FastDebug(self, cmd):
         self.switch_env_to_script_mode(cmd)
-        from pystart.plugins.cpython_backend.cp_tracers import FastTracer
+        from pystart.plugins.cpython_backend.cp_tracers import get_fast_tracer_class
 
-        return self._execute_file(cmd, FastTracer)
+        return self._execute_file(cmd, get_fast_tracer_class())
 
     def _cmd_Debug(self, cmd):
         self.switch_env_to_script_mode(cmd)
@@ -477,6 +541,18 @@ class MainCPythonBackend(MainBackend):
 
         return self._execute_file(cmd, NiceTracer)
 
+    def _cmd_Profile(self, cmd):
+        self.switch_env_to_script_mode(cmd)
+        from pystart.plugins.cpython_backend.cp_profiler import SamplingProfiler
+
+        return self._execute_file(cmd, SamplingProfiler)
+
+    def _cmd_Coverage(self, cmd):
+        self.switch_env_to_script_mode(cmd)
+        from pystart.plugins.cpython_backend.cp_coverage import get_coverage_tracer_class
+
+        return self._execute_file(cmd, get_coverage_tracer_class())
+
     def _cmd_execute_source(self, cmd):
         """Executes Python source entered into shell"""
         self._check_update_tty_mode(cmd)
@@ -542,6 +618,15 @@ class MainCPythonBackend(MainBackend):
 
     def _cmd_get_globals(self, cmd):
         # warnings.warn("_cmd_get_globals is deprecated for CPython")
+        if cmd.get("resync") and cmd.module_name == "__main__":
+            # following ToplevelResponses will carry changes relative to this snapshot
+            self._update_exported_main_globals()
+            return dict(
+                module_name=cmd.module_name,
+                globals=self._get_exported_main_globals(),
+                resync=True,
+            )
+
         return dict(
             module_name=cmd.module_name,
             globals=self.export_globals(cmd.module_name),
@@ -588,11 +673,18 @@ class MainCPythonBackend(MainBackend):
     def _cmd_get_heap(self, cmd):
         result = {}
         for key in self._heap:
-            result[key] = self.export_value(self._heap[key])
+            try:
+                result[key] = self.export_value(self._heap[key])
+            except KeyError:
+                # weakly referenced object has been collected meanwhile
+                pass
 
-        return InlineResponse("get_heap", heap=result)
+        return InlineResponse("get_heap", heap=result, heap_stats=self._heap.get_stats())
 
     def _cmd_get_object_info(self, cmd):
+        if "back_links" in cmd or "forward_links" in cmd:
+            self._heap.set_history_ids(cmd.get("back_links", []) + cmd.get("forward_links", []))
+
         if self._current_executor and self._current_executor.is_in_past():
             info = {"id": cmd.object_id, "error": "past info not available"}
 
@@ -611,7 +703,7 @@ class MainCPythonBackend(MainBackend):
             self._heap[id(type(value))] = type(value)
             info = {
                 "id": cmd.object_id,
-                "repr": repr(value),
+                "repr": bounded_repr(value, OBJECT_INFO_MAX_REPR_LENGTH),
                 "type": str(type(value)),
                 "full_type_name": str(type(value))
                 .replace("<class '", "")
@@ -634,9 +726,9 @@ class MainCPythonBackend(MainBackend):
             ):
                 self._add_function_info(value, info)
             elif isinstance(value, (list, tuple, set)):
-                self._add_elements_info(value, info)
+                self._add_elements_info(value, info, cmd)
             elif isinstance(value, dict):
-                self._add_entries_info(value, info)
+                self._add_entries_info(value, info, cmd)
             elif isinstance(value, float):
                 self._add_float_info(value, info)
             elif hasattr(value, "image_data"):
@@ -768,15 +860,48 @@ class MainCPythonBackend(MainBackend):
         except Exception:
             pass
 
-    def _add_elements_info(self, value, info):
-        info["elements"] = []
-        for element in value:
-            info["elements"].append(self.export_value(element))
-
-    def _add_entries_info(self, value, info):
-        info["entries"] = []
-        for key in value:
-            info["entries"].append((self.export_value(key), self.export_value(value[key])))
+    def _add_elements_info(self, value, info, cmd):
+        offset, limit = self._add_content_paging_info(value, info, cmd)
+        if isinstance(value, set):
+            elements = self._get_page_of_collection(value, offset, limit, cmd.get("content_sort"))
+        else:
+            elements = value[offset : offset + limit]
+
+        info["elements"] = [self.export_value(element) for element in elements]
+
+    def _add_entries_info(self, value, info, cmd):
+        offset, limit = self._add_content_paging_info(value, info, cmd)
+        keys = self._get_page_of_collection(value, offset, limit, cmd.get("content_sort"))
+        info["entries"] = [(self.export_value(key), self.export_value(value[key])) for key in keys]
+
+    def _get_page_of_collection(self, collection, offset, limit, sort):
+        if not sort:
+            return list(itertools.islice(collection, offset, offset + limit))
+
+        if (
+            self._sorted_collection is not None
+            and self._sorted_collection[0] is collection
+            and len(self._sorted_collection[1]) == len(collection)
+        ):
+            # next page of the same collection
+            items = self._sorted_collection[1]
+        else:
+            try:
+                items = sorted(collection)
+            except TypeError:
+                # values of different types
+                items = sorted(collection, key=repr)
+            self._sorted_collection = (collection, items)
+
+        return items[offset : offset + limit]
+
+    def _add_content_paging_info(self, value, info, cmd):
+        offset = cmd.get("content_offset", 0)
+        limit = cmd.get("content_limit", OBJECT_INFO_PAGE_SIZE)
+        info["content_offset"] = offset
+        info["content_total"] = len(value)
+        info["content_only"] = cmd.get("content_only", False)
+        return offset, limit
 
     def _add_float_info(self, value, info):
         if not value.is_integer():
@@ -785,6 +910,7 @@ class MainCPythonBackend(MainBackend):
     def _execute_file(self, cmd, executor_class):
         report_time("Starting _execute_file")
         self._check_update_tty_mode(cmd)
+        self._check_update_memory_tracking(cmd)
 
         if len(cmd.args) >= 1:
             sys.argv = cmd.args
@@ -825,6 +951,7 @@ class MainCPythonBackend(MainBackend):
             result["source_for_language_server"] = source
             return result
         except SystemExit as e:
+            self._flush_output_buffer()
             sys.exit(e.code)
         finally:
             self._current_executor = None
@@ -839,7 +966,8 @@ class MainCPythonBackend(MainBackend):
                 except Exception as e:
                     obj_repr = "<repr error: " + str(e) + ">"
                 print(OBJECT_LINK_START % id(obj), obj_repr, OBJECT_LINK_END, sep="")
-                self._heap[id(obj)] = obj
+                # the link stays in the Shell
+                self._heap.pin(id(obj), obj)
                 builtins._ = obj
 
         setattr(builtins, _REPL_HELPER_NAME, _handle_repl_value)
@@ -875,28 +1003,158 @@ class MainCPythonBackend(MainBackend):
 
     def send_message(self, msg: MessageFromBackend) -> None:
         report_time(f"Sending message {msg.event_type}")
-        sys.stdout.flush()
+
+        if self._memory_tracker is not None and (
+            isinstance(msg, ToplevelResponse)
+            or isinstance(msg, DebuggerResponse)
+            and self._current_executor is not None
+            and self._current_executor.is_at_breakpoint_stop()
+        ):
+            # the snapshot must reach the front-end before the response
+            self.send_message(self._memory_tracker.create_snapshot_event())
 
         if isinstance(msg, ToplevelResponse):
             if "cwd" not in msg:
                 msg["cwd"] = os.getcwd()
-            if "globals" not in msg:
-                msg["globals"] = self.export_globals()
-
-        self._original_stdout.write(serialize_message(msg) + "\n")
+            if "globals" not in msg and "globals_delta" not in msg:
+                if self._exported_main_globals is None:
+                    self._update_exported_main_globals()
+                    msg["globals"] = self._get_exported_main_globals()
+                else:
+                    msg["globals_delta"] = self._update_exported_main_globals()
+            self._stack_encoder.reset()
+        elif isinstance(msg, DebuggerResponse):
+            self._stack_encoder.encode(msg)
+
+        if isinstance(msg, (ToplevelResponse, DebuggerResponse)):
+            # objects not exported again by the next response will be released
+            self._heap.end_generation()
+            self._source_file_versions = {}
+            # the program may have changed the collection
+            self._sorted_collection = None
+
+        with self._output_buffer_access() as reentered:
+            # buffered output must reach the front-end before anything that follows it
+            if not reentered:
+                self._flush_output_buffer_unlocked()
+            self._write_message_unlocked(msg)
+
+    def _write_message_unlocked(self, msg: MessageFromBackend) -> None:
+        self._original_stdout.write(serialize_message(msg, wire_format=self._wire_format) + "\n")
         self._original_stdout.flush()
 
+    def _init_output_buffer(self):
+        self._reset_output_buffer()
+        atexit.register(self._flush_output_buffer)
+        # os._exit skips atexit hooks
+        self._original_os_exit = os._exit
+        os._exit = self._os_exit
+        if hasattr(os, "register_at_fork"):
+            # A forked child would otherwise send the output of the parent again
+            os.register_at_fork(
+                before=self._flush_output_buffer, after_in_child=self._reset_output_buffer
+            )
+
+    def _reset_output_buffer(self):
+        # Reentrant, because a signal handler may print while the main thread holds the lock
+        self._output_lock = threading.RLock()
+        # True while the buffer is being changed
+        self._output_busy = False
+        self._output_buffer = []
+        self._output_buffer_size = 0
+        self._output_buffer_stream_name = None
+        self._output_pending = threading.Event()
+        # Low-level thread doesn't show up in threading.enumerate() of the user program
+        _thread.start_new_thread(self._flush_output_periodically, ())
+
+    def _os_exit(self, status):
+        try:
+            self._flush_output_buffer()
+        finally:
+            self._original_os_exit(status)
+
+    @contextlib.contextmanager
+    def _output_buffer_access(self):
+        """Holds the output lock and tells whether the buffer was already being changed
+        by the same thread (ie. the code got re-entered by a signal handler)"""
+        with self._output_lock:
+            reentered = self._output_busy
+            self._output_busy = True
+            try:
+                yield reentered
+            finally:
+                self._output_busy = reentered
+
+    def _send_output(self, data, stream_name):
+        if not data:
+            return
+
+        data = self._transform_output(data, stream_name)
+        with self._output_buffer_access() as reentered:
+            if reentered:
+                # the buffer may be in the middle of a change, so bypass it
+                self._write_message_unlocked(
+                    BackendEvent(event_type="ProgramOutput", stream_name=stream_name, data=data)
+                )
+                return
+
+            if self._output_buffer and self._output_buffer_stream_name != stream_name:
+                self._flush_output_buffer_unlocked()
+
+            if not self._output_buffer:
+                self._output_pending.set()
+
+            self._output_buffer.append(data)
+            self._output_buffer_size += len(data)
+            self._output_buffer_stream_name = stream_name
+
+            if (
+                self._output_buffer_size >= OUTPUT_BUFFER_SIZE
+                or self._io_animation_required
+                and "\n" in data
+            ):
+                self._flush_output_buffer_unlocked()
+
+    def _flush_output_buffer(self):
+        with self._output_buffer_access() as reentered:
+            if not reentered:
+                self._flush_output_buffer_unlocked()
+
+    def _flush_output_buffer_unlocked(self):
+        if not self._output_buffer:
+            return
+
+        data = "".join(self._output_buffer)
+        stream_name = self._output_buffer_stream_name
+        self._output_buffer = []
+        self._output_buffer_size = 0
+        self._output_buffer_stream_name = None
+        self._last_sent_output = data
+        self._write_message_unlocked(
+            BackendEvent(event_type="ProgramOutput", stream_name=stream_name, data=data)
+        )
+
+    def _flush_output_periodically(self):
+        # NB! Runs in a separate thread, must not use logging or threading.current_thread
+        while True:
+            self._output_pending.wait()
+            time.sleep(OUTPUT_FLUSH_INTERVAL)
+            try:
+                with self._output_buffer_access():
+                    self._output_pending.clear()
+                    self._flush_output_buffer_unlocked()
+            except Exception:
+                # front-end has gone away
+                return
+
     def export_value(self, value, max_repr_length=5000):
         self._heap[id(value)] = value
         try:
-            rep = repr(value)
+            rep = bounded_repr(value, max_repr_length)
         except Exception:
             # See https://bitbucket.org/plas/pystart/issues/584/problem-with-thonnys-back-end-obj-no
             rep = "??? <repr error>"
 
-        if len(rep) > max_repr_length:
-            rep = rep[:max_repr_length] + "…"
-
         return ValueInfo(id(value), rep)
 
     def export_variables(self, variables, all_variables=False):
@@ -915,6 +1173,45 @@ class MainCPythonBackend(MainBackend):
         else:
             raise RuntimeError("Module '{0}' is not loaded".format(module_name))
 
+    def _update_exported_main_globals(self) -> Dict[str, Optional[ValueInfo]]:
+        """Exports the globals of __main__ and returns the ones which differ from
+        previous export. Removed names are mapped to None."""
+        previous = self._exported_main_globals or {}
+        current = {}
+        changes = {}
+        variables = sys.modules["__main__"].__dict__
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for name in variables:
+                if name.startswith("__"):
+                    continue
+
+                value = variables[name]
+                if name in previous:
+                    prev_value, prev_info = previous[name]
+                    if prev_value is value and type(value) in _STABLE_REPR_TYPES:
+                        # no need to compute the repr again
+                        self._heap[id(value)] = value
+                        current[name] = previous[name]
+                        continue
+                else:
+                    prev_info = None
+
+                info = self.export_value(value, 100)
+                current[name] = (value, info)
+                if info != prev_info:
+                    changes[name] = info
+
+        for name in previous:
+            if name not in current:
+                changes[name] = None
+
+        self._exported_main_globals = current
+        return changes
+
+    def _get_exported_main_globals(self) -> Dict[str, ValueInfo]:
+        return {name: info for name, (_, info) in self._exported_main_globals.items()}
+
     def _debug(self, *args):
         logger.debug("MainCPythonBackend: " + str(args))
 
@@ -1007,11 +1304,57 @@ class MainCPythonBackend(MainBackend):
         return lookup_from_tb(tb), "current_exception"
 
     def _get_frame_source_info(self, frame):
-        fid = id(frame)
-        if fid not in self._source_info_by_frame:
-            self._source_info_by_frame[fid] = _fetch_frame_source_info(frame)
+        code = frame.f_code
+        file_version = self._get_source_file_version(code.co_filename)
+        if file_version is None:
+            return None, None, True
+
+        # All frames of a code object share the source info, as long as the file stays the same
+        key = (code.co_filename, code.co_firstlineno, code.co_name) + file_version
+        result = self._source_info_cache.get(key)
+        if result is None:
+            result = _fetch_frame_source_info(frame)
+            self._source_info_cache[key] = result
+            if len(self._source_info_cache) > SOURCE_INFO_CACHE_SIZE:
+                self._source_info_cache.popitem(last=False)
+        else:
+            self._source_info_cache.move_to_end(key)
 
-        return self._source_info_by_frame[fid]
+        return result
+
+    def _get_compiled_code(self, source, filename, mode, create_code):
+        """Returns the code object for the source either from the cache or by calling
+        create_code. The code must depend only on the source, filename and mode."""
+        key = (mode, filename, source)
+        code = self._compiled_code_cache.get(key)
+        if code is not None:
+            self._compiled_code_cache.move_to_end(key)
+            return code
+
+        if mode == "exec":
+            disk_key = self._compiled_code_disk_cache.get_key(source, filename, mode)
+            code = self._compiled_code_disk_cache.get(disk_key)
+            if code is None:
+                code = create_code()
+                self._compiled_code_disk_cache.put(disk_key, code)
+        else:
+            code = create_code()
+
+        self._compiled_code_cache[key] = code
+        if len(self._compiled_code_cache) > COMPILED_CODE_CACHE_SIZE:
+            self._compiled_code_cache.popitem(last=False)
+
+        return code
+
+    def _get_source_file_version(self, filename):
+        if filename not in self._source_file_versions:
+            try:
+                stat = os.stat(filename)
+                self._source_file_versions[filename] = (stat.st_mtime_ns, stat.st_size)
+            except (OSError, TypeError, ValueError):
+                self._source_file_versions[filename] = None
+
+        return self._source_file_versions[filename]
 
     def _prepare_user_exception(self):
         e_type, e_value, e_traceback = sys.exc_info()
@@ -1052,6 +1395,19 @@ class MainCPythonBackend(MainBackend):
     def _check_update_tty_mode(self, cmd):
         if "tty_mode" in cmd:
             self._tty_mode = cmd["tty_mode"]
+        if "io_animation_required" in cmd:
+            self._io_animation_required = cmd["io_animation_required"]
+
+    def _check_update_memory_tracking(self, cmd):
+        if cmd.get("track_memory", False):
+            if self._memory_tracker is None:
+                from pystart.plugins.cpython_backend.cp_memory import MemoryTracker
+
+                self._memory_tracker = MemoryTracker()
+            self._memory_tracker.start()
+        elif self._memory_tracker is not None:
+            self._memory_tracker.stop()
+            self._memory_tracker = None
 
     def _is_externally_managed(self):
         if running_in_virtual_environment():
@@ -1105,6 +1461,11 @@ class FakeOutputStream(FakeStream):
 
         return len(data)
 
+    def flush(self):
+        # the output may be followed by the output of a subprocess
+        self._backend._flush_output_buffer()
+        self._target_stream.flush()
+
     def writelines(self, lines):
         try:
             self._backend._enter_io_function()
@@ -1244,6 +1605,9 @@ class Executor:
     def is_in_past(self):
         return False
 
+    def is_at_breakpoint_stop(self):
+        return False
+
     def execute_source(self, source: str, filename, mode, ast_postprocessors):
         assert isinstance(source, str)
 
@@ -1255,20 +1619,10 @@ class Executor:
         try:
             if mode == "repl":
                 assert not ast_postprocessors
-                # Useful in shell to get last expression value in multi-statement block
-                root = self._prepare_ast(source, filename, "exec")
-                # https://bugs.python.org/issue35894
-                # https://github.com/pallets/werkzeug/pull/1552/files#diff-9e75ca133f8601f3b194e2877d36df0eR950
-                module = ast.parse("")
-                module.body = root.body
-                self._instrument_repl_code(module)
-                statements = compile(module, filename, "exec")
+                statements = self._compile_repl_code(source, filename)
             elif mode == "exec":
                 report_time("Before preparing ast in executor")
-                root = self._prepare_ast(source, filename, mode)
-                for func in ast_postprocessors:
-                    func(root)
-                statements = compile(root, filename, mode)
+                statements = self._compile_module(source, filename, ast_postprocessors)
                 report_time("After compiling ast in executor")
             else:
                 raise ValueError("Unknown mode", mode)
@@ -1286,6 +1640,37 @@ class Executor:
         """override in subclass for custom-loading user modules"""
         return None
 
+    def _compile_module(self, source, filename, ast_postprocessors):
+        if not ast_postprocessors:
+            return self._backend._get_compiled_code(
+                source, filename, "exec", lambda: self._create_module_code(source, filename, [])
+            )
+
+        # Postprocessors may depend on more than the source (e.g. environment variables)
+        # and may report problems while processing, so their results don't get cached
+        return self._create_module_code(source, filename, ast_postprocessors)
+
+    def _create_module_code(self, source, filename, ast_postprocessors):
+        root = self._prepare_ast(source, filename, "exec")
+        for func in ast_postprocessors:
+            func(root)
+        return compile(root, filename, "exec")
+
+    def _compile_repl_code(self, source, filename):
+        return self._backend._get_compiled_code(
+            source, filename, "repl", lambda: self._create_repl_code(source, filename)
+        )
+
+    def _create_repl_code(self, source, filename):
+        # Useful in shell to get last expression value in multi-statement block
+        root = self._prepare_ast(source, filename, "exec")
+        # https://bugs.python.org/issue35894
+        # https://github.com/pallets/werkzeug/pull/1552/files#diff-9e75ca133f8601f3b194e2877d36df0eR950
+        module = ast.parse("")
+        module.body = root.body
+        self._instrument_repl_code(module)
+        return compile(module, filename, "exec")
+
     def _prepare_ast(self, source, filename, mode):
         return ast.parse(source, filename, mode)
 
@@ -0,0 +1,114 @@
+"""
+On-disk cache for compiled and instrumented code objects.
+
+Preparing a module for the nicer debugger (parsing, tagging the nodes, inserting the
+markers and compiling) may take longer than running the program. The cache stores the
+resulting code object together with the metadata of the exported nodes, so that unchanged
+modules can skip the AST work. Plain scripts get cached the same way, because each Run
+starts a new back-end process.
+
+Entries are keyed by the source, filename, Python version, PyStart version, the version
+of the compilation or instrumentation and optional extra parts (e.g. compilation mode).
+Least recently used entries get removed when the total size exceeds the limit.
+"""
+
+import hashlib
+import marshal
+import os.path
+import sys
+from logging import getLogger
+from typing import Any, Optional, Union
+
+import pystart
+
+logger = getLogger(__name__)
+
+CODE_CACHE_MAX_SIZE = 50 * 1024 * 1024
+_ENTRY_EXTENSION = ".marshal"
+
+
+class CodeCache:
+    def __init__(self, directory: str, version: int, max_size: int = CODE_CACHE_MAX_SIZE):
+        self._directory = directory
+        self._version = version
+        self._max_size = max_size
+
+    def get_key(self, source: Union[str, bytes], filename: str, *extra_parts: str) -> str:
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+
+        digest = hashlib.sha256()
+        parts = [sys.version, pystart.get_version(), str(self._version), filename, *extra_parts]
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._get_entry_path(key)
+        try:
+            with open(path, "rb") as fp:
+                value = marshal.loads(fp.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Could not read cache entry %r", path, exc_info=True)
+            self._remove_entry(path)
+            return None
+
+        try:
+            # Modification time tells which entries were used last
+            os.utime(path)
+        except OSError:
+            logger.warning("Could not touch cache entry %r", path, exc_info=True)
+
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Value must be serializable with marshal"""
+        path = self._get_entry_path(key)
+        temp_path = path + ".%d.tmp" % os.getpid()
+        try:
+            data = marshal.dumps(value)
+            os.makedirs(self._directory, exist_ok=True)
+            with open(temp_path, "wb") as fp:
+                fp.write(data)
+            os.replace(temp_path, path)
+        except Exception:
+            logger.warning("Could not store cache entry %r", path, exc_info=True)
+            self._remove_entry(temp_path)
+            return
+
+        self._remove_least_recently_used_entries()
+
+    def _get_entry_path(self, key: str) -> str:
+        return os.path.join(self._directory, key + _ENTRY_EXTENSION)
+
+    def _remove_least_recently_used_entries(self) -> None:
+        entries = []
+        total_size = 0
+        try:
+            with os.scandir(self._directory) as it:
+                for entry in it:
+                    if entry.name.endswith(_ENTRY_EXTENSION):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total_size += stat.st_size
+        except OSError:
+            logger.warning("Could not list cache entries", exc_info=True)
+            return
+
+        entries.sort()
+        while total_size > self._max_size and entries:
+            _, size, path = entries.pop(0)
+            self._remove_entry(path)
+            total_size -= size
+
+    def _remove_entry(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.warning("Could not remove cache entry %r", path, exc_info=True)
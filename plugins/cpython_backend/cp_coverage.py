@@ -0,0 +1,289 @@
+"""
+Line coverage for the Coverage command.
+
+Lines are recorded only for the code of the user's own modules (main script and the
+modules next to it). When a code object of such module starts for the first time, the
+code objects of all its functions, classes etc. get registered as well. This way the lines
+of functions, which never got called, are known to be executable.
+
+For each registered code object there is either a bit array of executed lines or (when
+hit counts are requested) an array of counters, both indexed by the line number relative
+to the first line of the code object.
+
+When the program completes, the data gets combined per file and sent to the front-end in
+a CoverageData event. For each file it contains a bitmap of executable lines (see
+lines_to_bitmap), a bitmap of executed lines and, when requested, hit counts of the
+executable lines in the order of line numbers.
+"""
+
+import dis
+import hashlib
+import os.path
+import sys
+from array import array
+from logging import getLogger
+from typing import Dict, List
+
+import pystart
+from pystart.common import BackendEvent, is_same_path, lines_to_bitmap, path_startswith
+from pystart.plugins.cpython_backend.cp_back import Executor, _is_library_file
+
+logger = getLogger(__name__)
+
+
+class CoverageTracer(Executor):
+    """Records lines with sys.settrace"""
+
+    def __init__(self, backend, original_cmd):
+        super().__init__(backend, original_cmd)
+        self._count_hits = original_cmd.get("count_hits", True)
+        self._pystart_src_dir = os.path.dirname(pystart.__file__)
+        self._file_measured_cache: Dict[str, bool] = {}
+        # (code, first line, bit array or counters) by id(code)
+        self._code_records: Dict[int, tuple] = {}
+        self._line_tracers = {}
+
+    def _execute_prepared_user_code(self, statements, global_vars):
+        try:
+            self._start_tracing()
+            return super()._execute_prepared_user_code(statements, global_vars)
+        finally:
+            self._stop_tracing()
+            # data must reach the front-end before the ToplevelResponse
+            self._send_coverage_data()
+
+    def _start_tracing(self):
+        sys.settrace(self._trace)
+
+    def _stop_tracing(self):
+        sys.settrace(None)
+
+    def _trace(self, frame, event, arg):
+        if event != "call":
+            return None
+
+        code = frame.f_code
+        record = self._code_records.get(id(code))
+        if record is None:
+            if not self._is_measured_file(code.co_filename):
+                return None
+            self._register_code_tree(code)
+            record = self._code_records[id(code)]
+
+        line_tracer = self._line_tracers.get(id(code))
+        if line_tracer is None:
+            line_tracer = self._line_tracers[id(code)] = self._create_line_tracer(record)
+        return line_tracer
+
+    def _create_line_tracer(self, record):
+        _, first_line, data = record
+        if self._count_hits:
+
+            def trace_lines(frame, event, arg):
+                if event == "line":
+                    data[frame.f_lineno - first_line] += 1
+                return trace_lines
+
+        else:
+
+            def trace_lines(frame, event, arg):
+                if event == "line":
+                    offset = frame.f_lineno - first_line
+                    data[offset >> 3] |= 1 << (offset & 7)
+                return trace_lines
+
+        return trace_lines
+
+    def _is_measured_file(self, path: str) -> bool:
+        result = self._file_measured_cache.get(path)
+        if result is not None:
+            return result
+
+        main_dir = self._main_module_path and os.path.dirname(self._main_module_path)
+        result = (
+            self._main_module_path is not None
+            and is_same_path(path, self._main_module_path)
+            or main_dir is not None
+            and os.path.splitext(path)[1].lower() in (".py", ".pyw", ".pyde")
+            and path_startswith(path, main_dir)
+            and not _is_library_file(path)
+            and not path_startswith(path, self._pystart_src_dir)
+        )
+        self._file_measured_cache[path] = result
+        return result
+
+    def _register_code_tree(self, code) -> None:
+        codes = [code]
+        while codes:
+            code = codes.pop()
+            if id(code) in self._code_records:
+                continue
+
+            codes.extend(const for const in code.co_consts if isinstance(const, type(code)))
+
+            lines = _get_code_lines(code)
+            first_line = min(lines, default=code.co_firstlineno)
+            span = max(lines, default=first_line) - first_line + 1
+            if self._count_hits:
+                data = array("Q", bytes(8 * span))
+            else:
+                data = bytearray((span + 7) // 8)
+
+            # keeping the code object alive keeps its id unique
+            self._code_records[id(code)] = (code, first_line, data)
+            self._on_code_registered(code)
+
+    def _on_code_registered(self, code) -> None:
+        pass
+
+    def _send_coverage_data(self) -> None:
+        counts_by_file: Dict[str, Dict[int, int]] = {}
+        for code, first_line, data in self._code_records.values():
+            file_counts = counts_by_file.setdefault(code.co_filename, {})
+            for lineno in _get_code_lines(code):
+                offset = lineno - first_line
+                if self._count_hits:
+                    count = data[offset]
+                else:
+                    count = (data[offset >> 3] >> (offset & 7)) & 1
+                # a line may belong to several code objects (e.g. comprehensions before 3.12)
+                file_counts[lineno] = file_counts.get(lineno, 0) + count
+
+        files = {}
+        for filename, file_counts in counts_by_file.items():
+            try:
+                with open(filename, "rb") as fp:
+                    source_hash = hashlib.sha1(fp.read()).hexdigest()
+            except OSError:
+                logger.warning("Could not read %r", filename, exc_info=True)
+                continue
+
+            lines = sorted(file_counts)
+            files[filename] = {
+                "source_hash": source_hash,
+                "lines": lines_to_bitmap(lines),
+                "executed": lines_to_bitmap(
+                    lineno for lineno in lines if file_counts[lineno] > 0
+                ),
+                "counts": [file_counts[lineno] for lineno in lines] if self._count_hits else None,
+            }
+
+        self._backend.send_message(
+            BackendEvent("CoverageData", files=files, count_hits=self._count_hits)
+        )
+
+
+class MonitoringCoverageTracer(CoverageTracer):
+    """Records lines with sys.monitoring (PEP 669), available since Python 3.12.
+
+    PY_START events are used only for discovering new code objects. LINE events are
+    enabled only for registered code objects. When hit counts are not needed, every LINE
+    event gets switched off (with DISABLE) after the first hit, so that the rest of the
+    program runs at full speed.
+
+    LINE events don't repeat when a loop jumps back to the same line (e.g. in a
+    comprehension or a one-line for loop), but sys.settrace reports a line event for each
+    such jump. Therefore, when counting hits, backward JUMP events within a line get
+    counted as well.
+
+    Falls back to sys.settrace if another tool already holds the coverage tool id.
+    """
+
+    def __init__(self, backend, original_cmd):
+        super().__init__(backend, original_cmd)
+        self._monitoring_active = False
+        # line number for each instruction offset by id(code)
+        self._offset_lines: Dict[int, Dict[int, int]] = {}
+
+    def _start_tracing(self):
+        monitoring = sys.monitoring
+        try:
+            monitoring.use_tool_id(monitoring.COVERAGE_ID, "pystart")
+        except ValueError:
+            logger.warning("Coverage tool id is taken, falling back to sys.settrace")
+            super()._start_tracing()
+            return
+
+        events = monitoring.events
+        monitoring.register_callback(monitoring.COVERAGE_ID, events.PY_START, self._on_py_start)
+        if self._count_hits:
+            line_callback = self._on_line_hit
+        else:
+            line_callback = self._on_first_line_hit
+        monitoring.register_callback(monitoring.COVERAGE_ID, events.LINE, line_callback)
+        if self._count_hits:
+            monitoring.register_callback(monitoring.COVERAGE_ID, events.JUMP, self._on_jump)
+        monitoring.set_events(monitoring.COVERAGE_ID, events.PY_START)
+        # events disabled during a previous run in this process would stay disabled
+        monitoring.restart_events()
+        self._monitoring_active = True
+
+    def _stop_tracing(self):
+        if not self._monitoring_active:
+            super()._stop_tracing()
+            return
+
+        monitoring = sys.monitoring
+        self._monitoring_active = False
+        monitoring.set_events(monitoring.COVERAGE_ID, 0)
+        for code, _, _ in self._code_records.values():
+            monitoring.set_local_events(monitoring.COVERAGE_ID, code, 0)
+        for event in [monitoring.events.PY_START, monitoring.events.LINE, monitoring.events.JUMP]:
+            monitoring.register_callback(monitoring.COVERAGE_ID, event, None)
+        monitoring.free_tool_id(monitoring.COVERAGE_ID)
+
+    def _on_code_registered(self, code) -> None:
+        if self._monitoring_active:
+            events = sys.monitoring.events.LINE
+            if self._count_hits:
+                events |= sys.monitoring.events.JUMP
+            sys.monitoring.set_local_events(sys.monitoring.COVERAGE_ID, code, events)
+
+    def _on_py_start(self, code, instruction_offset):
+        if id(code) not in self._code_records and self._is_measured_file(code.co_filename):
+            self._register_code_tree(code)
+
+        # LINE events of this code object are already determined by its local events
+        return sys.monitoring.DISABLE
+
+    def _on_line_hit(self, code, line_number):
+        _, first_line, counts = self._code_records[id(code)]
+        counts[line_number - first_line] += 1
+
+    def _on_jump(self, code, instruction_offset, destination_offset):
+        if destination_offset > instruction_offset:
+            # forward jumps stay forward jumps
+            return sys.monitoring.DISABLE
+
+        offset_lines = self._offset_lines.get(id(code))
+        if offset_lines is None:
+            offset_lines = self._offset_lines[id(code)] = {
+                offset: line
+                for start, end, line in code.co_lines()
+                if line is not None
+                for offset in range(start, end, 2)
+            }
+
+        line_number = offset_lines.get(destination_offset)
+        if line_number is not None and line_number == offset_lines.get(instruction_offset):
+            # jumps to other lines are reported as LINE events
+            self._on_line_hit(code, line_number)
+        return None
+
+    def _on_first_line_hit(self, code, line_number):
+        _, first_line, bits = self._code_records[id(code)]
+        offset = line_number - first_line
+        bits[offset >> 3] |= 1 << (offset & 7)
+        return sys.monitoring.DISABLE
+
+
+def _get_code_lines(code) -> List[int]:
+    # Module code starts with an instruction at line 0 in Python 3.11+
+    return sorted({lineno for _, lineno in dis.findlinestarts(code) if lineno})
+
+
+def get_coverage_tracer_class():
+    if hasattr(sys, "monitoring"):
+        return MonitoringCoverageTracer
+    else:
+        return CoverageTracer
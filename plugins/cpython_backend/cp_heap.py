@@ -0,0 +1,120 @@
+"""
+Keeps the objects which the front-end may refer to by id.
+
+Every object passing through export_value is registered here, so that the front-end
+can later ask for more info about it. In order not to keep user's objects alive forever,
+the registrations are grouped into generations, which end with each ToplevelResponse
+or DebuggerResponse. Objects which haven't been exported or looked up during the last
+HEAP_KEEP_GENERATIONS generations are only kept via weak reference (if the type allows it)
+or forgotten.
+
+Views refresh their content after each response (which means re-exporting the objects
+they show), therefore visible objects stay pinned. Values linked in the Shell and objects
+in the Object inspector's navigation history are not shown again, so these are pinned
+explicitly.
+"""
+
+import sys
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Set, Tuple
+
+HEAP_KEEP_GENERATIONS = 2
+# Max number of pinned Shell values. Older ones get released like other objects.
+HEAP_PIN_LIMIT = 1000
+
+
+class ObjectHeap:
+    """Mapping from object id to object"""
+
+    def __init__(self):
+        self._generation = 0
+        self._strong: Dict[int, Tuple[Any, int]] = {}
+        self._weak: Dict[int, weakref.ref] = {}
+        # ids of the values linked in the Shell, oldest first
+        self._pinned: "OrderedDict[int, None]" = OrderedDict()
+        self._history_ids: Set[int] = set()
+
+    def __setitem__(self, object_id: int, value: Any) -> None:
+        self._strong[object_id] = (value, self._generation)
+        self._weak.pop(object_id, None)
+
+    def __getitem__(self, object_id: int) -> Any:
+        if object_id in self._strong:
+            value = self._strong[object_id][0]
+        else:
+            ref = self._weak.get(object_id)
+            value = ref() if ref is not None else None
+            if value is None:
+                raise KeyError(object_id)
+
+        # the front-end is interested in it again
+        self[object_id] = value
+        return value
+
+    def __contains__(self, object_id: int) -> bool:
+        if object_id in self._strong:
+            return True
+
+        ref = self._weak.get(object_id)
+        return ref is not None and ref() is not None
+
+    def __iter__(self) -> Iterator[int]:
+        # copy, because iterating callers may register more objects
+        return iter(list(self._strong) + [key for key in self._weak if key in self])
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+    def pin(self, object_id: int, value: Any) -> None:
+        """Keeps the object until it gets pushed out by HEAP_PIN_LIMIT newer pinned objects"""
+        self[object_id] = value
+        self._pinned[object_id] = None
+        self._pinned.move_to_end(object_id)
+        while len(self._pinned) > HEAP_PIN_LIMIT:
+            self._pinned.popitem(last=False)
+
+    def set_history_ids(self, object_ids: Iterable[int]) -> None:
+        """Keeps the objects of the Object inspector's navigation history"""
+        self._history_ids = set(object_ids)
+
+    def end_generation(self) -> None:
+        oldest_kept_generation = self._generation - HEAP_KEEP_GENERATIONS + 1
+        for object_id, (value, generation) in list(self._strong.items()):
+            if (
+                generation >= oldest_kept_generation
+                or object_id in self._pinned
+                or object_id in self._history_ids
+            ):
+                continue
+
+            del self._strong[object_id]
+            try:
+                self._weak[object_id] = weakref.ref(
+                    value, lambda ref, object_id=object_id: self._forget_weak(object_id, ref)
+                )
+            except TypeError:
+                # This type doesn't support weak references, just forget the object
+                pass
+
+        self._generation += 1
+
+    def _forget_weak(self, object_id: int, ref: weakref.ref) -> None:
+        # the id may have been registered for another object meanwhile
+        if self._weak.get(object_id) is ref:
+            del self._weak[object_id]
+
+    def get_stats(self) -> Dict[str, int]:
+        estimated_size = 0
+        for value, _ in self._strong.values():
+            try:
+                estimated_size += sys.getsizeof(value)
+            except Exception:
+                pass
+
+        return {
+            "generation": self._generation,
+            "strong_count": len(self._strong),
+            "weak_count": sum(1 for ref in self._weak.values() if ref() is not None),
+            "estimated_size": estimated_size,
+        }
@@ -0,0 +1,139 @@
+"""
+Memory tracking for runs with track_memory option.
+
+While tracking, tracemalloc records the stack of each memory block allocation. Snapshots
+are taken when a ToplevelResponse is sent or the debugger stops at a breakpoint. Each
+allocation is attributed to the innermost frame in user's files (see _is_library_file).
+Allocations made by library code on behalf of user's code are attributed to the calling
+line, allocations made by PyStart's own code are ignored.
+
+Snapshots are sent as MemorySnapshot events. Lines are given as (file index, lineno, ...)
+tuples, where file index refers to the filenames list of the same event:
+
+* top_lines: (file index, lineno, size, count) of the lines holding most memory,
+* growth_lines: (file index, lineno, size diff, count diff) of the lines, which changed most
+  since previous snapshot,
+* file_sizes: (file index, size, size diff) of all files with tracked memory.
+"""
+
+import os.path
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import pystart
+from pystart.common import BackendEvent, path_startswith
+from pystart.plugins.cpython_backend.cp_back import _is_library_file
+
+TRACEMALLOC_FRAME_COUNT = 10
+REPORTED_LINE_COUNT = 50
+
+
+class MemoryTracker:
+    def __init__(self):
+        self._pystart_src_dir = os.path.dirname(pystart.__file__)
+        self._file_kind_cache: Dict[str, str] = {}
+        self._started_tracemalloc = False
+        self._previous_sizes: Dict[Tuple[str, int], Tuple[int, int]] = {}
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAME_COUNT)
+            self._started_tracemalloc = True
+        self._previous_sizes = {}
+
+    def stop(self) -> None:
+        if self._started_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracemalloc = False
+        self._previous_sizes = {}
+
+    def create_snapshot_event(self) -> BackendEvent:
+        if not tracemalloc.is_tracing():
+            # user program stopped it
+            return BackendEvent("MemorySnapshot", tracing=False)
+
+        sizes = self._get_sizes_by_line(tracemalloc.take_snapshot())
+        traced_size, traced_peak = tracemalloc.get_traced_memory()
+
+        filenames: List[str] = []
+        file_indices: Dict[str, int] = {}
+
+        def get_file_index(filename):
+            index = file_indices.get(filename)
+            if index is None:
+                index = file_indices[filename] = len(filenames)
+                filenames.append(filename)
+            return index
+
+        top_lines = [
+            (get_file_index(filename), lineno, size, count)
+            for (filename, lineno), (size, count) in sorted(
+                sizes.items(), key=lambda item: item[1][0], reverse=True
+            )[:REPORTED_LINE_COUNT]
+        ]
+
+        diffs = []
+        for key in sizes.keys() | self._previous_sizes.keys():
+            size, count = sizes.get(key, (0, 0))
+            previous_size, previous_count = self._previous_sizes.get(key, (0, 0))
+            if size != previous_size or count != previous_count:
+                diffs.append((key, size - previous_size, count - previous_count))
+        diffs.sort(key=lambda item: abs(item[1]), reverse=True)
+        growth_lines = [
+            (get_file_index(filename), lineno, size_diff, count_diff)
+            for (filename, lineno), size_diff, count_diff in diffs[:REPORTED_LINE_COUNT]
+        ]
+
+        file_totals: Dict[str, List[int]] = {}
+        for (filename, _), (size, _) in sizes.items():
+            file_totals.setdefault(filename, [0, 0])[0] += size
+        for (filename, _), size_diff, _ in diffs:
+            file_totals.setdefault(filename, [0, 0])[1] += size_diff
+        file_sizes = [
+            (get_file_index(filename), size, size_diff)
+            for filename, (size, size_diff) in file_totals.items()
+        ]
+
+        self._previous_sizes = sizes
+
+        return BackendEvent(
+            "MemorySnapshot",
+            tracing=True,
+            filenames=filenames,
+            top_lines=top_lines,
+            growth_lines=growth_lines,
+            file_sizes=file_sizes,
+            traced_size=traced_size,
+            traced_peak=traced_peak,
+        )
+
+    def _get_sizes_by_line(self, snapshot) -> Dict[Tuple[str, int], Tuple[int, int]]:
+        sizes = {}
+        for stat in snapshot.statistics("traceback"):
+            # Traceback lists the frames from the oldest to the most recent
+            for frame in reversed(stat.traceback):
+                kind = self._get_file_kind(frame.filename)
+                if kind == "library":
+                    continue
+                # module code starts with an instruction at line 0 in Python 3.11+
+                if kind == "user" and frame.lineno:
+                    key = (frame.filename, frame.lineno)
+                    size, count = sizes.get(key, (0, 0))
+                    sizes[key] = (size + stat.size, count + stat.count)
+                # allocations of the back-end itself (e.g. debugger) are ignored
+                break
+
+        return sizes
+
+    def _get_file_kind(self, filename: str) -> str:
+        result = self._file_kind_cache.get(filename)
+        if result is None:
+            if path_startswith(filename, self._pystart_src_dir):
+                result = "pystart"
+            elif filename.startswith("<") or _is_library_file(filename):
+                result = "library"
+            else:
+                result = "user"
+            self._file_kind_cache[filename] = result
+
+        return result
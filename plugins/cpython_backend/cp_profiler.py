@@ -0,0 +1,120 @@
+"""
+Sampling profiler for the Profile command.
+
+A helper thread wakes up after every SAMPLING_INTERVAL seconds, takes the current stack of
+the thread running the user program from sys._current_frames() and counts how many times
+each distinct stack was seen. The user program itself runs without any tracing hooks.
+
+Actual sampling may be less frequent than requested, because the sampling thread needs to
+wait for the GIL. Therefore the counted stacks are sent to the front-end in ProfileSamples
+events (after every BATCH_INTERVAL seconds) together with the wall-clock time they cover.
+
+Frames are referred to by location ids. Each location (filename, firstlineno, code name,
+lineno) is sent only once, in the first batch which uses it.
+"""
+
+import _thread
+import sys
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from pystart.common import BackendEvent
+from pystart.plugins.cpython_backend.cp_back import Executor
+
+SAMPLING_INTERVAL = 0.005
+BATCH_INTERVAL = 0.5
+
+
+class SamplingProfiler(Executor):
+    def __init__(self, backend, original_cmd):
+        super().__init__(backend, original_cmd)
+        self._location_ids: Dict[Tuple, int] = {}
+        self._new_locations: List[Tuple[str, int, str, int]] = []
+        self._pending_stacks: Dict[Tuple[int, ...], int] = {}
+        self._batch_start_time = None
+        self._root_code = None
+        self._target_thread_id = None
+        self._stop_event = threading.Event()
+        # held by the sampling thread while it is running
+        self._sampler_lock = _thread.allocate_lock()
+
+    def _execute_prepared_user_code(self, statements, global_vars):
+        self._root_code = statements
+        self._target_thread_id = _thread.get_ident()
+        self._batch_start_time = time.perf_counter()
+        self._sampler_lock.acquire()
+        # Low-level thread doesn't show up in threading.enumerate() of the user program
+        _thread.start_new_thread(self._sample_periodically, ())
+        try:
+            return super()._execute_prepared_user_code(statements, global_vars)
+        finally:
+            self._stop_event.set()
+            with self._sampler_lock:
+                # last samples must reach the front-end before the ToplevelResponse
+                self._send_samples()
+
+    def _sample_periodically(self):
+        # NB! Runs in a separate thread, must not use logging or threading.current_thread
+        try:
+            next_batch_time = time.perf_counter() + BATCH_INTERVAL
+            while not self._stop_event.wait(SAMPLING_INTERVAL):
+                self._take_sample()
+                if time.perf_counter() >= next_batch_time:
+                    self._send_samples()
+                    next_batch_time = time.perf_counter() + BATCH_INTERVAL
+        finally:
+            self._sampler_lock.release()
+
+    def _take_sample(self):
+        frame = sys._current_frames().get(self._target_thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(self._get_location_id(frame))
+            if frame.f_code is self._root_code:
+                break
+            frame = frame.f_back
+        else:
+            # Program is not running user code (e.g. it is in an atexit handler)
+            return
+
+        stack.reverse()
+        key = tuple(stack)
+        self._pending_stacks[key] = self._pending_stacks.get(key, 0) + 1
+
+    def _get_location_id(self, frame) -> int:
+        code = frame.f_code
+        # f_lineno may be None while some instructions are executed in Python 3.12+
+        lineno = frame.f_lineno or code.co_firstlineno
+        key = (code, lineno)
+        location_id = self._location_ids.get(key)
+        if location_id is None:
+            location_id = len(self._location_ids)
+            self._location_ids[key] = location_id
+            self._new_locations.append(
+                (
+                    code.co_filename,
+                    code.co_firstlineno,
+                    getattr(code, "co_qualname", code.co_name),
+                    lineno,
+                )
+            )
+
+        return location_id
+
+    def _send_samples(self):
+        if not self._pending_stacks and not self._new_locations:
+            return
+
+        now = time.perf_counter()
+        self._backend.send_message(
+            BackendEvent(
+                "ProfileSamples",
+                locations=self._new_locations,
+                samples=[(stack, count) for stack, count in self._pending_stacks.items()],
+                duration=now - self._batch_start_time,
+            )
+        )
+        self._batch_start_time = now
+        self._new_locations = []
+        self._pending_stacks = {}
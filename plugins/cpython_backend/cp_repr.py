@@ -0,0 +1,158 @@
+"""
+Bounded repr for values shown in the front-end.
+
+Builtin repr of a big container produces the whole string before it can be cut.
+Here the output is built piece by piece and building stops when the length limit is reached.
+When this takes too long (eg. a container holding objects with slow repr),
+a summary with the type and size of the value is given instead.
+"""
+
+import sys
+import time
+
+DEFAULT_REPR_TIME_BUDGET = 0.05
+TRUNCATION_MARKER = "…"
+
+# nesting depth after which containers are shown as ...
+_MAX_LEVEL = 50
+# check the clock after this many elements
+_TIME_CHECK_INTERVAL = 64
+
+_COLLECTION_BRACKETS = {
+    list: ("[", "]"),
+    tuple: ("(", ")"),
+    set: ("{", "}"),
+    frozenset: ("frozenset({", "})"),
+}
+
+
+class _LengthLimitReached(Exception):
+    pass
+
+
+class _TimeLimitReached(Exception):
+    pass
+
+
+class _BoundedReprBuilder:
+    def __init__(self, max_length: int, deadline: float):
+        self._max_length = max_length
+        self._deadline = deadline
+        self._parts = []
+        self._length = 0
+        self._step_count = 0
+        # for detecting recursive containers
+        self._active_ids = set()
+
+    def get_result(self) -> str:
+        return "".join(self._parts)
+
+    def add(self, value, level: int = 0) -> None:
+        value_type = type(value)
+        if value_type is str or value_type is bytes:
+            # don't create repr for the part which won't be shown anyway
+            self._write(repr(value[: self._max_length - self._length + 1]))
+        elif value_type in _COLLECTION_BRACKETS:
+            self._add_collection(value, level)
+        elif value_type is dict:
+            self._add_dict(value, level)
+        elif value_type.__name__ == "ndarray" and value_type.__module__ == "numpy":
+            self._add_ndarray(value)
+        elif value_type.__name__ in ("DataFrame", "Series") and value_type.__module__.startswith(
+            "pandas"
+        ):
+            self._add_pandas_object(value)
+        else:
+            self._write(repr(value))
+
+    def _add_collection(self, value, level: int) -> None:
+        value_type = type(value)
+        if not value:
+            self._write("set()" if value_type is set else repr(value))
+            return
+
+        opening, closing = _COLLECTION_BRACKETS[value_type]
+        if id(value) in self._active_ids or level >= _MAX_LEVEL:
+            self._write(opening + "..." + closing)
+            return
+
+        self._active_ids.add(id(value))
+        self._write(opening)
+        for i, item in enumerate(value):
+            if i > 0:
+                self._write(", ")
+            self._check_time()
+            self.add(item, level + 1)
+
+        if value_type is tuple and len(value) == 1:
+            self._write(",")
+        self._write(closing)
+        self._active_ids.remove(id(value))
+
+    def _add_dict(self, value: dict, level: int) -> None:
+        if id(value) in self._active_ids or level >= _MAX_LEVEL:
+            self._write("{...}")
+            return
+
+        self._active_ids.add(id(value))
+        self._write("{")
+        for i, (key, item) in enumerate(value.items()):
+            if i > 0:
+                self._write(", ")
+            self._check_time()
+            self.add(key, level + 1)
+            self._write(": ")
+            self.add(item, level + 1)
+        self._write("}")
+        self._active_ids.remove(id(value))
+
+    def _add_ndarray(self, value) -> None:
+        numpy = sys.modules["numpy"]
+        # user may have turned off summarization
+        with numpy.printoptions(threshold=100, edgeitems=3):
+            self._write(repr(value))
+
+    def _add_pandas_object(self, value) -> None:
+        pandas = sys.modules["pandas"]
+        with pandas.option_context("display.max_rows", 20, "display.max_columns", 20):
+            self._write(repr(value))
+
+    def _write(self, s: str) -> None:
+        self._parts.append(s)
+        self._length += len(s)
+        if self._length > self._max_length:
+            raise _LengthLimitReached()
+
+    def _check_time(self) -> None:
+        self._step_count += 1
+        if (
+            self._step_count % _TIME_CHECK_INTERVAL == 0
+            and time.perf_counter() > self._deadline
+        ):
+            raise _TimeLimitReached()
+
+
+def bounded_repr(value, max_length: int, time_budget: float = DEFAULT_REPR_TIME_BUDGET) -> str:
+    """Returns repr of the value, cut to max_length (and marked with an ellipsis) if necessary.
+
+    Falls back to summary if the repr can't be produced within time_budget seconds.
+    """
+    builder = _BoundedReprBuilder(max_length, time.perf_counter() + time_budget)
+    try:
+        builder.add(value)
+    except _LengthLimitReached:
+        return builder.get_result()[:max_length] + TRUNCATION_MARKER
+    except _TimeLimitReached:
+        return summarize_value(value)
+
+    return builder.get_result()
+
+
+def summarize_value(value) -> str:
+    type_name = type(value).__name__
+    try:
+        size = len(value)
+    except Exception:
+        return "<%s object>" % type_name
+
+    return "<%s object with %d items>" % (type_name, size)
@@ -2,15 +2,19 @@ import _ast
 import ast
 import builtins
 import dis
+import hashlib
 import inspect
 import os.path
 import site
+import string
 import sys
-from collections import namedtuple
+import threading
+from collections import deque, namedtuple
 from importlib.machinery import PathFinder, SourceFileLoader
 from logging import getLogger
 from typing import Union
 
+import pystart
 from pystart import report_time
 from pystart.common import (
     DebuggerCommand,
@@ -26,6 +30,7 @@ from pystart.common import (
     try_load_modules_with_frontend_sys_path,
 )
 from pystart.plugins.cpython_backend.cp_back import Executor, format_exception_with_frame_info
+from pystart.plugins.cpython_backend.cp_code_cache import CodeCache
 
 BEFORE_STATEMENT_MARKER = "_pystart_hidden_before_stmt"
 BEFORE_EXPRESSION_MARKER = "_pystart_hidden_before_expr"
@@ -38,6 +43,11 @@ _CO_ITERABLE_COROUTINE = getattr(inspect, "CO_ITERABLE_COROUTINE", 0)
 _CO_ASYNC_GENERATOR = getattr(inspect, "CO_ASYNC_GENERATOR", 0)
 _CO_WEIRDO = _CO_GENERATOR | _CO_COROUTINE | _CO_ITERABLE_COROUTINE | _CO_ASYNC_GENERATOR
 
+DEFAULT_HISTORY_MEMORY_LIMIT_MB = 200
+
+# Increase when instrumentation changes, so that cached code gets invalidated
+INSTRUMENTATION_VERSION = 1
+
 
 logger = getLogger(__name__)
 
@@ -68,6 +78,8 @@ class Tracer(Executor):
         self._canonic_path_cache = {}
         self._file_interest_cache = {}
         self._file_breakpoints_cache = {}
+        self._breakpoint_code_cache = {}
+        self._breakpoint_hits = {}
         self._command_completion_handler = None
 
         # first (automatic) stepping command depends on whether any breakpoints were set or not
@@ -108,17 +120,23 @@ class Tracer(Executor):
     def _execute_prepared_user_code(self, statements, global_vars):
         old_breakpointhook = None
         try:
-            sys.settrace(self._trace)
+            self._start_tracing()
             if hasattr(sys, "breakpointhook"):
                 old_breakpointhook = sys.breakpointhook
                 sys.breakpointhook = self._breakpointhook
 
             return super()._execute_prepared_user_code(statements, global_vars)
         finally:
-            sys.settrace(None)
+            self._stop_tracing()
             if hasattr(sys, "breakpointhook"):
                 sys.breakpointhook = old_breakpointhook
 
+    def _start_tracing(self):
+        sys.settrace(self._trace)
+
+    def _stop_tracing(self):
+        sys.settrace(None)
+
     def _is_interesting_frame(self, frame):
         code = frame.f_code
 
@@ -173,6 +191,9 @@ class Tracer(Executor):
     def _is_interesting_exception(self, frame, arg):
         return arg[0] not in (StopIteration, StopAsyncIteration)
 
+    def is_at_breakpoint_stop(self):
+        return self._current_command.name == "resume" and not self.is_in_past()
+
     def _fetch_next_debugger_command(self, current_frame):
         while True:
             cmd = self._backend._fetch_next_incoming_message()
@@ -194,9 +215,9 @@ class Tracer(Executor):
         if self._current_command.breakpoints != self._prev_breakpoints:
             self._file_interest_cache = {}  # because there may be new breakpoints
             self._file_breakpoints_cache = {}
-            for path, linenos in self._current_command.breakpoints.items():
-                self._file_breakpoints_cache[path] = linenos
-                self._file_breakpoints_cache[self._get_canonic_path(path)] = linenos
+            for path, path_breakpoints in self._current_command.breakpoints.items():
+                self._file_breakpoints_cache[path] = path_breakpoints
+                self._file_breakpoints_cache[self._get_canonic_path(path)] = path_breakpoints
 
     def _register_affected_frame(self, exception_obj, frame):
         # I used to store the frame ids in a new field inside exception object,
@@ -207,16 +228,101 @@ class Tracer(Executor):
         self._affected_frame_ids_per_exc_id[exc_id].add(id(frame))
 
     def _get_breakpoints_in_file(self, filename):
+        """Returns the BreakpointInfos in this file by line number"""
         result = self._file_breakpoints_cache.get(filename, None)
 
         if result is not None:
             return result
 
         canonic_path = self._get_canonic_path(filename)
-        result = self._file_breakpoints_cache.get(canonic_path, set())
+        result = self._file_breakpoints_cache.get(canonic_path, {})
         self._file_breakpoints_cache[filename] = result
         return result
 
+    def _check_breakpoint_properties(self, frame, lineno, breakpoint_info):
+        """Evaluates the condition, hit count and log message of the breakpoint, which was
+        reached in given (live) frame. Returns whether the debugger should stop."""
+        if breakpoint_info.is_plain():
+            return True
+
+        if breakpoint_info.condition is not None:
+            try:
+                code = self._get_breakpoint_code(breakpoint_info.condition)
+                if not eval(code, frame.f_globals, frame.f_locals):
+                    return False
+            except Exception as e:
+                # Better stop and let the user see the problem
+                self._report_breakpoint_error(frame, lineno, "condition", e)
+                return True
+
+        if breakpoint_info.hit_count is not None:
+            # Changing the properties of the breakpoint starts the counting from scratch
+            key = (self._get_canonic_path(frame.f_code.co_filename), lineno, breakpoint_info)
+            self._breakpoint_hits[key] = self._breakpoint_hits.get(key, 0) + 1
+            if self._breakpoint_hits[key] < breakpoint_info.hit_count:
+                return False
+
+        if breakpoint_info.log_message is not None:
+            try:
+                message = self._format_log_message(frame, breakpoint_info.log_message)
+                self._backend._send_output(message + "\n", "stdout")
+            except Exception as e:
+                self._report_breakpoint_error(frame, lineno, "log message", e)
+            return False
+
+        return True
+
+    def _format_log_message(self, frame, log_message):
+        try:
+            code = self._get_breakpoint_code("f" + repr(log_message))
+        except SyntaxError:
+            # Before Python 3.12 the expressions in an f-string can't contain backslashes,
+            # which repr adds when the message contains both kinds of quotes.
+            code = None
+
+        if code is not None:
+            return eval(code, frame.f_globals, frame.f_locals)
+
+        parts = []
+        for literal, expression, format_spec, conversion in string.Formatter().parse(
+            log_message
+        ):
+            parts.append(literal)
+            if expression is None:
+                continue
+
+            value = eval(self._get_breakpoint_code(expression), frame.f_globals, frame.f_locals)
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            parts.append(format(value, format_spec or ""))
+
+        return "".join(parts)
+
+    def _get_breakpoint_code(self, expression):
+        # Compile each expression only once. Compilation errors get cached as well.
+        result = self._breakpoint_code_cache.get(expression)
+        if result is None:
+            try:
+                result = compile(expression, "<breakpoint>", "eval")
+            except SyntaxError as e:
+                result = e
+            self._breakpoint_code_cache[expression] = result
+
+        if isinstance(result, SyntaxError):
+            raise result
+        return result
+
+    def _report_breakpoint_error(self, frame, lineno, part, error):
+        self._backend._send_output(
+            "Could not evaluate breakpoint %s at %s, line %d: %s: %s\n"
+            % (part, frame.f_code.co_filename, lineno, type(error).__name__, error),
+            "stderr",
+        )
+
     def _get_current_exception(self):
         if self._fresh_exception is not None:
             return self._fresh_exception
@@ -377,14 +483,18 @@ class FastTracer(Tracer):
         return True
 
     def _cmd_step_over_completed(self, frame):
+        # Evaluated first, because logpoints and hit counts need it even when the step
+        # completes anyway
+        at_a_breakpoint = self._at_a_breakpoint(frame)
         return (
-            id(frame) == self._current_command.frame_id
+            at_a_breakpoint
+            or id(frame) == self._current_command.frame_id
             or self._command_frame_returned
-            or self._at_a_breakpoint(frame)
         )
 
     def _cmd_step_out_completed(self, frame):
-        return self._command_frame_returned or self._at_a_breakpoint(frame)
+        at_a_breakpoint = self._at_a_breakpoint(frame)
+        return at_a_breakpoint or self._command_frame_returned
 
     def _cmd_resume_completed(self, frame):
         return self._at_a_breakpoint(frame)
@@ -404,7 +514,7 @@ class FastTracer(Tracer):
                     co_linenos = {pair[1] for pair in dis.findlinestarts(f_code)}
                     self._code_linenos_cache[code_id] = co_linenos
 
-                result = bps_in_file.intersection(co_linenos)
+                result = bps_in_file.keys() & co_linenos
 
             self._code_breakpoints_cache[code_id] = result
 
@@ -412,7 +522,11 @@ class FastTracer(Tracer):
 
     def _at_a_breakpoint(self, frame):
         # TODO: try re-entering same line in loop
-        return frame.f_lineno in self._get_breakpoints_in_code(frame.f_code)
+        if frame.f_lineno not in self._get_breakpoints_in_code(frame.f_code):
+            return False
+
+        breakpoint_info = self._get_breakpoints_in_file(frame.f_code.co_filename)[frame.f_lineno]
+        return self._check_breakpoint_properties(frame, frame.f_lineno, breakpoint_info)
 
     def _is_interesting_exception(self, frame, arg):
         return super()._is_interesting_exception(frame, arg) and (
@@ -425,19 +539,240 @@ class FastTracer(Tracer):
         )
 
 
+class MonitoringTracer(FastTracer):
+    """FastTracer built on sys.monitoring (PEP 669), available since Python 3.12.
+
+    Instead of getting a callback for every new frame, it subscribes only to the events
+    which are relevant for current command:
+
+    * LINE events are enabled only for code objects containing breakpoints and, while
+      stepping over or out, for the code objects in the reported stack;
+    * PY_START is used for discovering code objects with breakpoints and gets switched
+      off (with DISABLE) for each code object after its first call;
+    * global LINE and PY_RETURN events are used only while stepping into.
+
+    Switched off events are restarted when next debugger command arrives.
+    Falls back to sys.settrace if another debugger already holds the tool id.
+    """
+
+    def __init__(self, backend, original_cmd):
+        self._monitoring_active = False
+        self._local_events = {}  # event sets given to sys.monitoring per code object
+        super().__init__(backend, original_cmd)
+        self._main_thread_id = threading.get_ident()
+
+    def _start_tracing(self):
+        monitoring = sys.monitoring
+        try:
+            monitoring.use_tool_id(monitoring.DEBUGGER_ID, "pystart")
+        except ValueError:
+            logger.warning("Debugger tool id is taken, falling back to sys.settrace")
+            super()._start_tracing()
+            return
+
+        for event, callback in self._get_monitoring_callbacks().items():
+            monitoring.register_callback(monitoring.DEBUGGER_ID, event, callback)
+
+        self._monitoring_active = True
+        self._update_monitored_events(None)
+
+    def _stop_tracing(self):
+        if not self._monitoring_active:
+            super()._stop_tracing()
+            return
+
+        monitoring = sys.monitoring
+        self._monitoring_active = False
+        monitoring.set_events(monitoring.DEBUGGER_ID, 0)
+        for code in self._local_events:
+            monitoring.set_local_events(monitoring.DEBUGGER_ID, code, 0)
+        self._local_events = {}
+        for event in self._get_monitoring_callbacks():
+            monitoring.register_callback(monitoring.DEBUGGER_ID, event, None)
+        monitoring.free_tool_id(monitoring.DEBUGGER_ID)
+
+    def _get_monitoring_callbacks(self):
+        events = sys.monitoring.events
+        return {
+            events.PY_START: self._on_py_start,
+            events.PY_RETURN: self._on_py_return,
+            events.PY_YIELD: self._on_py_return,
+            events.PY_UNWIND: self._on_py_unwind,
+            events.LINE: self._on_line,
+            events.RAISE: self._on_raise,
+        }
+
+    def _initialize_new_command(self, current_frame):
+        super()._initialize_new_command(current_frame)
+        if self._monitoring_active:
+            self._update_monitored_events(current_frame)
+
+    def _update_monitored_events(self, current_frame):
+        monitoring = sys.monitoring
+        events = monitoring.events
+        command_name = self._current_command.name
+
+        # Unwinding can't be monitored per code object
+        global_events = events.PY_START | events.PY_UNWIND
+        if command_name == "step_into":
+            global_events |= events.LINE | events.PY_RETURN | events.PY_YIELD | events.RAISE
+        elif command_name == "step_over":
+            global_events |= events.RAISE
+
+        # Code objects met before keep their LINE events if they (still) contain breakpoints.
+        # The ones called later get them in _on_py_start.
+        new_local_events = {
+            code: events.LINE for code in self._local_events if self._get_breakpoints_in_code(code)
+        }
+
+        # Frames on the stack need to notify about returning and, depending on the
+        # command, about reaching next line
+        stack_events = events.PY_RETURN | events.PY_YIELD
+        if command_name in ["step_over", "step_out"]:
+            stack_events |= events.LINE
+
+        frame = current_frame
+        while frame is not None:
+            code = frame.f_code
+            code_events = new_local_events.get(code, 0)
+            if id(frame) in self._last_reported_frame_ids:
+                code_events |= stack_events
+            if self._get_breakpoints_in_code(code):
+                code_events |= events.LINE
+            if code_events:
+                new_local_events[code] = code_events
+            frame = frame.f_back
+
+        for code in self._local_events:
+            if code not in new_local_events:
+                monitoring.set_local_events(monitoring.DEBUGGER_ID, code, 0)
+        for code, code_events in new_local_events.items():
+            monitoring.set_local_events(monitoring.DEBUGGER_ID, code, code_events)
+        self._local_events = new_local_events
+
+        monitoring.set_events(monitoring.DEBUGGER_ID, global_events)
+        monitoring.restart_events()
+
+    def _add_local_events(self, code, code_events):
+        old_events = self._local_events.get(code, 0)
+        if old_events | code_events != old_events:
+            self._local_events[code] = old_events | code_events
+            sys.monitoring.set_local_events(
+                sys.monitoring.DEBUGGER_ID, code, self._local_events[code]
+            )
+
+    def _on_py_start(self, code, instruction_offset):
+        if threading.get_ident() != self._main_thread_id:
+            return None
+
+        frame = sys._getframe(1)
+        if self._is_interesting_frame(frame):
+            self._fresh_exception = None
+            self._check_store_main_frame_id(frame)
+            if self._get_breakpoints_in_code(code):
+                self._add_local_events(code, sys.monitoring.events.LINE)
+
+        # Events of next calls are already determined by local events of this code object
+        return sys.monitoring.DISABLE
+
+    def _on_py_return(self, code, instruction_offset, retval):
+        if threading.get_ident() != self._main_thread_id:
+            return None
+
+        frame = sys._getframe(1)
+        if not self._is_interesting_frame(frame):
+            return sys.monitoring.DISABLE
+
+        self._handle_frame_exit(frame)
+        return None
+
+    def _on_py_unwind(self, code, instruction_offset, exception):
+        if threading.get_ident() != self._main_thread_id:
+            return
+
+        frame = sys._getframe(1)
+        if self._is_interesting_frame(frame):
+            self._handle_frame_exit(frame)
+
+    def _handle_frame_exit(self, frame):
+        self._fresh_exception = None
+        frame_id = id(frame)
+        if frame_id == self._current_command["frame_id"]:
+            self._command_frame_returned = True
+        self._check_notify_return(frame_id)
+
+    def _on_line(self, code, line_number):
+        if threading.get_ident() != self._main_thread_id:
+            return None
+
+        frame = sys._getframe(1)
+        if not self._is_interesting_frame(frame):
+            return sys.monitoring.DISABLE
+
+        if self._backend.is_doing_io():
+            return None
+
+        self._fresh_exception = None
+        if self._command_completion_handler(frame):
+            self._report_current_state(frame)
+            self._fetch_next_debugger_command(frame)
+        elif (
+            self._current_command.name == "resume"
+            and line_number not in self._get_breakpoints_in_code(code)
+        ):
+            # Only breakpoints can stop resuming, and they can't change before next command
+            return sys.monitoring.DISABLE
+
+        return None
+
+    def _on_raise(self, code, instruction_offset, exception):
+        # RAISE events can't be disabled locally
+        if threading.get_ident() != self._main_thread_id:
+            return
+
+        frame = sys._getframe(1)
+        if not self._is_interesting_frame(frame) or self._backend.is_doing_io():
+            return
+
+        arg = (type(exception), exception, exception.__traceback__)
+        if self._is_interesting_exception(frame, arg):
+            self._fresh_exception = arg
+            self._register_affected_frame(exception, frame)
+            # UI doesn't know about separate exception events
+            self._report_current_state(frame)
+            self._fetch_next_debugger_command(frame)
+
+
+def get_fast_tracer_class():
+    if hasattr(sys, "monitoring"):
+        return MonitoringTracer
+    else:
+        return FastTracer
+
+
 class NiceTracer(Tracer):
     def __init__(self, backend, original_cmd):
         super().__init__(backend, original_cmd)
         self._instrumented_files = set()
         self._install_marker_functions()
         self._custom_stack = []
-        self._saved_states = []
+        self._saved_states = StateHistory(
+            (original_cmd.get("history_memory_limit_mb") or DEFAULT_HISTORY_MEMORY_LIMIT_MB)
+            * 1024
+            * 1024
+        )
         self._current_state_index = 0
 
         from collections import Counter
 
         self._fulltags = Counter()
         self._nodes = {}
+        self._node_id_base = 0
+        self._file_node_ids = []
+        self._code_cache = CodeCache(
+            os.path.join(pystart.get_pystart_user_dir(), "instrumented_code_cache"),
+            INSTRUMENTATION_VERSION,
+        )
 
     def _breakpointhook(self, *args, **kw):
         self._report_state(len(self._saved_states) - 1)
@@ -464,6 +799,8 @@ class NiceTracer(Tracer):
         from pystart import ast_utils
 
         root = ast.parse(source, filename, mode)
+        self._node_id_base = _get_node_id_base(source, filename)
+        self._file_node_ids = []
 
         ast_utils.mark_text_ranges(root, source)
         self._tag_nodes(root)
@@ -474,6 +811,92 @@ class NiceTracer(Tracer):
 
         return root
 
+    def _compile_module(self, source, filename, ast_postprocessors):
+        if ast_postprocessors:
+            # their effect can't be cached
+            return super()._compile_module(source, filename, ast_postprocessors)
+
+        return self._compile_instrumented(source, filename)
+
+    def _compile_repl_code(self, source, filename):
+        # instrumentation registers the nodes of this executor, so the code can't be shared
+        return self._create_repl_code(source, filename)
+
+    def _compile_instrumented(self, source: Union[str, bytes], filename: str):
+        cache_key = self._code_cache.get_key(source, filename)
+        cached = self._code_cache.get(cache_key)
+        if cached is not None:
+            code, node_records = cached
+            self._restore_nodes(node_records)
+            self._instrumented_files.add(filename)
+            return code
+
+        root = self._prepare_ast(source, filename, "exec")
+        code = compile(root, filename, "exec")
+        self._code_cache.put(cache_key, (code, self._get_node_records()))
+        return code
+
+    def _get_node_records(self):
+        """Returns the information about current file's nodes, which is required while tracing.
+
+        Includes also the nodes which are reachable from the exported nodes only via
+        parent_node"""
+        records = []
+        todo = list(self._file_node_ids)
+        done = set()
+        while todo:
+            node_id = todo.pop()
+            if node_id in done:
+                continue
+            done.add(node_id)
+
+            node = self._nodes[node_id]
+            parent_node = getattr(node, "parent_node", None)
+            if parent_node is None:
+                parent_id = None
+            else:
+                parent_id = self._get_node_id(parent_node)
+                todo.append(parent_id)
+
+            parent_statement_focus = getattr(node, "parent_statement_focus", None)
+            records.append(
+                (
+                    node_id,
+                    frozenset(node.tags),
+                    getattr(node, "lineno", None),
+                    getattr(node, "col_offset", None),
+                    getattr(node, "end_lineno", None),
+                    getattr(node, "end_col_offset", None),
+                    parent_id,
+                    None if parent_statement_focus is None else tuple(parent_statement_focus),
+                )
+            )
+
+        return records
+
+    def _restore_nodes(self, node_records):
+        parent_ids = {}
+        for (
+            node_id,
+            tags,
+            lineno,
+            col_offset,
+            end_lineno,
+            end_col_offset,
+            parent_id,
+            parent_statement_focus,
+        ) in node_records:
+            node = CachedNode(set(tags), lineno, col_offset, end_lineno, end_col_offset)
+            node.node_id = node_id
+            if parent_statement_focus is not None:
+                node.parent_statement_focus = TextRange(*parent_statement_focus)
+            self._nodes[node_id] = node
+            if parent_id is not None:
+                parent_ids[node_id] = parent_id
+
+        for node_id, parent_id in parent_ids.items():
+            self._nodes[node_id].parent_node = self._nodes[parent_id]
+
     def _should_skip_frame(self, frame, event):
         # nice tracer can't skip any of the frames which need to be
         # shown in the stacktrace
@@ -707,6 +1130,8 @@ class NiceTracer(Tracer):
         else:
             # make full export
             stack = self._export_stack()
+            if prev_state is not None:
+                stack = self._share_unchanged_exports(stack, prev_state["stack"])
             exception_info = self._export_exception_info()
             active_frame_overrides = {}
 
@@ -724,7 +1149,61 @@ class NiceTracer(Tracer):
             "exception_info": exception_info,
         }
 
-        self._saved_states.append(msg)
+        self._saved_states.append(msg, self._estimate_state_size(msg, prev_state))
+
+    def _share_unchanged_exports(self, stack, prev_stack):
+        """Lets consecutive states share the frame exports which haven't changed"""
+        result = []
+        for i, tframe in enumerate(stack):
+            if i < len(prev_stack) and prev_stack[i].system_frame is tframe.system_frame:
+                prev_tframe = prev_stack[i]
+                if tframe == prev_tframe:
+                    tframe = prev_tframe
+                else:
+                    tframe = tframe._replace(
+                        locals=(
+                            prev_tframe.locals
+                            if tframe.locals == prev_tframe.locals
+                            else tframe.locals
+                        ),
+                        globals=(
+                            prev_tframe.globals
+                            if tframe.globals == prev_tframe.globals
+                            else tframe.globals
+                        ),
+                    )
+            result.append(tframe)
+
+        return result
+
+    def _estimate_state_size(self, state, prev_state):
+        """Approximate number of bytes which this state adds to the history"""
+        size = sys.getsizeof(state) + sys.getsizeof(state["active_frame_overrides"])
+        size += _estimate_evaluations_size(
+            state["active_frame_overrides"].get("current_evaluations", [])
+        )
+
+        if prev_state is not None and state["stack"] is prev_state["stack"]:
+            return size
+
+        size += sys.getsizeof(state["stack"])
+        shared_ids = set()
+        if prev_state is not None:
+            for prev_tframe in prev_state["stack"]:
+                shared_ids.update(
+                    [id(prev_tframe), id(prev_tframe.locals), id(prev_tframe.globals)]
+                )
+
+        for tframe in state["stack"]:
+            if id(tframe) in shared_ids:
+                continue
+            size += sys.getsizeof(tframe) + _estimate_evaluations_size(tframe.current_evaluations)
+            for variables in [tframe.locals, tframe.globals]:
+                if variables and id(variables) not in shared_ids:
+                    size += _estimate_variables_size(variables)
+                    shared_ids.add(id(variables))
+
+        return size
 
     def _respond_to_commands(self):
         """Tries to respond to client commands with states collected so far.
@@ -751,8 +1230,8 @@ class NiceTracer(Tracer):
                     self._fetch_next_debugger_command(frame)
 
             if self._current_command.name == "step_back":
-                if self._current_state_index == 0:
-                    # Already in first state. Remain in this loop
+                if self._current_state_index == self._saved_states.first_index:
+                    # Already in first (retained) state. Remain in this loop
                     pass
                 else:
                     assert self._current_state_index > 0
@@ -828,6 +1307,8 @@ class NiceTracer(Tracer):
 
         state["stack"] = new_stack
         state["tracer_class"] = "NiceTracer"
+        state["history_info"] = self._saved_states.get_info()
+        state["history_info"]["at_start"] = state_index == self._saved_states.first_index
 
         self._backend.send_message(DebuggerResponse(**state))
 
@@ -857,7 +1338,7 @@ class NiceTracer(Tracer):
 
                 # next step will be finalizing evaluation of parent of current expr
                 # so let's say we're before that parent expression
-                again_args = {"node_id": id(original_node.parent_node)}
+                again_args = {"node_id": self._get_node_id(original_node.parent_node)}
                 again_event = (
                     "before_expression_again"
                     if "child_of_expression" in original_node.tags
@@ -920,11 +1401,11 @@ class NiceTracer(Tracer):
         # Check if the selected message has been previously sent to front-end
         return (
             self._saved_states[self._current_state_index]["in_client_log"]
-            or self._current_state_index == 0
+            or self._current_state_index == self._saved_states.first_index
         )
 
     def _cmd_step_out_completed(self, frame, cmd):
-        if self._current_state_index == 0:
+        if self._current_state_index == self._saved_states.first_index:
             return False
 
         if frame.event == "after_statement":
@@ -966,6 +1447,32 @@ class NiceTracer(Tracer):
                 or (cmd.focus == frame.focus and cmd.state == frame.event)
                 or id(frame.system_frame) != cmd.frame_id
             )
+            and self._check_breakpoint_in_state(
+                frame, breakpoints[frame.system_frame.f_code.co_filename][frame.focus.lineno]
+            )
+        )
+
+    def _check_breakpoint_in_state(self, frame, breakpoint_info):
+        if breakpoint_info.is_plain():
+            return True
+
+        present_index = len(self._saved_states) - 1
+        if self._current_state_index != present_index:
+            # Conditions of past states can't be evaluated, because the values in the system frame
+            # have changed since. Log messages were printed when the state was new.
+            return False
+
+        if present_index > self._saved_states.first_index:
+            prev_frame = self._create_actual_active_frame(self._saved_states[present_index - 1])
+            if (
+                prev_frame.system_frame is frame.system_frame
+                and prev_frame.focus.lineno == frame.focus.lineno
+            ):
+                # Properties get evaluated when the line is reached, not for each expression in it
+                return False
+
+        return self._check_breakpoint_properties(
+            frame.system_frame, frame.focus.lineno, breakpoint_info
         )
 
     def _frame_is_alive(self, frame_id):
@@ -1411,9 +1918,19 @@ class NiceTracer(Tracer):
 
     def _export_node(self, node):
         assert isinstance(node, (ast.expr, ast.stmt))
-        node_id = id(node)
-        self._nodes[node_id] = node
-        return ast.Constant(node_id)
+        return ast.Constant(self._get_node_id(node))
+
+    def _get_node_id(self, node):
+        # Ids get baked into the code, therefore they must not depend on object addresses
+        # and must not clash with ids in other (possibly cached) files
+        node_id = getattr(node, "node_id", None)
+        if node_id is None:
+            node_id = self._node_id_base + len(self._file_node_ids)
+            node.node_id = node_id
+            self._nodes[node_id] = node
+            self._file_node_ids.append(node_id)
+
+        return node_id
 
     def _debug(self, *args):
         logger.debug("TRACER: " + str(args))
@@ -1441,12 +1958,31 @@ class FancySourceFileLoader(SourceFileLoader):
         old_tracer = sys.gettrace()
         sys.settrace(None)
         try:
-            root = self._tracer._prepare_ast(data, path, "exec")
-            return super().source_to_code(root, path)
+            return self._tracer._compile_instrumented(data, path)
         finally:
             sys.settrace(old_tracer)
 
 
+class CachedNode:
+    """Stands for an instrumented AST node when the code comes from the cache"""
+
+    def __init__(self, tags, lineno, col_offset, end_lineno, end_col_offset):
+        self.tags = tags
+        self.lineno = lineno
+        self.col_offset = col_offset
+        self.end_lineno = end_lineno
+        self.end_col_offset = end_col_offset
+
+
+def _get_node_id_base(source, filename):
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+
+    digest = hashlib.sha1(filename.encode("utf-8") + b"\0" + source).hexdigest()
+    # leave room for 2**24 nodes per file
+    return int(digest[:10], 16) << 24
+
+
 class CustomStackFrame:
     def __init__(self, frame, event, focus=None):
         self.system_frame = frame
@@ -1456,3 +1992,70 @@ class CustomStackFrame:
         self.current_statement = None
         self.current_root_expression = None
         self.node_tags = set()
+
+
+class StateHistory:
+    """Saved states of NiceTracer, indexed by their position in the whole execution.
+
+    Oldest states get dropped when the estimated memory usage exceeds the limit.
+    Step-back is possible until first_index.
+    """
+
+    def __init__(self, memory_limit):
+        self._memory_limit = memory_limit
+        self._states = deque()
+        self._sizes = deque()
+        self._end_index = 0
+        self._memory_usage = 0
+
+    @property
+    def first_index(self):
+        return self._end_index - len(self._states)
+
+    def append(self, state, estimated_size):
+        self._states.append(state)
+        self._sizes.append(estimated_size)
+        self._end_index += 1
+        self._memory_usage += estimated_size
+
+        while self._memory_usage > self._memory_limit and len(self._states) > 1:
+            self._states.popleft()
+            self._memory_usage -= self._sizes.popleft()
+
+    def get_info(self):
+        return {
+            "state_count": len(self._states),
+            "dropped_state_count": self.first_index,
+            "estimated_memory": self._memory_usage,
+            "memory_limit": self._memory_limit,
+        }
+
+    def __len__(self):
+        # Index of the next state
+        return self._end_index
+
+    def __bool__(self):
+        return bool(self._states)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._end_index
+
+        if not self.first_index <= index < self._end_index:
+            raise IndexError("State %d is not in history" % index)
+
+        return self._states[index - self.first_index]
+
+
+def _estimate_variables_size(variables):
+    size = sys.getsizeof(variables)
+    for value_info in variables.values():
+        size += sys.getsizeof(value_info) + sys.getsizeof(value_info.repr)
+    return size
+
+
+def _estimate_evaluations_size(evaluations):
+    size = sys.getsizeof(evaluations)
+    for _, value_info in evaluations:
+        size += sys.getsizeof(value_info) + sys.getsizeof(value_info.repr)
+    return size
@@ -15,6 +15,7 @@ def load_plugin():
     wb.set_default("run.backend_name", "LocalCPython")
     wb.set_default("LocalCPython.last_executables", [])
     wb.set_default("LocalCPython.executable", default_exe)
+    wb.set_default("LocalCPython.keep_spare_backend", True)
 
     # For portable version, always use the bundled Python
     # This fixes the issue when copying to a different directory
@@ -15,6 +15,7 @@ from pystart.base_file_browser import (
     LocalFileDialog,
 )
 from pystart.common import (
+    CommandToBackend,
     InlineCommand,
     InlineResponse,
     ToplevelCommand,
@@ -26,7 +27,7 @@ from pystart.common import (
 from pystart.languages import tr
 from pystart.misc_utils import running_on_mac_os, running_on_windows
 from pystart.plugins.backend_config_page import TabbedBackendDetailsConfigurationPage
-from pystart.running import WINDOWS_EXE, SubprocessProxy
+from pystart.running import WINDOWS_EXE, SubprocessProxy, generate_command_id
 from pystart.terminal import run_in_terminal
 from pystart.ui_utils import askopenfilename, create_string_var, ems_to_pixels
 
@@ -89,6 +90,16 @@ class LocalCPythonProxy(SubprocessProxy):
         self._close_backend()
         self._start_background_process()
 
+    def should_keep_spare_process(self) -> bool:
+        return get_workbench().get_option("LocalCPython.keep_spare_backend")
+
+    def send_command(self, cmd: CommandToBackend) -> Optional[str]:
+        if cmd.name in ["install_distributions", "uninstall_distributions"]:
+            # spare process may have cached the old state of site-packages
+            self._discard_spare_process()
+
+        return super().send_command(cmd)
+
     def _close_backend(self):
         self._cancel_gui_update_loop()
         super()._close_backend()
@@ -124,7 +135,9 @@ class LocalCPythonProxy(SubprocessProxy):
             # Don't send command if response for the last one hasn't arrived yet
             if not self._expecting_response_for_gui_update:
                 try:
-                    self.send_command(InlineCommand("process_gui_events"))
+                    self.send_command(
+                        InlineCommand("process_gui_events", id=generate_command_id())
+                    )
                     self._expecting_response_for_gui_update = True
                 except OSError:
                     # the backend process may have been closed already
@@ -25,11 +25,11 @@ from pystart import (
     ui_utils,
 )
 from pystart.codeview import CodeView, SyntaxText, get_syntax_options_for_tag
-from pystart.common import DebuggerCommand, InlineCommand
+from pystart.common import BreakpointInfo, DebuggerCommand, InlineCommand
 from pystart.custom_notebook import CustomNotebook
 from pystart.languages import tr
 from pystart.memory import VariablesFrame
-from pystart.misc_utils import running_on_mac_os, running_on_rpi, shorten_repr
+from pystart.misc_utils import running_on_mac_os, running_on_rpi, shorten_repr, sizeof_fmt
 from pystart.tktextext import TextFrame
 from pystart.ui_utils import CommonDialog, get_hyperlink_cursor, get_tk_version_info, select_sequence
 
@@ -83,8 +83,8 @@ class Debugger:
             bp = self.get_run_to_cursor_breakpoint()
             if bp is not None:
                 filename, lineno = bp
-                result.setdefault(filename, set())
-                result[filename].add(lineno)
+                # cursor must stop the program even if there is a conditional breakpoint
+                result.setdefault(filename, {})[lineno] = BreakpointInfo()
 
         return result
 
@@ -98,18 +98,38 @@ class Debugger:
             return (
                 self._last_progress_message
                 and self._last_progress_message["tracer_class"] == "NiceTracer"
+                and not self._last_progress_message.get("history_info", {}).get("at_start")
             )
         else:
             return True
 
     def handle_debugger_progress(self, msg):
         self._last_brought_out_frame_id = None
+        self._show_history_info(msg.get("history_info"))
+
+    def _show_history_info(self, history_info):
+        if history_info is None:
+            return
+
+        text = tr("Debugger history: %d steps, %s") % (
+            history_info["state_count"],
+            sizeof_fmt(history_info["estimated_memory"]),
+        )
+        if history_info["at_start"]:
+            if history_info["dropped_state_count"]:
+                text += ". " + tr("Older steps have been forgotten, can't step back further.")
+            else:
+                text += ". " + tr("At the beginning of the program.")
+
+        get_workbench().set_status_message(text)
 
     def handle_debugger_return(self, msg):
         pass
 
     def close(self) -> None:
         self._last_brought_out_frame_id = None
+        if self._last_progress_message and "history_info" in self._last_progress_message:
+            get_workbench().set_status_message("")
 
         if get_workbench().get_option("debugger.automatic_stack_view"):
             get_workbench().hide_view("StackView")
@@ -1293,6 +1313,8 @@ def load_plugin() -> None:
         "debugger.preferred_debugger", "faster" if running_on_rpi() else "nicer"
     )
     get_workbench().set_default("debugger.allow_stepping_into_libraries", False)
+    # memory for remembering past states (step back) in nicer debugger
+    get_workbench().set_default("debugger.history_memory_limit_mb", 200)
 
     get_workbench().add_command(
         "runresume",
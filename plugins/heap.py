@@ -9,12 +9,12 @@ from pystart import get_runner, get_workbench
 from pystart.common import InlineCommand
 from pystart.languages import tr
 from pystart.memory import MAX_REPR_LENGTH_IN_GRID, MemoryFrame, format_object_id, parse_object_id
-from pystart.misc_utils import shorten_repr
+from pystart.misc_utils import shorten_repr, sizeof_fmt
 
 
 class HeapView(MemoryFrame):
     def __init__(self, master):
-        MemoryFrame.__init__(self, master, ("id", "value"))
+        MemoryFrame.__init__(self, master, ("id", "value"), show_statusbar=True)
 
         self.tree.column("id", width=100, anchor=tk.W, stretch=False)
         self.tree.column("value", width=150, anchor=tk.W, stretch=True)
@@ -22,7 +22,14 @@ class HeapView(MemoryFrame):
         self.tree.heading("id", text=tr("ID"), anchor=tk.W)
         self.tree.heading("value", text=tr("Value"), anchor=tk.W)
 
+        self.stats_label = ttk.Label(self.statusbar, text="", anchor="w")
+        self.stats_label.grid(row=0, column=0, sticky="w")
+        self._heap_stats_text = ""
+        self._traced_memory_text = ""
+
         get_workbench().bind("get_heap_response", self._handle_heap_event, True)
+        get_workbench().bind("MemorySnapshot", self._handle_memory_snapshot, True)
+        get_workbench().bind("BackendRestart", self._handle_backend_restart, True)
 
         get_workbench().bind("DebuggerResponse", self._request_heap_data, True)
         get_workbench().bind("ToplevelResponse", self._request_heap_data, True)
@@ -71,6 +78,36 @@ class HeapView(MemoryFrame):
         if self.winfo_ismapped():
             if hasattr(msg, "heap"):
                 self._update_data(msg.heap)
+            self._update_stats(msg.get("heap_stats"))
+
+    def _update_stats(self, stats):
+        if stats:
+            self._heap_stats_text = tr("Kept: %d (~%s), weakly referenced: %d") % (
+                stats["strong_count"],
+                sizeof_fmt(stats["estimated_size"]),
+                stats["weak_count"],
+            )
+        else:
+            self._heap_stats_text = ""
+        self._update_stats_label()
+
+    def _handle_memory_snapshot(self, msg):
+        if msg.get("tracing"):
+            self._traced_memory_text = tr("Traced memory: %s (peak %s)") % (
+                sizeof_fmt(msg.traced_size),
+                sizeof_fmt(msg.traced_peak),
+            )
+        else:
+            self._traced_memory_text = ""
+        self._update_stats_label()
+
+    def _handle_backend_restart(self, event):
+        self._traced_memory_text = ""
+        self._update_stats_label()
+
+    def _update_stats_label(self):
+        texts = [self._heap_stats_text, self._traced_memory_text]
+        self.stats_label.configure(text="  |  ".join(text for text in texts if text))
 
     def _on_map(self, event):
         self.info_label.grid(row=0, column=1005)
@@ -0,0 +1,121 @@
+import os.path
+import tkinter as tk
+
+from pystart import get_workbench
+from pystart.common import path_startswith, universal_relpath
+from pystart.languages import tr
+from pystart.misc_utils import sizeof_fmt
+from pystart.ui_utils import TreeFrame, ems_to_pixels
+
+
+class MemoryView(TreeFrame):
+    """Shows memory allocated by the lines of user's files according to last MemorySnapshot.
+
+    Growth is the change since the previous snapshot of the same run.
+    """
+
+    def __init__(self, master):
+        TreeFrame.__init__(self, master, columns=("size", "growth", "count", "path", "lineno"))
+        self.tree["show"] = ("tree", "headings")
+        self.tree["displaycolumns"] = ("size", "growth", "count")
+
+        self.tree.column("#0", width=ems_to_pixels(25), anchor=tk.W, stretch=True)
+        self.tree.column("size", width=ems_to_pixels(7), anchor=tk.E, stretch=False)
+        self.tree.column("growth", width=ems_to_pixels(7), anchor=tk.E, stretch=False)
+        self.tree.column("count", width=ems_to_pixels(6), anchor=tk.E, stretch=False)
+
+        self.tree.heading("#0", text=tr("Location"), anchor=tk.W)
+        self.tree.heading("size", text=tr("Size"), anchor=tk.E)
+        self.tree.heading("growth", text=tr("Growth"), anchor=tk.E)
+        self.tree.heading("count", text=tr("Blocks"), anchor=tk.E)
+
+        get_workbench().bind("MemorySnapshot", self._handle_memory_snapshot, True)
+
+    def _handle_memory_snapshot(self, msg):
+        self._clear_tree()
+        if not msg.get("tracing"):
+            return
+
+        # (size, size diff, count) by line number by file index
+        lines_by_file = {}
+        for file_index, lineno, size, count in msg.top_lines:
+            lines_by_file.setdefault(file_index, {})[lineno] = [size, 0, count]
+        for file_index, lineno, size_diff, count_diff in msg.growth_lines:
+            line = lines_by_file.setdefault(file_index, {}).setdefault(lineno, [None, 0, None])
+            line[1] = size_diff
+
+        cwd = get_workbench().get_local_cwd()
+        for file_index, size, size_diff in sorted(
+            msg.file_sizes, key=lambda item: item[1], reverse=True
+        ):
+            path = msg.filenames[file_index]
+            file_node = self.tree.insert(
+                "",
+                "end",
+                text=universal_relpath(path, cwd) if path_startswith(path, cwd) else path,
+                open=True,
+                values=(sizeof_fmt(size), _format_growth(size_diff), "", path, ""),
+            )
+            lines = lines_by_file.get(file_index, {})
+            for lineno in sorted(lines, key=lambda n: lines[n][0] or 0, reverse=True):
+                size, size_diff, count = lines[lineno]
+                self.tree.insert(
+                    file_node,
+                    "end",
+                    text=tr("line %d") % lineno,
+                    values=(
+                        "" if size is None else sizeof_fmt(size),
+                        _format_growth(size_diff),
+                        "" if count is None else count,
+                        path,
+                        lineno,
+                    ),
+                )
+
+    def on_select(self, event):
+        iid = self.tree.focus()
+        if not iid:
+            return
+
+        path = self.tree.set(iid, "path")
+        lineno = self.tree.set(iid, "lineno")
+        if not os.path.isfile(path):
+            return
+
+        if lineno:
+            get_workbench().get_editor_notebook().show_file_at_line(path, int(lineno))
+        else:
+            get_workbench().get_editor_notebook().show_file(path)
+
+
+def _format_growth(size_diff: int) -> str:
+    if not size_diff:
+        return ""
+    elif size_diff > 0:
+        return "+" + sizeof_fmt(size_diff)
+    else:
+        return sizeof_fmt(size_diff)
+
+
+def _toggle_memory_tracking() -> None:
+    var = get_workbench().get_variable("run.track_memory")
+    var.set(not var.get())
+    if var.get():
+        get_workbench().show_view("MemoryView", set_focus=False)
+
+
+# Memory tracking command goes after the debug commands in the Run menu
+load_order_key = "zz"
+
+
+def load_plugin() -> None:
+    get_workbench().set_default("run.track_memory", False)
+    get_workbench().add_view(MemoryView, tr("Memory allocations"), "s", visible_by_default=False)
+    get_workbench().add_command(
+        "toggle_memory_tracking",
+        "run",
+        tr("Track memory allocations (slower)"),
+        _toggle_memory_tracking,
+        flag_name="run.track_memory",
+        group=11,
+    )
@@ -56,6 +56,7 @@ from serial import SerialTimeoutException
 from pystart import BACKEND_LOG_MARKER, get_backend_log_file, report_time
 from pystart.backend import MainBackend
 from pystart.common import (
+    OBJECT_INFO_PAGE_SIZE,
     OBJECT_LINK_END,
     OBJECT_LINK_START,
     BackendEvent,
@@ -63,6 +64,7 @@ from pystart.common import (
     DistInfo,
     EOFCommand,
     ImmediateCommand,
+    InlineCommand,
     InputSubmission,
     MessageFromBackend,
     ToplevelResponse,
@@ -693,7 +695,7 @@ class MicroPythonBackend(MainBackend, ABC):
             "attributes": {},
         }
 
-        info.update(self._get_object_info_extras(type_name, repr_str=basic_info["repr"]))
+        info.update(self._get_object_info_extras(type_name, repr_str=basic_info["repr"], cmd=cmd))
         if cmd.include_attributes:
             info["attributes"] = self._get_object_attributes(cmd.all_attributes)
 
@@ -796,22 +798,48 @@ class MicroPythonBackend(MainBackend, ABC):
             if not name.startswith("__") or all_attributes
         }
 
-    def _get_object_info_extras(self, type_name: str, repr_str: str):
+    def _get_object_info_extras(self, type_name: str, repr_str: str, cmd: InlineCommand):
         """object is given in __pystart_helper.object_info"""
+        if type_name in ("list", "tuple", "set", "dict"):
+            offset = cmd.get("content_offset", 0)
+            limit = cmd.get("content_limit", OBJECT_INFO_PAGE_SIZE)
+            if type_name in ("list", "tuple"):
+                page_expr = "__pystart_helper.object_info[%d:%d]" % (offset, offset + limit)
+            else:
+                # keys in case of dict
+                collection_expr = "__pystart_helper.builtins.list(__pystart_helper.object_info)"
+                if cmd.get("content_sort"):
+                    collection_expr = "__pystart_helper.builtins.sorted(%s)" % collection_expr
+                page_expr = "%s[%d:%d]" % (collection_expr, offset, offset + limit)
+
+            paging_info = {
+                "content_offset": offset,
+                "content_total": self._evaluate(
+                    "__pystart_helper.builtins.len(__pystart_helper.object_info)"
+                ),
+                "content_only": cmd.get("content_only", False),
+            }
+        else:
+            page_expr = None
+            paging_info = {}
+
         if type_name in ("list", "tuple", "set"):
             items = self._evaluate(
-                "[(__pystart_helper.builtins.id(x), __pystart_helper.repr(x)) for x in __pystart_helper.object_info]"
+                "[(__pystart_helper.builtins.id(x), __pystart_helper.repr(x)) for x in %s]"
+                % page_expr
             )
-            return {"elements": [ValueInfo(x[0], x[1]) for x in items]}
+            return {"elements": [ValueInfo(x[0], x[1]) for x in items], **paging_info}
         elif type_name == "dict":
             items = self._evaluate(
                 "[((__pystart_helper.builtins.id(key), __pystart_helper.repr(key)), (__pystart_helper.builtins.id(__pystart_helper.object_info[key]), "
-                "__pystart_helper.repr(__pystart_helper.object_info[key]))) for key in __pystart_helper.object_info]"
+                "__pystart_helper.repr(__pystart_helper.object_info[key]))) for key in %s]"
+                % page_expr
             )
             return {
                 "entries": [
                     (ValueInfo(x[0][0], x[0][1]), ValueInfo(x[1][0], x[1][1])) for x in items
-                ]
+                ],
+                **paging_info,
             }
         elif type_name == "MicroBitImage":
             if repr_str.startswith("Image('") and repr_str.count(":") == 5:
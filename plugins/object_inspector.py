@@ -6,7 +6,7 @@ from tkinter import messagebox, ttk
 
 import pystart.memory
 from pystart import get_runner, get_workbench, ui_utils
-from pystart.common import InlineCommand
+from pystart.common import OBJECT_INFO_PAGE_SIZE, InlineCommand
 from pystart.languages import tr
 from pystart.memory import MemoryFrame
 from pystart.misc_utils import shorten_repr
@@ -204,6 +204,9 @@ class ObjectInspector(ttk.Frame):
                 if hasattr(msg, "not_found") and msg.not_found:
                     self.object_id = None
                     self.set_object_info(None)
+                elif msg.info.get("content_only") and self.current_content_inspector is not None:
+                    # a page requested by elements or entries view
+                    self.current_content_inspector.add_content_page(msg.info)
                 else:
                     self.set_object_info(msg.info)
 
@@ -238,6 +241,9 @@ class ObjectInspector(ttk.Frame):
                 all_attributes=True,
                 frame_width=frame_width,
                 frame_height=frame_height,
+                content_limit=OBJECT_INFO_PAGE_SIZE,
+                content_sort=self.current_content_inspector is not None
+                and self.current_content_inspector.sort_content,
             )
         )
 
@@ -301,12 +307,18 @@ class ObjectInspector(ttk.Frame):
 
 
 class ContentInspector:
+    # whether entries of dicts and sets are asked in sorted order
+    sort_content = False
+
     def __init__(self, master):
         pass
 
     def set_object_info(self, object_info):
         pass
 
+    def add_content_page(self, object_info):
+        """Receives next elements or entries of the object given in set_object_info"""
+
     def get_tab_text(self):
         return "Data"
 
@@ -580,10 +592,19 @@ class ElementsInspector(pystart.memory.MemoryFrame, ContentInspector):
         self.context_id = object_info["id"]
 
         self._clear_tree()
-        index = 0
-        # TODO: don't show too big number of elements
-        for element in object_info["elements"]:
-            node_id = self.tree.insert("", "end")
+        self.add_content_page(object_info)
+
+    def add_content_page(self, object_info):
+        offset = object_info.get("content_offset", 0)
+        elements = object_info["elements"]
+        position = self.start_content_page(offset, len(elements))
+        if position is None:
+            # tree has been changed after requesting this page
+            return
+
+        index = offset
+        for element in elements:
+            node_id = self.tree.insert("", position)
             if self.elements_have_indices:
                 self.tree.set(node_id, "index", index)
             else:
@@ -594,9 +615,14 @@ class ElementsInspector(pystart.memory.MemoryFrame, ContentInspector):
                 node_id, "value", shorten_repr(element.repr, pystart.memory.MAX_REPR_LENGTH_IN_GRID)
             )
             index += 1
+            position += 1
 
-        count = len(object_info["elements"])
+        count = object_info.get("content_total", index)
         self.len_label.configure(text=" len: %d" % count)
+        self.finish_content_page(offset, len(elements), count)
+
+    def request_content_page(self, offset, limit):
+        request_content_page(self.context_id, offset, limit, self.sort_content)
 
 
 class DictInspector(pystart.memory.MemoryFrame, ContentInspector):
@@ -612,8 +638,8 @@ class DictInspector(pystart.memory.MemoryFrame, ContentInspector):
         self.tree.column("id", width=750, anchor=tk.W, stretch=True)
         self.tree.column("value", width=750, anchor=tk.W, stretch=True)
 
-        self.tree.heading("key_id", text=tr("Key ID"), anchor=tk.W)
-        self.tree.heading("key", text=tr("Key"), anchor=tk.W)
+        self.tree.heading("key", text=tr("Key"), anchor=tk.W, command=self._toggle_sorting)
+        self.tree.heading("key_id", text=tr("Key ID"), anchor=tk.W, command=self._toggle_sorting)
         self.tree.heading("id", text=tr("Value ID"), anchor=tk.W)
         self.tree.heading("value", text=tr("Value"), anchor=tk.W)
 
@@ -621,6 +647,7 @@ class DictInspector(pystart.memory.MemoryFrame, ContentInspector):
         self.len_label.grid(row=0, column=0, sticky="w")
         self.statusbar.columnconfigure(0, weight=1)
 
+        self.context_id = None
         self.update_memory_model()
 
     def update_memory_model(self, event=None):
@@ -639,14 +666,31 @@ class DictInspector(pystart.memory.MemoryFrame, ContentInspector):
         # NB! this selects value
         self.show_selected_object_info()
 
+    def _toggle_sorting(self):
+        self.sort_content = not self.sort_content
+        if self.context_id is not None:
+            # re-sorted content starts from the first page
+            self._clear_tree()
+            self.request_content_page(0, OBJECT_INFO_PAGE_SIZE)
+
     def set_object_info(self, object_info):
         assert "entries" in object_info
         self.context_id = object_info["id"]
 
         self._clear_tree()
-        # TODO: don't show too big number of elements
-        for key, value in object_info["entries"]:
-            node_id = self.tree.insert("", "end")
+        self.add_content_page(object_info)
+
+    def add_content_page(self, object_info):
+        offset = object_info.get("content_offset", 0)
+        entries = object_info["entries"]
+        position = self.start_content_page(offset, len(entries))
+        if position is None:
+            # tree has been changed after requesting this page
+            return
+
+        for key, value in entries:
+            node_id = self.tree.insert("", position)
+            position += 1
             self.tree.set(node_id, "key_id", pystart.memory.format_object_id(key.id))
             self.tree.set(
                 node_id, "key", shorten_repr(key.repr, pystart.memory.MAX_REPR_LENGTH_IN_GRID)
@@ -656,10 +700,14 @@ class DictInspector(pystart.memory.MemoryFrame, ContentInspector):
                 node_id, "value", shorten_repr(value.repr, pystart.memory.MAX_REPR_LENGTH_IN_GRID)
             )
 
-        count = len(object_info["entries"])
+        count = object_info.get("content_total", offset + len(entries))
         self.len_label.configure(text=" len: %d" % count)
+        self.finish_content_page(offset, len(entries), count)
         self.update_memory_model()
 
+    def request_content_page(self, offset, limit):
+        request_content_page(self.context_id, offset, limit, self.sort_content)
+
 
 class ImageInspector(ContentInspector, tk.Frame):
     def __init__(self, master):
@@ -728,5 +776,20 @@ class AttributesFrame(pystart.memory.VariablesFrame):
         get_workbench().event_generate("ObjectSelect", object_id=object_id)
 
 
+def request_content_page(object_id, offset, limit, sort):
+    get_runner().send_command(
+        InlineCommand(
+            "get_object_info",
+            object_id=object_id,
+            include_attributes=False,
+            all_attributes=False,
+            content_offset=offset,
+            content_limit=limit,
+            content_sort=sort,
+            content_only=True,
+        )
+    )
+
+
 def load_plugin() -> None:
     get_workbench().add_view(ObjectInspector, tr("Object inspector"), "se")
@@ -0,0 +1,463 @@
+import json
+import os.path
+import tkinter as tk
+import tkinter.font
+import zlib
+from logging import getLogger
+from tkinter import messagebox, ttk
+from typing import Dict, List, Optional, Tuple
+
+from pystart import get_runner, get_workbench
+from pystart.languages import tr
+from pystart.ui_utils import (
+    SafeScrollbar,
+    TreeFrame,
+    askopenfilename,
+    asksaveasfilename,
+    ems_to_pixels,
+    lookup_style_option,
+)
+
+logger = getLogger(__name__)
+
+PROFILE_FORMAT = "pystart-profile"
+PROFILE_FORMAT_VERSION = 1
+MAX_HOT_LINES = 200
+REDRAW_DELAY_MS = 300
+
+_dialog_filetypes = [(tr("Profiles"), ".json"), (tr("all files"), ".*")]
+
+# (filename, firstlineno, code name, lineno)
+Location = Tuple[str, int, str, int]
+
+
+class FlameNode:
+    def __init__(self, filename: Optional[str], firstlineno: int, name: str):
+        self.filename = filename
+        self.firstlineno = firstlineno
+        self.name = name
+        self.count = 0
+        self.line_counts: Dict[int, int] = {}
+        self.children: Dict[Tuple[str, int, str], "FlameNode"] = {}
+
+    def get_hottest_line(self) -> int:
+        if not self.line_counts:
+            return self.firstlineno
+        return max(self.line_counts, key=self.line_counts.get)
+
+
+class ProfileData:
+    """Samples of one profiled run, as counts of distinct stacks"""
+
+    def __init__(self):
+        self.locations: List[Location] = []
+        self.stack_counts: Dict[Tuple[int, ...], int] = {}
+        self.duration = 0.0
+
+    def add_samples(self, locations, samples, duration) -> None:
+        self.locations.extend(tuple(loc) for loc in locations)
+        for stack, count in samples:
+            stack = tuple(stack)
+            self.stack_counts[stack] = self.stack_counts.get(stack, 0) + count
+        self.duration += duration
+
+    def get_sample_count(self) -> int:
+        return sum(self.stack_counts.values())
+
+    def get_hot_lines(self) -> List[Tuple[str, int, str, int, int]]:
+        """Returns (filename, lineno, code name, self count, total count) tuples,
+        hottest first"""
+        self_counts = {}
+        total_counts = {}
+        names = {}
+        for stack, count in self.stack_counts.items():
+            seen = set()
+            for i, location_id in enumerate(stack):
+                filename, _, name, lineno = self.locations[location_id]
+                key = (filename, lineno)
+                names[key] = name
+                if i == len(stack) - 1:
+                    self_counts[key] = self_counts.get(key, 0) + count
+                if key not in seen:
+                    # recursive calls must not count the same sample several times
+                    seen.add(key)
+                    total_counts[key] = total_counts.get(key, 0) + count
+
+        result = [
+            (key[0], key[1], names[key], self_counts.get(key, 0), total)
+            for key, total in total_counts.items()
+        ]
+        result.sort(key=lambda item: (item[3], item[4]), reverse=True)
+        return result
+
+    def build_flame_tree(self) -> FlameNode:
+        root = FlameNode(None, 0, tr("all"))
+        for stack, count in self.stack_counts.items():
+            root.count += count
+            node = root
+            for location_id in stack:
+                filename, firstlineno, name, lineno = self.locations[location_id]
+                key = (filename, firstlineno, name)
+                child = node.children.get(key)
+                if child is None:
+                    child = node.children[key] = FlameNode(filename, firstlineno, name)
+                child.count += count
+                child.line_counts[lineno] = child.line_counts.get(lineno, 0) + count
+                node = child
+
+        return root
+
+    def save(self, path: str) -> None:
+        data = {
+            "format": PROFILE_FORMAT,
+            "version": PROFILE_FORMAT_VERSION,
+            "duration": self.duration,
+            "locations": self.locations,
+            "samples": [[stack, count] for stack, count in self.stack_counts.items()],
+        }
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(data, fp)
+
+    @classmethod
+    def load(cls, path: str) -> "ProfileData":
+        with open(path, encoding="utf-8") as fp:
+            data = json.load(fp)
+
+        if not isinstance(data, dict) or data.get("format") != PROFILE_FORMAT:
+            raise ValueError(tr("Not a profile file"))
+        if data.get("version") != PROFILE_FORMAT_VERSION:
+            raise ValueError(tr("Unsupported profile version: %s") % data.get("version"))
+
+        result = cls()
+        result.add_samples(data["locations"], data["samples"], data["duration"])
+        return result
+
+
+class FlameGraph(ttk.Frame):
+    """Icicle-style flame graph: callers on top, callees below them"""
+
+    def __init__(self, master, status_callback, click_callback):
+        ttk.Frame.__init__(self, master)
+        self._status_callback = status_callback
+        self._click_callback = click_callback
+        self._root: Optional[FlameNode] = None
+        self._nodes_by_item: Dict[int, FlameNode] = {}
+        self._font = tkinter.font.nametofont("TkDefaultFont")
+        self._row_height = self._font.metrics("linespace") + ems_to_pixels(0.4)
+
+        self._background = lookup_style_option(".", "background")
+        self.canvas = tk.Canvas(
+            self, highlightthickness=0, borderwidth=0, background=self._background
+        )
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.vert_scrollbar = SafeScrollbar(self, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.vert_scrollbar.grid(row=0, column=1, sticky="nsew")
+        self.canvas.configure(yscrollcommand=self.vert_scrollbar.set)
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.canvas.bind("<Configure>", self._redraw, True)
+        self.canvas.tag_bind("frame", "<Motion>", self._on_motion)
+        self.canvas.tag_bind("frame", "<Leave>", self._on_leave)
+        self.canvas.tag_bind("frame", "<Button-1>", self._on_click)
+
+    def set_tree(self, root: Optional[FlameNode]) -> None:
+        self._root = root
+        self._redraw()
+
+    def _redraw(self, event=None):
+        self.canvas.delete("all")
+        self._nodes_by_item = {}
+        if self._root is None or not self._root.count:
+            return
+
+        width = self.canvas.winfo_width()
+        max_depth = self._draw_nodes(self._root, width / self._root.count)
+        self.canvas.configure(scrollregion=(0, 0, width, (max_depth + 1) * self._row_height))
+
+    def _draw_nodes(self, root: FlameNode, scale: float) -> int:
+        # Explicit stack instead of recursion, as deep recursion in the profiled program
+        # gives equally deep tree
+        max_depth = 0
+        stack = [(root, 0, 0.0)]
+        while stack:
+            node, depth, x = stack.pop()
+            node_width = node.count * scale
+            if node_width < 1:
+                continue
+
+            self._draw_node(node, depth, x, node_width)
+            max_depth = max(max_depth, depth)
+
+            child_x = x
+            for child in sorted(node.children.values(), key=lambda n: n.name):
+                stack.append((child, depth + 1, child_x))
+                child_x += child.count * scale
+
+        return max_depth
+
+    def _draw_node(self, node: FlameNode, depth: int, x: float, node_width: float) -> None:
+        y = depth * self._row_height
+        rect = self.canvas.create_rectangle(
+            x,
+            y,
+            x + node_width,
+            y + self._row_height,
+            fill=self._get_color(node),
+            outline=self._background,
+            tags=("frame",),
+        )
+        self._nodes_by_item[rect] = node
+
+        label = self._fit_text(node.name, node_width - ems_to_pixels(0.5))
+        if label:
+            text = self.canvas.create_text(
+                x + ems_to_pixels(0.25),
+                y + self._row_height / 2,
+                text=label,
+                anchor="w",
+                font=self._font,
+                fill="black",
+                tags=("frame",),
+            )
+            self._nodes_by_item[text] = node
+
+    def _fit_text(self, text: str, width: float) -> str:
+        if self._font.measure(text) <= width:
+            return text
+
+        char_width = self._font.measure("0")
+        max_chars = int(width // char_width) - 1
+        if max_chars < 2:
+            return ""
+        return text[:max_chars] + "…"
+
+    def _get_color(self, node: FlameNode) -> str:
+        if node.filename is None:
+            return "#dddddd"
+
+        # Stable warm colors, so that the same function looks the same across redraws
+        h = zlib.crc32((node.filename + node.name).encode("utf-8"))
+        return "#%02x%02x%02x" % (230 + h % 26, 120 + (h >> 8) % 100, 40 + (h >> 16) % 50)
+
+    def _get_current_node(self) -> Optional[FlameNode]:
+        items = self.canvas.find_withtag("current")
+        if not items:
+            return None
+        return self._nodes_by_item.get(items[0])
+
+    def _on_motion(self, event):
+        node = self._get_current_node()
+        if node is not None:
+            self._status_callback(node)
+
+    def _on_leave(self, event):
+        self._status_callback(None)
+
+    def _on_click(self, event):
+        node = self._get_current_node()
+        if node is not None and node.filename is not None:
+            self._click_callback(node.filename, node.get_hottest_line())
+
+
+class HotLinesTable(TreeFrame):
+    def __init__(self, master, click_callback):
+        TreeFrame.__init__(self, master, columns=("self", "total", "function", "location", "path"))
+        self._click_callback = click_callback
+
+        self.tree.column("self", width=ems_to_pixels(5), anchor=tk.E, stretch=False)
+        self.tree.column("total", width=ems_to_pixels(5), anchor=tk.E, stretch=False)
+        self.tree.column("function", width=ems_to_pixels(15), anchor=tk.W, stretch=False)
+        self.tree.column("location", width=ems_to_pixels(20), anchor=tk.W, stretch=True)
+        self.tree["displaycolumns"] = ("self", "total", "function", "location")
+
+        self.tree.heading("self", text=tr("Self"), anchor=tk.E)
+        self.tree.heading("total", text=tr("Total"), anchor=tk.E)
+        self.tree.heading("function", text=tr("Function"), anchor=tk.W)
+        self.tree.heading("location", text=tr("Line"), anchor=tk.W)
+
+    def set_hot_lines(self, hot_lines, sample_count: int) -> None:
+        self._clear_tree()
+        for filename, lineno, name, self_count, total_count in hot_lines[:MAX_HOT_LINES]:
+            self.tree.insert(
+                "",
+                "end",
+                values=(
+                    "%.1f%%" % (100 * self_count / sample_count),
+                    "%.1f%%" % (100 * total_count / sample_count),
+                    name,
+                    "%s : %d" % (os.path.basename(filename), lineno),
+                    "%s\n%d" % (filename, lineno),
+                ),
+            )
+
+    def on_select(self, event):
+        iid = self.tree.focus()
+        if iid:
+            filename, lineno = self.tree.set(iid, "path").rsplit("\n", maxsplit=1)
+            self._click_callback(filename, int(lineno))
+
+
+class ProfilerView(ttk.Frame):
+    def __init__(self, master):
+        ttk.Frame.__init__(self, master)
+        self._data: Optional[ProfileData] = None
+        self._redraw_scheduled = False
+
+        toolbar = ttk.Frame(self)
+        toolbar.grid(row=0, column=0, sticky="nsew")
+        ttk.Button(toolbar, text=tr("Open..."), command=self._cmd_open).grid(
+            row=0, column=0, padx=(0, ems_to_pixels(0.5))
+        )
+        self._save_button = ttk.Button(toolbar, text=tr("Save as..."), command=self._cmd_save)
+        self._save_button.grid(row=0, column=1, padx=(0, ems_to_pixels(0.5)))
+        self._status_label = ttk.Label(toolbar, text="", anchor="w")
+        self._status_label.grid(row=0, column=2, sticky="nsew")
+        toolbar.columnconfigure(2, weight=1)
+
+        paned = ttk.PanedWindow(self, orient=tk.VERTICAL)
+        paned.grid(row=1, column=0, sticky="nsew")
+        self._flame_graph = FlameGraph(paned, self._show_node_info, self._show_source)
+        paned.add(self._flame_graph, weight=1)
+        self._hot_lines = HotLinesTable(paned, self._show_source)
+        paned.add(self._hot_lines, weight=1)
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        get_workbench().bind("CommandAccepted", self._on_command_accepted, True)
+        get_workbench().bind("ProfileSamples", self._on_profile_samples, True)
+        get_workbench().bind("ToplevelResponse", self._on_toplevel_response, True)
+
+        self._update_widgets()
+
+    def _on_command_accepted(self, event):
+        if event.command.get("name") == "Profile":
+            self._data = ProfileData()
+            self._update_widgets()
+
+    def _on_profile_samples(self, msg):
+        if self._data is None:
+            self._data = ProfileData()
+        self._data.add_samples(msg.locations, msg.samples, msg.duration)
+        self._schedule_redraw()
+
+    def _on_toplevel_response(self, msg):
+        if msg.get("command_name") == "Profile":
+            self._update_widgets()
+
+    def _schedule_redraw(self):
+        # Batches keep coming while the program runs, don't redraw after each of them
+        if self._redraw_scheduled:
+            return
+
+        def redraw():
+            self._redraw_scheduled = False
+            self._update_widgets()
+
+        self._redraw_scheduled = True
+        self.after(REDRAW_DELAY_MS, redraw)
+
+    def _update_widgets(self):
+        if self._data is None or not self._data.stack_counts:
+            self._flame_graph.set_tree(None)
+            self._hot_lines.clear()
+            self._save_button.state(["disabled"])
+            self._show_summary()
+            return
+
+        self._flame_graph.set_tree(self._data.build_flame_tree())
+        self._hot_lines.set_hot_lines(self._data.get_hot_lines(), self._data.get_sample_count())
+        self._save_button.state(["!disabled"])
+        self._show_summary()
+
+    def _show_summary(self):
+        if self._data is None:
+            text = tr("Select 'Profile current script' from the Run menu")
+        else:
+            text = tr("%d samples in %.1f s") % (
+                self._data.get_sample_count(),
+                self._data.duration,
+            )
+        self._status_label.configure(text=text)
+
+    def _show_node_info(self, node: Optional[FlameNode]):
+        if node is None or self._data is None:
+            self._show_summary()
+            return
+
+        text = "%s — %.1f%%" % (node.name, 100 * node.count / self._data.get_sample_count())
+        if node.filename is not None:
+            text += "  (%s : %d)" % (os.path.basename(node.filename), node.firstlineno)
+        self._status_label.configure(text=text)
+
+    def _show_source(self, filename: str, lineno: int):
+        if not os.path.isfile(filename):
+            logger.info("Can't show %r, because it doesn't exist", filename)
+            return
+        get_workbench().get_editor_notebook().show_file_at_line(filename, lineno)
+
+    def _cmd_save(self):
+        if self._data is None:
+            return
+
+        path = asksaveasfilename(
+            filetypes=_dialog_filetypes,
+            defaultextension=".json",
+            initialdir=get_workbench().get_local_cwd(),
+            parent=get_workbench(),
+        )
+        if not path:
+            return
+
+        try:
+            self._data.save(path)
+        except OSError as e:
+            messagebox.showerror(tr("Error"), str(e), master=get_workbench())
+
+    def _cmd_open(self):
+        path = askopenfilename(
+            filetypes=_dialog_filetypes,
+            initialdir=get_workbench().get_local_cwd(),
+            parent=get_workbench(),
+        )
+        if not path:
+            return
+
+        try:
+            self._data = ProfileData.load(path)
+        except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            messagebox.showerror(tr("Error"), str(e), master=get_workbench())
+            return
+
+        self._update_widgets()
+
+
+def _profile_current_script():
+    get_workbench().show_view("ProfilerView", set_focus=False)
+    get_runner().execute_current("Profile")
+
+
+def _profile_current_script_enabled():
+    return (
+        get_workbench().get_editor_notebook().get_current_editor() is not None
+        and get_runner().get_backend_proxy()
+        and get_runner().get_backend_proxy().can_debug()
+    )
+
+
+# Profile command goes after the debug commands in the Run menu
+load_order_key = "zz"
+
+
+def load_plugin() -> None:
+    get_workbench().add_view(ProfilerView, tr("Profiler"), "s", visible_by_default=False)
+    get_workbench().add_command(
+        "profile_current_script",
+        "run",
+        tr("Profile current script"),
+        _profile_current_script,
+        caption=tr("Profile"),
+        tester=_profile_current_script_enabled,
+        group=11,
+    )
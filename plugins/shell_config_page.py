@@ -32,6 +32,20 @@ class ShellConfigurationPage(ConfigurationPage):
             choices=[100, 500, 1000, 5000, 10000, 50000, 100000],
         )
 
+        add_option_combobox(
+            self,
+            "shell.scrollback_memory_mb",
+            tr("Memory for compressed older lines (MB)"),
+            choices=[0, 1, 4, 8, 16, 64],
+        )
+
+        add_option_combobox(
+            self,
+            "shell.scrollback_disk_mb",
+            tr("Disk space for compressed older lines (MB)"),
+            choices=[0, 10, 100, 500, 1000],
+        )
+
         add_option_combobox(
             self,
             "shell.squeeze_threshold",
@@ -39,6 +53,13 @@ class ShellConfigurationPage(ConfigurationPage):
             choices=[500, 1000, 1500, 2000, 3000, 4000, 5000, 10000],
         )
 
+        add_option_combobox(
+            self,
+            "view.plotter_history",
+            tr("Number of points kept by Plotter"),
+            choices=[1000, 10000, 100000, 1000000],
+        )
+
         add_option_checkbox(
             self,
             "shell.auto_inspect_values",
@@ -3,7 +3,7 @@ from logging import getLogger
 from tkinter import ttk
 
 from pystart import get_runner, get_workbench
-from pystart.common import InlineCommand
+from pystart.common import InlineCommand, apply_variables_delta
 from pystart.languages import tr
 from pystart.memory import VariablesFrame
 
@@ -32,6 +32,8 @@ class VariablesView(VariablesFrame):
 
         # records last info from progress messages
         self._last_active_info = None
+        # __main__ globals as known by the backend. ToplevelResponses bring changes to it.
+        self._main_globals = None
 
     def _update_back_button(self, visible):
         if visible:
@@ -51,6 +53,7 @@ class VariablesView(VariablesFrame):
 
     def _handle_backend_restart(self, event):
         self._clear_tree()
+        self._main_globals = None
 
     def _handle_get_globals_response(self, event):
         if "error" in event:
@@ -58,6 +61,8 @@ class VariablesView(VariablesFrame):
         elif "globals" not in event:
             self._handle_error_response(str(event))
         else:
+            if event.get("resync"):
+                self._main_globals = event["globals"]
             self.show_globals(event["globals"], event["module_name"])
 
     def _handle_error_response(self, error_msg):
@@ -67,7 +72,19 @@ class VariablesView(VariablesFrame):
 
     def _handle_toplevel_response(self, event):
         if "globals" in event:
-            self.show_globals(event["globals"], "__main__")
+            self._main_globals = event["globals"]
+            self.show_globals(self._main_globals, "__main__")
+        elif "globals_delta" in event:
+            if self._main_globals is None:
+                # Missed the full globals (e.g. the view was opened later)
+                get_runner().send_command(
+                    InlineCommand("get_globals", module_name="__main__", resync=True)
+                )
+            else:
+                self._main_globals = apply_variables_delta(
+                    self._main_globals, event["globals_delta"]
+                )
+                self.show_globals(self._main_globals, "__main__")
         else:
             # MicroPython
             get_runner().send_command(InlineCommand("get_globals", module_name="__main__"))
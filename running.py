@@ -40,7 +40,11 @@ from pystart import (
 )
 from pystart.common import (
     ALL_EXPLAINED_STATUS_CODE,
+    BINARY_MESSAGE_MARKER,
+    BINARY_WIRE_FORMAT,
     PROCESS_ACK,
+    TEXT_WIRE_FORMAT,
+    WIRE_FORMAT_ENV_VAR,
     BackendEvent,
     CommandToBackend,
     DebuggerCommand,
@@ -52,6 +56,7 @@ from pystart.common import (
     InputSubmission,
     MessageFromBackend,
     ToplevelCommand,
+    StackDecoder,
     ToplevelResponse,
     UserError,
     is_same_path,
@@ -87,6 +92,9 @@ logger = getLogger(__name__)
 
 WINDOWS_EXE = "python.exe"
 OUTPUT_MERGE_THRESHOLD = 1000
+# Reader thread blocks when the frontend lags behind by more than this amount of program output
+OUTPUT_QUEUE_MAX_CHARS = 64 * 1024
+OUTPUT_QUEUE_MAX_MESSAGES = 100
 
 RUN_COMMAND_LABEL = ""  # init later when gettext is ready
 RUN_COMMAND_CAPTION = ""
@@ -100,6 +108,35 @@ OSC_TERMINATOR = re.compile(r"\a|\x1B\\")
 TERMINATION_TIMEOUT = 2
 TERMINATION_POLL_INTERVAL = 0.02
 
+# How long may a batch of backend messages occupy the UI thread before giving way to redraws
+MESSAGE_BATCH_TIME_BUDGET = 0.03
+# Used when the proxy or the platform can't wake up the UI thread
+MESSAGE_POLL_INTERVAL = 20
+MESSAGE_LATENCY_SAMPLE_COUNT = 10000
+
+# ms to wait after starting a backend process before preparing a spare one
+SPARE_PROCESS_START_DELAY = 1000
+
+# Inline commands which don't change the state of the backend and therefore may be
+# in flight together. Other inline commands are sent only when nothing else is running.
+CONCURRENT_INLINE_COMMANDS = {
+    "get_active_distributions",
+    "get_dirs_children_info",
+    "get_environment_info",
+    "get_frame_info",
+    "get_fs_info",
+    "get_globals",
+    "get_heap",
+    "get_installed_distribution_metadata",
+    "get_locals",
+    "get_object_info",
+    "read_file",
+}
+MAX_CONCURRENT_INLINE_COMMANDS = 8
+
+# Toplevel commands which run a script and may track its memory allocations
+RUN_AND_DEBUG_COMMAND_NAMES = {"Run", "run", "Debug", "debug", "FastDebug"}
+
 # other components may turn it on in order to avoid grouping output lines into one event
 io_animation_required = False
 
@@ -145,17 +182,23 @@ class Runner:
         get_workbench().set_default("run.allow_running_unnamed_programs", True)
         get_workbench().set_default("run.auto_cd", True)
         get_workbench().set_default("run.warn_module_shadowing", True)
+        get_workbench().set_default("run.measure_message_latency", False)
 
         self._init_commands()
         self._state = "starting"
         self._proxy: Optional[BackendProxy] = None
+        self._proxy_notifies_message_arrival = False
         self._publishing_events = False
         self._polling_after_id = None
+        self._message_wakeup: Optional[_MessageWakeup] = None
+        self._message_latencies = collections.deque(maxlen=MESSAGE_LATENCY_SAMPLE_COUNT)
         self._postponed_commands = []  # type: List[CommandToBackend]
         self._thread_commands = queue.Queue()
         self._thread_command_results = {}
         self._running_thread_command_ids = set()
         self._last_accepted_backend_command = None
+        # expands the stacks in DebuggerResponses
+        self._stack_decoder = StackDecoder()
 
     def start(self) -> None:
         global _console_allocated
@@ -166,6 +209,8 @@ class Runner:
             logger.exception("Problem allocating console")
             _console_allocated = False
 
+        self._message_wakeup = _MessageWakeup(self._on_message_wakeup)
+
         try:
             self.restart_backend(False, True)
         except Exception as e:
@@ -314,19 +359,31 @@ class Runner:
         # Attach extra info
         if "debug" in cmd.name.lower():
             cmd["breakpoints"] = get_current_breakpoints()
+            if isinstance(cmd, ToplevelCommand):
+                cmd["history_memory_limit_mb"] = get_workbench().get_option(
+                    "debugger.history_memory_limit_mb"
+                )
+
+        if isinstance(cmd, ToplevelCommand) and cmd.name == "Coverage":
+            cmd["count_hits"] = get_workbench().get_option("coverage.count_hits")
+
+        if isinstance(cmd, ToplevelCommand) and cmd.name in RUN_AND_DEBUG_COMMAND_NAMES:
+            cmd["track_memory"] = get_workbench().get_option("run.track_memory", False)
+
+        if isinstance(cmd, ToplevelCommand):
+            # lets the backend know whether it can group output lines
+            cmd["io_animation_required"] = io_animation_required
 
         if "id" not in cmd:
             cmd["id"] = generate_command_id()
 
         cmd["local_cwd"] = get_workbench().get_local_cwd()
 
-        if self._proxy.running_inline_command and isinstance(cmd, InlineCommand):
-            reason = "running another inline command"
-            cur_cmd_name = getattr(self._last_accepted_backend_command, "name", None)
-            if cur_cmd_name:
-                reason += f" ({cur_cmd_name})"
-            self._postpone_command(cmd, reason)
-            return
+        if isinstance(cmd, InlineCommand):
+            reason = self._get_inline_command_postpone_reason(cmd)
+            if reason:
+                self._postpone_command(cmd, reason)
+                return
 
         # Offer the command
         logger.debug("Runner: sending command %r to proxy: %s", cmd.name, cmd)
@@ -349,7 +406,7 @@ class Runner:
             get_workbench().event_generate("CommandAccepted", command=cmd)
             self._last_accepted_backend_command = cmd
             if isinstance(cmd, InlineCommand):
-                self._proxy.running_inline_command = True
+                self._proxy.running_inline_commands[cmd["id"]] = cmd
 
         if isinstance(cmd, (ToplevelCommand, DebuggerCommand)):
             self._set_state("running")
@@ -358,6 +415,27 @@ class Runner:
             # This may be only logical restart, which does not look like restart to the runner
             get_workbench().event_generate("BackendRestart", full=False)
 
+    def _get_inline_command_postpone_reason(self, cmd: InlineCommand) -> Optional[str]:
+        running_commands = self._proxy.running_inline_commands
+        if cmd.name not in CONCURRENT_INLINE_COMMANDS:
+            if running_commands:
+                names = ", ".join(sorted({c.name for c in running_commands.values()}))
+                return f"running other inline commands ({names})"
+            return None
+
+        # Read-only command must not overtake a preceding write (eg. cd or write_file)
+        for other_cmd in list(running_commands.values()) + self._postponed_commands:
+            if (
+                isinstance(other_cmd, InlineCommand)
+                and other_cmd.name not in CONCURRENT_INLINE_COMMANDS
+            ):
+                return f"waiting after {other_cmd.name}"
+
+        if len(running_commands) >= MAX_CONCURRENT_INLINE_COMMANDS:
+            return "too many inline commands running"
+
+        return None
+
     def send_command_and_wait(self, cmd: InlineCommand, dialog_title: str) -> MessageFromBackend:
         dlg = InlineCommandDialog(get_workbench(), cmd, title=dialog_title + " ...")
         show_dialog(dlg)
@@ -377,6 +455,7 @@ class Runner:
         proxy_at_start = self._proxy
 
         self._thread_commands.put(cmd)
+        self._notify_message_arrival()
 
         while time.time() - start_time < timeout:
             if self._proxy is not proxy_at_start:
@@ -710,27 +789,46 @@ class Runner:
         if self._proxy.has_next_message():
             # Some events didn't fit into this batch. Start the next batch as soon as possible
             self._polling_after_id = get_workbench().after_idle(self._poll_backend_messages)
-        else:
-            # take it easy
+        elif not self._proxy_notifies_message_arrival or self._postponed_commands:
+            # Take it easy.
+            # (Otherwise proxy wakes us up when there is something to do)
             self._polling_after_id = get_workbench().after(
-                20, lambda: get_workbench().after_idle(self._poll_backend_messages)
+                MESSAGE_POLL_INTERVAL, lambda: get_workbench().after_idle(self._poll_backend_messages)
             )
 
+    def _on_message_wakeup(self) -> None:
+        if self._proxy is None or self._polling_after_id is not None:
+            # next batch is already scheduled
+            return
+
+        self._poll_backend_messages()
+
+    def _notify_message_arrival(self) -> None:
+        """Can be called from any thread"""
+        if self._message_wakeup is not None:
+            self._message_wakeup.notify()
+
     def _pull_backend_messages(self):
-        # Don't process too many messages in single batch, allow screen updates
+        # Don't occupy the UI thread for too long in single batch, allow screen updates
         # and user actions between batches.
         # Mostly relevant when backend prints a lot quickly.
         # TODO: Should I leave new messages (caused by processing this batch) for next batch?
-        msg_count = 0
-        max_msg_count = 10
-        while self._proxy is not None and msg_count < max_msg_count:
+        measure_latency = get_workbench().get_option("run.measure_message_latency")
+        batch_start_time = time.perf_counter()
+        while (
+            self._proxy is not None
+            and time.perf_counter() - batch_start_time < MESSAGE_BATCH_TIME_BUDGET
+        ):
             try:
                 msg = self._proxy.fetch_next_message()
                 if not msg:
                     break
                 logger.debug("RUNNER GOT: %s in state: %s", msg.event_type, self.get_state())
 
-                msg_count += 1
+                if measure_latency:
+                    arrival_time = self._proxy.get_last_message_arrival_time()
+                    if arrival_time is not None:
+                        self._message_latencies.append(time.perf_counter() - arrival_time)
             except BackendTerminatedError as exc:
                 logger.info("Backend terminated with code: %r", exc.returncode)
                 self._handle_backend_termination(exc.returncode)
@@ -739,11 +837,17 @@ class Runner:
             # change state
             if isinstance(msg, ToplevelResponse):
                 self._set_state("waiting_toplevel_command")
+                self._stack_decoder.reset()
             elif isinstance(msg, DebuggerResponse):
                 self._set_state("waiting_debugger_command")
+                self._stack_decoder.decode(msg)
             elif isinstance(msg, InlineResponse):
-                # next inline command won't be sent before response from the last has arrived
-                self._proxy.running_inline_command = False
+                command_id = msg.get("command_id")
+                if command_id is None:
+                    # response to a command which didn't go through the runner
+                    self._proxy.running_inline_commands.clear()
+                else:
+                    self._proxy.running_inline_commands.pop(command_id, None)
             else:
                 "other messages don't affect the state"
 
@@ -819,6 +923,11 @@ class Runner:
         self._proxy = None
         logger.info("Starting backend %r", backend_class)
         self._proxy = backend_class(clean)
+        self._proxy_notifies_message_arrival = (
+            self._message_wakeup is not None
+            and self._message_wakeup.is_event_driven()
+            and self._proxy.set_message_arrival_callback(self._notify_message_arrival)
+        )
 
         if not first:
             get_shell().restart(automatic=automatic, was_running=was_running)
@@ -836,14 +945,33 @@ class Runner:
             self._polling_after_id = None
 
         self._postponed_commands = []
+        if self._message_latencies:
+            logger.info("Message latency: %s", self.get_message_latency_stats())
+            self._message_latencies.clear()
+
         if self._proxy:
             self._proxy.destroy(for_restart=for_restart)
             self._proxy = None
+            self._stack_decoder.reset()
             get_workbench().event_generate("BackendTerminated")
 
     def get_backend_proxy(self) -> "BackendProxy":
         return self._proxy
 
+    def get_message_latency_stats(self) -> Dict[str, float]:
+        """Percentiles (in ms) of time between reading a message from backend and publishing it.
+        Collected only when run.measure_message_latency is on."""
+        if not self._message_latencies:
+            return {}
+
+        latencies = sorted(self._message_latencies)
+        result = {"count": len(latencies)}
+        for p in [50, 90, 99]:
+            index = min(len(latencies) - 1, len(latencies) * p // 100)
+            result[f"p{p}"] = round(latencies[index] * 1000, 2)
+        result["max"] = round(latencies[-1] * 1000, 2)
+        return result
+
     def _check_alloc_console(self) -> None:
         if sys.executable.endswith("pythonw.exe"):
             # These don't have console allocated.
@@ -930,6 +1058,70 @@ class Runner:
             return self._proxy.is_connected()
 
 
+class _MessageWakeup:
+    """Lets listener threads wake up the Tk event loop when backend messages arrive.
+
+    Uses a self-pipe registered with createfilehandler. This is not available on Windows,
+    where Runner keeps polling the proxy instead.
+    """
+
+    def __init__(self, callback: Callable[[], None]):
+        self._callback = callback
+        self._read_fd = None
+        self._write_fd = None
+        # Avoids filling the pipe when many messages arrive before the UI thread wakes up
+        self._pending = False
+        self._lock = threading.Lock()
+
+        tkapp = get_workbench().tk
+        if running_on_windows() or not hasattr(tkapp, "createfilehandler"):
+            return
+
+        read_fd, write_fd = os.pipe()
+        try:
+            os.set_blocking(read_fd, False)
+            os.set_blocking(write_fd, False)
+            tkapp.createfilehandler(read_fd, tk.READABLE, self._on_readable)
+        except Exception:
+            logger.exception("Could not register message wakeup pipe, will poll instead")
+            os.close(read_fd)
+            os.close(write_fd)
+            return
+
+        self._read_fd = read_fd
+        self._write_fd = write_fd
+
+    def is_event_driven(self) -> bool:
+        return self._read_fd is not None
+
+    def notify(self) -> None:
+        """Can be called from any thread"""
+        if self._write_fd is None:
+            return
+
+        with self._lock:
+            if self._pending:
+                return
+            self._pending = True
+
+        try:
+            os.write(self._write_fd, b"\0")
+        except OSError:
+            logger.exception("Could not write to message wakeup pipe")
+
+    def _on_readable(self, fd, mask) -> None:
+        try:
+            while os.read(fd, 512):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self._lock:
+            self._pending = False
+
+        self._callback()
+
+
 class BackendProxy(ABC):
     """Communicates with backend process.
 
@@ -947,7 +1139,8 @@ class BackendProxy(ABC):
         Backend is considered ready when the runner gets a ToplevelResponse
         with attribute "welcome_text" from fetch_next_message.
         """
-        self.running_inline_command = False
+        # Inline commands sent but not answered yet, by command id
+        self.running_inline_commands: Dict[str, InlineCommand] = {}
 
     @abstractmethod
     def send_command(self, cmd: CommandToBackend) -> Optional[str]:
@@ -964,6 +1157,17 @@ class BackendProxy(ABC):
     def fetch_next_message(self):
         """Read next message from the queue or None if queue is empty"""
 
+    def set_message_arrival_callback(self, callback: Callable[[], None]) -> bool:
+        """If the proxy supports it, it should call the callback (from any thread)
+        when a message becomes available after the queue has been empty
+        and when the backend process ends.
+        Returns False if the runner needs to keep polling the proxy."""
+        return False
+
+    def get_last_message_arrival_time(self) -> Optional[float]:
+        """time.perf_counter() of the moment the last fetched message was received, if known"""
+        return None
+
     @abstractmethod
     def get_sys_path(self):
         "backend's sys.path"
@@ -1184,7 +1388,13 @@ class SubprocessProxy(BackendProxy, ABC):
         self._welcome_text = ""
 
         self._proc = None
+        self._spare_process: Optional[_SpareBackendProcess] = None
+        self._spare_process_after_id = None
         self._response_queue = None
+        self._message_arrival_callback: Optional[Callable[[], None]] = None
+        self._last_message_arrival_time: Optional[float] = None
+        # becomes binary after the backend has proven it speaks it
+        self._backend_wire_format = TEXT_WIRE_FORMAT
         self._sys_path = []
         self._board_id: Optional[str] = None
         self._usersitepackages = None
@@ -1256,12 +1466,20 @@ class SubprocessProxy(BackendProxy, ABC):
         env["THONNY_LANGUAGE"] = get_workbench().get_option("general.language")
         env["THONNY_VERSION"] = get_version()
 
+        if self.supports_binary_wire_format():
+            env[WIRE_FORMAT_ENV_VAR] = BINARY_WIRE_FORMAT
+
         if pystart.in_debug_mode():
             env["PYSTART_DEBUG"] = "1"
         elif "PYSTART_DEBUG" in env:
             del env["PYSTART_DEBUG"]
         return env
 
+    def supports_binary_wire_format(self) -> bool:
+        """Whether the backend should be asked to use the compact binary message format.
+        Text format remains understood in both directions regardless."""
+        return True
+
     def get_mgmt_executable_special_switches(self) -> List[str]:
         return []
 
@@ -1273,47 +1491,28 @@ class SubprocessProxy(BackendProxy, ABC):
         ]
 
     def _start_background_process(self, clean=None, extra_args=[]):
-        # deque, because in one occasion I need to put messages back
         logger.info("Starting background process, clean: %r, extra_args: %r", clean, extra_args)
-        self._response_queue = collections.deque()
+        self._response_queue = BackendMessageQueue(self._notify_message_arrival)
+        self._backend_wire_format = TEXT_WIRE_FORMAT
 
         exe_validation_error = self.get_mgmt_executable_validation_error()
         if exe_validation_error:
             raise RuntimeError(exe_validation_error)
 
-        cmd_line = (
-            [self._mgmt_executable]
-            + self.get_mgmt_executable_special_switches()
-            + self.get_mgmt_executable_python_switches()
-            + self._get_launcher_with_args()
-            + extra_args
-        )
-
-        if self.can_be_isolated():
-            cmd_line.insert(1, "-s")
-
-        creationflags = 0
-        if running_on_windows():
-            creationflags = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
-
-        logger.info("Starting the backend: %s %s", cmd_line, get_workbench().get_local_cwd())
-
-        self._proc = subprocess.Popen(
-            cmd_line,
-            executable=cmd_line[0],
-            bufsize=0,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            cwd=self._get_launch_cwd(),
-            env=self._get_environment(),
-            universal_newlines=True,
-            creationflags=creationflags,
-            encoding="utf-8",
-        )
+        launch_spec = self._create_launch_spec(extra_args)
+        spare = self._take_spare_process(launch_spec)
+        if spare is not None:
+            logger.info("Using spare backend process %s", spare.proc.pid)
+            self._proc = spare.proc
+            stdout_line = spare.wait_for_ack()
+        else:
+            logger.info(
+                "Starting the backend: %s %s", launch_spec["args"], get_workbench().get_local_cwd()
+            )
+            self._proc = _create_backend_process(launch_spec)
 
-        # read success acknowledgement
-        stdout_line = self._proc.stdout.readline().strip("\r\n")
+            # read success acknowledgement
+            stdout_line = self._proc.stdout.readline().strip("\r\n")
 
         # only attempt initial input if process started nicely,
         # otherwise can't read the error from stderr
@@ -1323,6 +1522,7 @@ class SubprocessProxy(BackendProxy, ABC):
             Thread(target=self._listen_stderr, args=(self._proc.stderr,), daemon=True).start()
 
             self._send_initial_input()
+            self._schedule_spare_process()
         else:
 
             return_code = self._proc.poll()
@@ -1335,6 +1535,79 @@ class SubprocessProxy(BackendProxy, ABC):
                 f"Could not start back-end process, got {stdout_line!r} instead of {PROCESS_ACK!r}"
             )
 
+    def _create_launch_spec(self, extra_args: List[str]) -> Dict[str, Any]:
+        """Everything which determines the initial state of the backend process"""
+        cmd_line = (
+            [self._mgmt_executable]
+            + self.get_mgmt_executable_special_switches()
+            + self.get_mgmt_executable_python_switches()
+            + self._get_launcher_with_args()
+            + extra_args
+        )
+
+        if self.can_be_isolated():
+            cmd_line.insert(1, "-s")
+
+        creationflags = 0
+        if running_on_windows():
+            creationflags = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+
+        return {
+            "args": cmd_line,
+            "cwd": self._get_launch_cwd(),
+            "env": self._get_environment(),
+            "creationflags": creationflags,
+        }
+
+    def should_keep_spare_process(self) -> bool:
+        """Whether a fresh backend process should be kept ready for next clean launch.
+        Only makes sense if the proxy restarts the process before running programs."""
+        return False
+
+    def _schedule_spare_process(self) -> None:
+        if self.should_keep_spare_process() and self._spare_process_after_id is None:
+            # Let the new process do its work first
+            self._spare_process_after_id = get_workbench().after(
+                SPARE_PROCESS_START_DELAY, self._start_spare_process
+            )
+
+    def _start_spare_process(self) -> None:
+        self._spare_process_after_id = None
+        if self._proc is None or self._spare_process is not None:
+            return
+
+        try:
+            launch_spec = self._create_launch_spec([])
+            self._spare_process = _SpareBackendProcess(
+                _create_backend_process(launch_spec), launch_spec
+            )
+            logger.info("Started spare backend process %s", self._spare_process.proc.pid)
+        except Exception:
+            logger.exception("Could not start spare backend process")
+
+    def _take_spare_process(self, launch_spec: Dict[str, Any]) -> Optional["_SpareBackendProcess"]:
+        spare = self._spare_process
+        self._spare_process = None
+        if spare is None:
+            return None
+
+        if spare.launch_spec != launch_spec or not spare.is_alive():
+            logger.info("Spare backend process doesn't match current configuration")
+            spare.kill()
+            return None
+
+        return spare
+
+    def _discard_spare_process(self) -> None:
+        if self._spare_process_after_id is not None:
+            get_workbench().after_cancel(self._spare_process_after_id)
+            self._spare_process_after_id = None
+
+        if self._spare_process is not None:
+            logger.info("Discarding spare backend process")
+            self._spare_process.kill()
+            self._spare_process = None
+
     def get_mgmt_executable_validation_error(self) -> Optional[str]:
         if not os.path.isfile(self._mgmt_executable):
             return f"INTERNAL ERROR: interpreter {self._mgmt_executable!r} not found."
@@ -1374,7 +1647,9 @@ class SubprocessProxy(BackendProxy, ABC):
             return
 
         try:
-            self._proc.stdin.write(serialize_message(msg) + "\n")
+            self._proc.stdin.write(
+                serialize_message(msg, wire_format=self._backend_wire_format) + "\n"
+            )
             self._proc.stdin.flush()
         except BrokenPipeError:
             import traceback
@@ -1405,6 +1680,7 @@ class SubprocessProxy(BackendProxy, ABC):
         return self._board_id
 
     def destroy(self, for_restart: bool = False):
+        self._discard_spare_process()
         self._close_backend()
 
     def _close_backend(self):
@@ -1424,25 +1700,41 @@ class SubprocessProxy(BackendProxy, ABC):
                 self._proc.kill()
 
         self._proc = None
+        if self._response_queue is not None:
+            if pystart.in_debug_mode():
+                logger.info("Message queue stats: %r", self._response_queue.get_stats())
+            # release the reader thread if it's blocked
+            self._response_queue.close()
         self._response_queue = None
 
+    def set_message_arrival_callback(self, callback: Callable[[], None]) -> bool:
+        self._message_arrival_callback = callback
+        return True
+
+    def _notify_message_arrival(self) -> None:
+        if self._message_arrival_callback is not None:
+            self._message_arrival_callback()
+
+    def get_last_message_arrival_time(self) -> Optional[float]:
+        return self._last_message_arrival_time
+
     def _listen_stdout(self, stdout):
         # will be called from separate thread
 
-        # allow self._response_queue to be replaced while processing
+        # allow self._response_queue and self._proc to be replaced while processing
         message_queue = self._response_queue
+        proc = self._proc
 
         def publish_as_msg(data):
             msg = parse_message(data)
+            if data[0] == BINARY_MESSAGE_MARKER:
+                # backend understands binary format, so commands can use it as well
+                self._backend_wire_format = BINARY_WIRE_FORMAT
             if "cwd" in msg:
                 self.cwd = msg["cwd"]
-            message_queue.append(msg)
-
-            if len(message_queue) > 10:
-                # Probably backend runs an infinite/long print loop.
-                # Throttle message throughput in order to keep GUI thread responsive.
-                while len(message_queue) > 0:
-                    sleep(0.005)
+            # Blocks if the frontend can't keep up with program output.
+            # This way a long print loop in the backend gets throttled by the pipe.
+            message_queue.put(msg)
 
         while True:
             try:
@@ -1455,6 +1747,9 @@ class SubprocessProxy(BackendProxy, ABC):
             # debug("... read some stdout data", repr(data))
             if data == "":
                 logger.info("Reader got EOF")
+                # Let the runner find out about the termination
+                proc.wait()
+                self._notify_message_arrival()
                 break
             else:
                 try:
@@ -1465,26 +1760,32 @@ class SubprocessProxy(BackendProxy, ABC):
                     # NB! If subprocess printed it without linebreak,
                     # then the suffix can be thonny message
 
-                    parts = data.rsplit(common.MESSAGE_MARKER, maxsplit=1)
+                    marker = (
+                        BINARY_MESSAGE_MARKER
+                        if data.rfind(BINARY_MESSAGE_MARKER) > data.rfind(common.MESSAGE_MARKER)
+                        else common.MESSAGE_MARKER
+                    )
+                    parts = data.rsplit(marker, maxsplit=1)
 
                     # print first part as it is
-                    message_queue.append(
+                    message_queue.put(
                         BackendEvent("ProgramOutput", data=parts[0], stream_name="stdout")
                     )
 
                     if len(parts) == 2:
-                        second_part = common.MESSAGE_MARKER + parts[1]
+                        second_part = marker + parts[1]
                         try:
                             publish_as_msg(second_part)
                         except Exception:
                             # just print ...
-                            message_queue.append(
+                            message_queue.put(
                                 BackendEvent(
                                     "ProgramOutput", data=second_part, stream_name="stdout"
                                 )
                             )
 
     def _listen_stderr(self, stderr):
+        message_queue = self._response_queue
         while True:
             data = read_one_incoming_message_str(stderr.readline)
             if data == "":
@@ -1495,7 +1796,7 @@ class SubprocessProxy(BackendProxy, ABC):
                 if "Could not find platform independent libraries" in data:
                     logger.debug("Filtered stderr: %r", data)
                     continue
-                self._response_queue.append(
+                message_queue.put(
                     BackendEvent("ProgramOutput", stream_name="stderr", data=data)
                 )
                 logger.error("STDERR: %r", data)
@@ -1627,7 +1928,8 @@ class SubprocessProxy(BackendProxy, ABC):
             else:
                 return None
 
-        msg = self._response_queue.popleft()
+        msg = self._response_queue.get()
+        self._last_message_arrival_time = self._response_queue.last_arrival_time
         if isinstance(msg, ToplevelResponse):
             self._store_state_info(msg)
             if not self._have_check_remembered_current_configuration:
@@ -1650,26 +1952,224 @@ class SubprocessProxy(BackendProxy, ABC):
                     else:
                         return msg
                 else:
-                    next_msg = self._response_queue.popleft()
-                    if (
-                        next_msg.event_type == "ProgramOutput"
-                        and next_msg["stream_name"] == msg["stream_name"]
-                        and (
-                            len(msg["data"]) + len(next_msg["data"]) <= OUTPUT_MERGE_THRESHOLD
-                            and ("\n" not in msg["data"] or not io_animation_required)
-                            or _ends_with_incomplete_ansi_code(msg["data"])
-                        )
+                    next_msg = self._response_queue.get()
+                    if _is_program_output(next_msg) and (
+                        _can_merge_output(msg, next_msg)
+                        # let the waiting prompt or input request through sooner
+                        or next_msg["stream_name"] == msg["stream_name"]
+                        and self._response_queue.has_pending_output_barrier()
                     ):
                         msg["data"] += next_msg["data"]
                     else:
                         # not to be sent in the same block, put it back
-                        self._response_queue.appendleft(next_msg)
+                        self._response_queue.unget(next_msg)
                         return msg
 
         else:
             return msg
 
 
+class _SpareBackendProcess:
+    """Backend process which has been started in advance and waits for its first command"""
+
+    def __init__(self, proc: subprocess.Popen, launch_spec: Dict[str, Any]):
+        self.proc = proc
+        self.launch_spec = launch_spec
+        self._ack_line = None
+        self._ack_thread = Thread(target=self._read_ack, daemon=True)
+        self._ack_thread.start()
+
+    def _read_ack(self) -> None:
+        self._ack_line = self.proc.stdout.readline().strip("\r\n")
+
+    def wait_for_ack(self) -> str:
+        self._ack_thread.join()
+        return self._ack_line
+
+    def is_alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def kill(self) -> None:
+        if self.is_alive():
+            self.proc.kill()
+
+
+def _create_backend_process(launch_spec: Dict[str, Any]) -> subprocess.Popen:
+    return subprocess.Popen(
+        launch_spec["args"],
+        executable=launch_spec["args"][0],
+        bufsize=0,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=launch_spec["cwd"],
+        env=launch_spec["env"],
+        universal_newlines=True,
+        creationflags=launch_spec["creationflags"],
+        encoding="utf-8",
+    )
+
+
+class BackendMessageQueue:
+    """Holds messages read from the backend until the UI thread gets to them.
+
+    Program output goes to a bounded lane. When the lane is full, the reader thread
+    blocks in `put`, stops reading the pipe, and so the backend eventually blocks
+    in its writes. Other messages go to a priority lane and never block.
+    Most of them overtake buffered output. ToplevelResponse, InputRequest and
+    DebuggerResponse may only overtake the output received after them, because
+    the shell needs earlier output to be in place before the prompt.
+    """
+
+    def __init__(
+        self,
+        on_arrival: Optional[Callable[[], None]] = None,
+        max_output_chars: int = OUTPUT_QUEUE_MAX_CHARS,
+        max_output_messages: int = OUTPUT_QUEUE_MAX_MESSAGES,
+    ):
+        self._on_arrival = on_arrival
+        self._max_output_chars = max_output_chars
+        self._max_output_messages = max_output_messages
+        self._output_lane: collections.deque = collections.deque()
+        self._priority_lane: collections.deque = collections.deque()
+        self._output_chars = 0
+        self._seq = 0
+        self._last_barrier_seq = -1
+        self._closed = False
+        self._condition = threading.Condition()
+
+        self.enqueued_count = 0
+        self.merged_count = 0
+        self.max_depth = 0
+        self.blocked_count = 0
+        self.blocked_time = 0.0
+        # time.perf_counter() of the moment the message last returned by `get` was put
+        self.last_arrival_time: Optional[float] = None
+
+    def put(self, msg: MessageFromBackend) -> None:
+        """Called from reader threads. Blocks while output lane is over budget.
+        Calls on_arrival when the queue stops being empty."""
+        with self._condition:
+            if _is_program_output(msg) and self._is_output_lane_full() and not self._closed:
+                self.blocked_count += 1
+                start_time = time.perf_counter()
+                while self._is_output_lane_full() and not self._closed:
+                    self._condition.wait()
+                self.blocked_time += time.perf_counter() - start_time
+
+            if self._closed:
+                return
+
+            was_empty = len(self) == 0
+            self.enqueued_count += 1
+            if _is_program_output(msg):
+                self._output_chars += len(msg["data"])
+                if self._output_lane:
+                    last_seq, _, last_msg = self._output_lane[-1]
+                    if last_seq > self._last_barrier_seq and _can_merge_output(last_msg, msg):
+                        last_msg["data"] += msg["data"]
+                        self.merged_count += 1
+                        return
+
+                self._output_lane.append((self._next_seq(), time.perf_counter(), msg))
+            else:
+                seq = self._next_seq()
+                if _is_output_barrier(msg):
+                    self._last_barrier_seq = seq
+                self._priority_lane.append((seq, time.perf_counter(), msg))
+
+            self.max_depth = max(self.max_depth, len(self))
+
+        if was_empty and self._on_arrival is not None:
+            self._on_arrival()
+
+    def get(self) -> Optional[MessageFromBackend]:
+        """Returns next message to be processed or None, doesn't block"""
+        with self._condition:
+            if self._priority_lane:
+                seq, arrival_time, msg = self._priority_lane[0]
+                if (
+                    not _is_output_barrier(msg)
+                    or not self._output_lane
+                    or self._output_lane[0][0] > seq
+                ):
+                    self._priority_lane.popleft()
+                    self.last_arrival_time = arrival_time
+                    return msg
+
+            if self._output_lane:
+                _, arrival_time, msg = self._output_lane.popleft()
+                self._output_chars -= len(msg["data"])
+                self._condition.notify_all()
+                self.last_arrival_time = arrival_time
+                return msg
+
+            return None
+
+    def unget(self, msg: MessageFromBackend) -> None:
+        """Puts back the message just received from `get`"""
+        with self._condition:
+            # sequence number is only used for comparing against the other lane,
+            # -1 keeps the message in front of everything
+            if _is_program_output(msg):
+                self._output_lane.appendleft((-1, self.last_arrival_time, msg))
+                self._output_chars += len(msg["data"])
+            else:
+                self._priority_lane.appendleft((-1, self.last_arrival_time, msg))
+
+    def has_pending_output_barrier(self) -> bool:
+        """Tells whether some buffered output must be delivered before a waiting control message"""
+        with self._condition:
+            return any(_is_output_barrier(msg) for _, _, msg in self._priority_lane)
+
+    def close(self) -> None:
+        """Releases a blocked reader. Later messages get discarded."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enqueued": self.enqueued_count,
+            "merged": self.merged_count,
+            "max_depth": self.max_depth,
+            "blocked_count": self.blocked_count,
+            "blocked_time": round(self.blocked_time, 3),
+            "depth": len(self),
+        }
+
+    def _is_output_lane_full(self) -> bool:
+        return (
+            self._output_chars >= self._max_output_chars
+            or len(self._output_lane) >= self._max_output_messages
+        )
+
+    def _next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def __len__(self) -> int:
+        return len(self._output_lane) + len(self._priority_lane)
+
+
+def _is_program_output(msg: MessageFromBackend) -> bool:
+    return isinstance(msg, BackendEvent) and msg.event_type == "ProgramOutput"
+
+
+def _is_output_barrier(msg: MessageFromBackend) -> bool:
+    return isinstance(msg, (ToplevelResponse, DebuggerResponse)) or (
+        isinstance(msg, BackendEvent) and msg.event_type == "InputRequest"
+    )
+
+
+def _can_merge_output(msg: BackendEvent, next_msg: BackendEvent) -> bool:
+    return next_msg["stream_name"] == msg["stream_name"] and (
+        len(msg["data"]) + len(next_msg["data"]) <= OUTPUT_MERGE_THRESHOLD
+        and ("\n" not in msg["data"] or not io_animation_required)
+        or _ends_with_incomplete_ansi_code(msg["data"])
+    )
+
+
 def _ends_with_incomplete_ansi_code(data):
     pos = max(data.rfind("\033["), data.rfind("\033]"))
 
@@ -1,14 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import ast
+import copy
+import csv
+import math
 import os.path
 import pathlib
 import re
+import tempfile
 import tkinter as tk
 import traceback
-from dataclasses import dataclass
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
 from logging import getLogger
-from tkinter import ttk
-from typing import List, Optional
+from tkinter import messagebox, ttk
+from typing import Callable, Collection, Deque, List, Optional, Set, Tuple, Union
 
 from _tkinter import TclError
 
@@ -46,13 +53,16 @@ from pystart.lsp_types import (
     TextDocumentItem,
     VersionedTextDocumentIdentifier,
 )
-from pystart.misc_utils import construct_cmd_line, parse_cmd_line
+from pystart.misc_utils import construct_cmd_line, parse_cmd_line, running_on_mac_os
 from pystart.running import EDITOR_CONTENT_TOKEN
 from pystart.tktextext import TextFrame, TweakableText, index2line
 from pystart.ui_utils import (
     CommonDialog,
     EnhancedTextWithLogging,
+    MenuEx,
     TextMenu,
+    ask_string,
+    asksaveasfilename,
     compute_tab_stops,
     create_tooltip,
     ems_to_pixels,
@@ -82,6 +92,13 @@ OUTPUT_SPLIT_REGEX = re.compile(
     "(%s|%s|%s)"
     % (TERMINAL_CONTROL_REGEX_STR, OBJECT_INFO_START_REGEX_STR, OBJECT_INFO_END_REGEX_STR)
 )
+OBJECT_LINK_SPLIT_REGEX = re.compile(
+    "(%s|%s)" % (OBJECT_INFO_START_REGEX_STR, OBJECT_INFO_END_REGEX_STR)
+)
+# ESC, which may start an escape sequence continuing in next output
+INCOMPLETE_ESCAPE_REGEX = re.compile(r"\x1B(?:\[[0-?]*[ -/]*|\][^\a\x1B]*)?")
+MAX_INCOMPLETE_ESCAPE_LENGTH = 1024
+MAX_STYLE_CACHE_SIZE = 1000
 NUMBER_SPLIT_REGEX = re.compile(r"((?<!\w)[-+]?[0-9]*\.?[0-9]+\b)")
 SIMPLE_URL_SPLIT_REGEX = re.compile(
     r"(https?://[\w/.:\-?#=%&]+[\w/]|data:image/[a-z]+;base64,[A-Za-z0-9/=+]+)"
@@ -100,6 +117,22 @@ ANSI_COLOR_NAMES = {
     "9": "default",
 }
 
+# When the shell has applied this many IO events of a command, the output shown so far
+# stops being rewindable. Keeps the memory and the bookkeeping of long outputs bounded.
+REWINDABLE_IO_EVENTS_LIMIT = 10000
+
+# Max number of characters in one compressed piece of scrollback
+SCROLLBACK_CHUNK_SIZE = 64 * 1024
+
+# Longer lines are not parsed for the plotter
+MAX_PLOT_LINE_LENGTH = 10000
+# How far back the plotter looks for a line pattern to show as legend
+MAX_PLOT_LEGEND_LOOKBACK = 1000
+_PLOT_BREAK = (None, ())
+
+# Max number of characters of executed code in the shell's document for the language server
+MAX_LS_CONTEXT_SIZE = 64 * 1024
+
 
 @dataclass
 class ExecutionInfo:
@@ -108,9 +141,1063 @@ class ExecutionInfo:
     io_end_index: str
 
 
+class IOEventLog:
+    """IO events of current toplevel command, which are waiting to be shown in the shell
+    (queued) or are already shown (applied).
+
+    The number of applied characters is kept up to date, as the debugger reports the IO
+    position of the selected state as a character count. Applied events can be moved back
+    to the queue for replaying them. Trimmed events can't be replayed, but their characters
+    remain counted.
+    """
+
+    def __init__(self):
+        self._queued = deque()
+        self._applied = deque()
+        self._applied_char_count = 0
+        self._trimmed_char_count = 0
+        self._trimmed_event_count = 0
+
+    def clear(self) -> None:
+        self._queued.clear()
+        self._applied.clear()
+        self._applied_char_count = 0
+        self._trimmed_char_count = 0
+        self._trimmed_event_count = 0
+
+    def has_queued(self) -> bool:
+        return bool(self._queued)
+
+    def has_applied(self) -> bool:
+        return bool(self._applied) or self._trimmed_event_count > 0
+
+    def get_applied_char_count(self) -> int:
+        return self._applied_char_count
+
+    def get_trimmed_char_count(self) -> int:
+        return self._trimmed_char_count
+
+    def get_rewindable_event_count(self) -> int:
+        return len(self._applied)
+
+    def append(self, data: "IOEvent", stream_name: str) -> None:
+        self._queued.append((data, stream_name))
+
+    def pop_queued(self) -> Tuple["IOEvent", str]:
+        return self._queued.popleft()
+
+    def push_back_queued(self, data: "IOEvent", stream_name: str) -> None:
+        self._queued.appendleft((data, stream_name))
+
+    def add_applied(self, data: "IOEvent", stream_name: str) -> None:
+        self._applied.append((data, stream_name))
+        self._applied_char_count += len(data)
+
+    def requeue_applied(self) -> None:
+        self._queued.extendleft(reversed(self._applied))
+        self._applied.clear()
+        self._applied_char_count = self._trimmed_char_count
+
+    def trim_applied(self) -> None:
+        self._trimmed_char_count = self._applied_char_count
+        self._trimmed_event_count += len(self._applied)
+        self._applied.clear()
+
+
+@dataclass
+class OutputRun:
+    """Text shown with the same tags.
+
+    Control sequences consumed by the run (eg. SGR sequences) are not shown, but they count
+    as characters of the run. This way the lengths of the IO events add up to the character
+    counts reported by the back-end.
+    """
+
+    text: str
+    tags: Tuple[str, ...] = ()
+    # True for a line longer than the squeeze threshold
+    squeeze: bool = False
+    # (index in text, length) of the consumed control sequences
+    hidden: List[Tuple[int, int]] = field(default_factory=list)
+    hidden_length: int = 0
+
+    def __len__(self) -> int:
+        return len(self.text) + self.hidden_length
+
+    def hide(self, sequence: str) -> None:
+        self.hidden.append((len(self.text), len(sequence)))
+        self.hidden_length += len(sequence)
+
+    def split(self, count: int) -> Tuple["OutputRun", "OutputRun"]:
+        """Returns the first count characters and the rest as separate runs"""
+        head = OutputRun("", self.tags, self.squeeze)
+        tail = OutputRun("", self.tags, self.squeeze)
+
+        def add_part(run: OutputRun, text: str, hidden_length: int) -> None:
+            run.text += text
+            if hidden_length:
+                run.hidden.append((len(run.text), hidden_length))
+                run.hidden_length += hidden_length
+
+        text_pos = 0
+        for index, length in self.hidden + [(len(self.text), 0)]:
+            text = self.text[text_pos:index]
+            head_text_length = min(len(text), max(count - len(head), 0))
+            add_part(head, text[:head_text_length], 0)
+            add_part(tail, text[head_text_length:], 0)
+
+            head_hidden_length = min(length, max(count - len(head), 0))
+            add_part(head, "", head_hidden_length)
+            add_part(tail, "", length - head_hidden_length)
+            text_pos = index
+
+        return head, tail
+
+
+@dataclass
+class CursorMove:
+    """Moves the output cursor by given number of characters or to the start of the line"""
+
+    delta: Union[int, str]  # "line" for carriage return
+    sequence: str
+
+    def __len__(self) -> int:
+        return len(self.sequence)
+
+
+IOEvent = Union[OutputRun, CursorMove, str]
+_CARRIAGE_RETURN = CursorMove("line", "\r")
+_BACKSPACE = CursorMove(-1, "\b")
+
+
+class OutputTokenizer:
+    """Turns the output of one stream into IO events in one pass.
+
+    Text becomes OutputRun-s with the tags of its final style. Neighbouring text with
+    equal tags gets merged, also when the style was changed and changed back between them.
+    Lines longer than the squeeze threshold become separate runs marked for squeezing.
+
+    In TTY mode \\r, \\b and cursor forward and back sequences become CursorMove-s.
+    SGR sequences (colors and styles) update the style (only when the stream is styled)
+    and other CSI sequences are ignored. Both get hidden in the runs. Bells, OSC sequences
+    and object link markers are passed on as strings. An escape sequence, which is
+    incomplete at the end of the data, is kept until the next data arrives.
+
+    Without TTY mode only the object link markers get separated from the text.
+    """
+
+    def __init__(self, styled: bool = True):
+        self._styled = styled
+        self._pending = ""
+        # programs tend to repeat same style changes
+        self._style_cache = {}
+        self._reset_style()
+
+    def feed(self, data: str, squeeze_threshold: int, tty_mode: bool = True) -> List[IOEvent]:
+        data = self._pending + data
+        self._pending = ""
+        if tty_mode:
+            incomplete_start = _find_incomplete_escape(data)
+            if incomplete_start != -1:
+                self._pending = data[incomplete_start:]
+                data = data[:incomplete_start]
+            split_regex = OUTPUT_SPLIT_REGEX
+        else:
+            split_regex = OBJECT_LINK_SPLIT_REGEX
+
+        events = []
+        pos = 0
+        for match in split_regex.finditer(data):
+            if match.start() > pos:
+                self._add_text(events, data[pos : match.start()], squeeze_threshold)
+            self._add_marker(events, match.group())
+            pos = match.end()
+
+        if pos < len(data):
+            self._add_text(events, data[pos:], squeeze_threshold)
+
+        return events
+
+    def flush(self) -> List[OutputRun]:
+        """Returns the incomplete sequence as text and forgets the style"""
+        events = [OutputRun(self._pending, self._tags)] if self._pending else []
+        self._pending = ""
+        self._reset_style()
+        return events
+
+    def _add_marker(self, events: list, marker: str) -> None:
+        if marker == "\r":
+            events.append(_CARRIAGE_RETURN)
+        elif marker == "\b":
+            events.append(_BACKSPACE)
+        elif marker == "\a" or marker.startswith("\x1b]"):
+            events.append(marker)
+        elif marker.startswith("\x1b["):
+            if marker.endswith("m"):
+                if self._styled:
+                    self._apply_sgr_sequence(marker)
+            elif marker.endswith("C") or marker.endswith("D"):
+                ints = INT_REGEX.findall(marker)
+                if len(ints) == 1:
+                    delta = int(ints[0])
+                    events.append(CursorMove(-delta if marker.endswith("D") else delta, marker))
+                    return
+                logger.warning("bad CSI cursor positioning: %s", marker)
+
+            self._get_hiding_run(events).hide(marker)
+        else:
+            # object link marker
+            events.append(marker)
+
+    def _add_text(self, events: list, text: str, squeeze_threshold: int) -> None:
+        if len(text) <= squeeze_threshold:
+            self._get_open_run(events).text += text
+            return
+
+        # lines longer than the threshold will be squeezed
+        start = 0
+        line_start = 0
+        while True:
+            line_end = text.find("\n", line_start)
+            if line_end == -1:
+                line_end = len(text)
+
+            if (
+                line_end - line_start > squeeze_threshold
+                and _get_non_url_length(text[line_start:line_end]) > squeeze_threshold
+            ):
+                if line_start > start:
+                    self._get_open_run(events).text += text[start:line_start]
+                events.append(OutputRun(text[line_start:line_end], self._tags, squeeze=True))
+                start = line_end
+
+            if line_end == len(text):
+                break
+            line_start = line_end + 1
+
+        if start < len(text):
+            self._get_open_run(events).text += text[start:]
+
+    def _get_hiding_run(self, events: list) -> OutputRun:
+        """Returns the run, which can take a hidden sequence"""
+        if events and isinstance(events[-1], OutputRun) and not events[-1].squeeze:
+            # style of the preceding text doesn't matter for invisible sequences
+            return events[-1]
+
+        run = OutputRun("", self._tags)
+        events.append(run)
+        return run
+
+    def _get_open_run(self, events: list) -> OutputRun:
+        """Returns the run, which can take text in current style"""
+        if events:
+            last = events[-1]
+            if isinstance(last, OutputRun) and not last.squeeze:
+                if last.tags == self._tags:
+                    return last
+                elif not last.text:
+                    # only hidden sequences so far
+                    last.tags = self._tags
+                    return last
+
+        run = OutputRun("", self._tags)
+        events.append(run)
+        return run
+
+    def _reset_style(self) -> None:
+        self._foreground = None
+        self._background = None
+        self._inverse = False
+        self._intensity = None
+        self._italic = False
+        self._underline = False
+        self._conceal = False
+        self._strikethrough = False
+        self._tags: Tuple[str, ...] = ()
+
+    def _get_style_state(self) -> tuple:
+        return (
+            self._foreground,
+            self._background,
+            self._inverse,
+            self._intensity,
+            self._italic,
+            self._underline,
+            self._conceal,
+            self._strikethrough,
+            self._tags,
+        )
+
+    def _apply_sgr_sequence(self, marker: str) -> None:
+        key = (self._get_style_state(), marker)
+        new_state = self._style_cache.get(key)
+        if new_state is None:
+            self._update_style(marker)
+            if len(self._style_cache) >= MAX_STYLE_CACHE_SIZE:
+                self._style_cache.clear()
+            self._style_cache[key] = self._get_style_state()
+        else:
+            (
+                self._foreground,
+                self._background,
+                self._inverse,
+                self._intensity,
+                self._italic,
+                self._underline,
+                self._conceal,
+                self._strikethrough,
+                self._tags,
+            ) = new_state
+
+    def _update_style(self, marker: str) -> None:
+        codes = INT_REGEX.findall(marker)
+        if not codes:
+            self._reset_style()
+
+        while codes:
+            code = codes.pop(0)
+
+            if code == "0":
+                self._reset_style()
+            elif code in ["1", "2"]:
+                self._intensity = code
+            elif code == "3":
+                self._italic = True
+            elif code == "4":
+                self._underline = True
+            elif code == "7":
+                self._inverse = True
+            elif code == "8":
+                self._conceal = True
+            elif code == "9":
+                self._strikethrough = True
+            elif code == "22":
+                self._intensity = None
+            elif code == "23":
+                self._italic = False
+            elif code == "24":
+                self._underline = False
+            elif code == "27":
+                self._inverse = False
+            elif code == "28":
+                self._conceal = False
+            elif code == "29":
+                self._strikethrough = False
+            if code in [
+                "30",
+                "31",
+                "32",
+                "33",
+                "34",
+                "35",
+                "36",
+                "37",
+                "90",
+                "91",
+                "92",
+                "93",
+                "94",
+                "95",
+                "96",
+                "97",
+            ]:
+                self._foreground = code
+            elif code == "39":
+                self._foreground = None
+            elif code in [
+                "40",
+                "41",
+                "42",
+                "43",
+                "44",
+                "45",
+                "46",
+                "47",
+                "100",
+                "101",
+                "102",
+                "103",
+                "104",
+                "105",
+                "106",
+                "107",
+            ]:
+                self._background = code
+            elif code == "49":
+                self._background = None
+            elif code in ["38", "48"]:
+                # multipart code, ignore for now,
+                # but make sure all arguments are ignored
+                if not codes:
+                    # nothing follows, ie. invalid code
+                    break
+                mode = codes.pop(0)
+                if mode == "5":
+                    # 256-color code, just ignore for now
+                    if not codes:
+                        break
+                    codes = codes[1:]
+                elif mode == "2":
+                    # 24-bit code, ignore
+                    if len(codes) < 3:
+                        # invalid code
+                        break
+                    codes = codes[3:]
+            else:
+                # ignore other codes
+                pass
+
+        self._tags = self._get_style_tags()
+
+    def _get_style_tags(self) -> Tuple[str, ...]:
+        result = set()
+
+        if self._foreground:
+            fg = ANSI_COLOR_NAMES[self._foreground[-1]]
+            if self._intensity == "1" or self._foreground[0] == "9":
+                fg = "bright_" + fg
+            elif self._intensity == "2":
+                fg = "dim_" + fg
+        else:
+            fg = "fore"
+            if self._intensity == "1":
+                fg = "bright_" + fg
+            elif self._intensity == "2":
+                fg = "dim_" + fg
+
+        if self._background:
+            bg = ANSI_COLOR_NAMES[self._background[-1]]
+            if self._background.startswith("10"):
+                bg = "bright_" + bg
+        else:
+            bg = "back"
+
+        if self._inverse:
+            result.add(fg + "_bg")
+            result.add(bg + "_fg")
+        else:
+            if fg != "fore":
+                result.add(fg + "_fg")
+            if bg != "back":
+                result.add(bg + "_bg")
+
+        if self._intensity == "1" and self._italic:
+            result.add("intense_italic_io")
+        elif self._intensity == "1":
+            result.add("intense_io")
+        elif self._italic:
+            result.add("italic_io")
+
+        if self._underline:
+            result.add("underline")
+
+        if self._strikethrough:
+            result.add("strikethrough")
+
+        return tuple(sorted(result))
+
+
+def _get_non_url_length(text: str) -> int:
+    result = len(text)
+    for url_match in SIMPLE_URL_SPLIT_REGEX.finditer(text):
+        result -= url_match.end() - url_match.start()
+    return result
+
+
+def _find_incomplete_escape(data: str) -> int:
+    search_start = max(0, len(data) - MAX_INCOMPLETE_ESCAPE_LENGTH)
+    esc_index = data.rfind("\x1b", search_start)
+    if esc_index == -1 or not INCOMPLETE_ESCAPE_REGEX.fullmatch(data, esc_index):
+        return -1
+
+    if esc_index == len(data) - 1:
+        # may be the start of the terminator of an OSC sequence
+        osc_index = data.rfind("\x1b]", search_start, esc_index)
+        if osc_index != -1 and INCOMPLETE_ESCAPE_REGEX.fullmatch(data, osc_index, esc_index):
+            return osc_index
+
+    return esc_index
+
+
+@dataclass
+class ScrollbackChunk:
+    char_count: int
+    line_count: int
+    # compressed text, None when the chunk is in the scrollback file
+    data: Optional[bytes]
+    file_offset: int = 0
+    size: int = 0
+
+
+class ScrollbackStore:
+    """Text discarded from the top of the shell, kept in zlib-compressed chunks.
+
+    Chunks are kept in memory, until their total size exceeds the memory budget. After
+    this, oldest chunks get moved to a temporary file. When the file contains more than
+    the disk budget, oldest chunks get forgotten.
+
+    Chunks are split at line ends, so that search finds the occurrences within lines.
+    """
+
+    def __init__(self):
+        # see set_budgets
+        self._memory_budget = 0
+        self._disk_budget = 0
+        # oldest first. Chunks in the file precede the chunks in memory
+        self._chunks: Deque[ScrollbackChunk] = deque()
+        self._file_chunk_count = 0
+        self._memory_size = 0
+        self._disk_size = 0
+        self._line_count = 0
+        self._file = None
+        self._file_size = 0
+
+    def set_budgets(self, memory_budget: int, disk_budget: int) -> None:
+        self._memory_budget = memory_budget
+        self._disk_budget = disk_budget
+        self._enforce_budgets()
+
+    def get_line_count(self) -> int:
+        return self._line_count
+
+    def push(self, text: str) -> None:
+        """Adds text (consisting of whole lines) after the text added before"""
+        if (
+            self._chunks
+            and self._chunks[-1].data is not None
+            and self._chunks[-1].char_count + len(text) <= SCROLLBACK_CHUNK_SIZE
+        ):
+            # small pieces compress better together
+            text = self.pop() + text
+
+        while text:
+            if len(text) <= SCROLLBACK_CHUNK_SIZE:
+                piece_length = len(text)
+            else:
+                # line longer than the chunk size gets split
+                piece_length = text.rfind("\n", 0, SCROLLBACK_CHUNK_SIZE) + 1
+                if piece_length == 0:
+                    piece_length = SCROLLBACK_CHUNK_SIZE
+            piece = text[:piece_length]
+            text = text[piece_length:]
+
+            data = zlib.compress(piece.encode("utf-8"))
+            self._chunks.append(ScrollbackChunk(len(piece), piece.count("\n"), data))
+            self._memory_size += len(data)
+            self._line_count += self._chunks[-1].line_count
+
+        self._enforce_budgets()
+
+    def pop(self) -> Optional[str]:
+        """Removes and returns the newest chunk of text"""
+        if not self._chunks:
+            return None
+
+        chunk = self._chunks.pop()
+        text = self._read_chunk(chunk)
+        self._line_count -= chunk.line_count
+        if chunk.data is None:
+            self._file_chunk_count -= 1
+            self._disk_size -= chunk.size
+        else:
+            self._memory_size -= len(chunk.data)
+
+        return text
+
+    def find(self, text: str, nocase: bool = False) -> Optional[int]:
+        """Returns the number of newest chunks, which need to be popped for getting the
+        newest occurrence of the text, or None if the text is not in the scrollback."""
+        if nocase:
+            text = text.lower()
+
+        # an occurrence may continue in the next chunk (lines longer than a chunk get split)
+        newer_prefix = ""
+        for i, chunk in enumerate(reversed(self._chunks)):
+            chunk_text = self._read_chunk(chunk)
+            if nocase:
+                chunk_text = chunk_text.lower()
+            chunk_text += newer_prefix
+            if text in chunk_text:
+                return i + 1
+            newer_prefix = chunk_text[: len(text) - 1]
+
+        return None
+
+    def clear(self) -> None:
+        self._chunks.clear()
+        self._file_chunk_count = 0
+        self._memory_size = 0
+        self._disk_size = 0
+        self._line_count = 0
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._file_size = 0
+
+    def _read_chunk(self, chunk: ScrollbackChunk) -> str:
+        if chunk.data is not None:
+            data = chunk.data
+        else:
+            self._file.seek(chunk.file_offset)
+            data = self._file.read(chunk.size)
+        return zlib.decompress(data).decode("utf-8")
+
+    def _enforce_budgets(self) -> None:
+        while (
+            self._memory_size > self._memory_budget
+            and self._file_chunk_count < len(self._chunks)
+        ):
+            self._move_to_file(self._chunks[self._file_chunk_count])
+
+        while self._file_chunk_count and self._disk_size > self._disk_budget:
+            chunk = self._chunks.popleft()
+            self._file_chunk_count -= 1
+            self._disk_size -= chunk.size
+            self._line_count -= chunk.line_count
+
+        if self._file is not None and self._file_size > 2 * self._disk_size + SCROLLBACK_CHUNK_SIZE:
+            self._compact_file()
+
+    def _move_to_file(self, chunk: ScrollbackChunk) -> None:
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="pystart_scrollback_")
+            self._file_size = 0
+
+        self._file.seek(self._file_size)
+        self._file.write(chunk.data)
+        chunk.file_offset = self._file_size
+        chunk.size = len(chunk.data)
+        self._file_size += chunk.size
+        self._memory_size -= chunk.size
+        self._disk_size += chunk.size
+        self._file_chunk_count += 1
+        chunk.data = None
+
+    def _compact_file(self) -> None:
+        """Removes the space of forgotten and popped chunks"""
+        file_chunks = [self._chunks[i] for i in range(self._file_chunk_count)]
+        contents = []
+        for chunk in file_chunks:
+            self._file.seek(chunk.file_offset)
+            contents.append(self._file.read(chunk.size))
+
+        self._file.seek(0)
+        self._file.truncate()
+        self._file_size = 0
+        for chunk, data in zip(file_chunks, contents):
+            self._file.write(data)
+            chunk.file_offset = self._file_size
+            self._file_size += chunk.size
+
+
+class PlotSeriesBuffer:
+    """Numbers printed to stdout, kept in a ring buffer for the plotter.
+
+    Each complete line becomes a point, which consists of the pattern of the line (the text
+    around the numbers) and the numbers. Lines without numbers become a break point, which
+    separates the series (several such lines in a row give one break point).
+
+    Points have absolute indices, which keep growing until the buffer gets cleared. This
+    way the plotter can tell which points are new since the last update.
+    """
+
+    def __init__(self, capacity: int):
+        self._capacity = max(capacity, 1)
+        self._points: List[Tuple[Optional[Tuple[str, ...]], Tuple[float, ...]]] = [
+            _PLOT_BREAK
+        ] * self._capacity
+        self._end = 0
+        self._count = 0
+        self._max_series_count = 0
+        # None means that the rest of current line is too long to be plotted
+        self._partial_line: Optional[str] = ""
+        # incremented when existing points change
+        self._generation = 0
+
+    def get_capacity(self) -> int:
+        return self._capacity
+
+    def set_capacity(self, capacity: int) -> None:
+        """Changes the capacity, keeping the newest points"""
+        capacity = max(capacity, 1)
+        if capacity == self._capacity:
+            return
+        kept_count = min(self._count, capacity)
+        points = [self.get_point(i) for i in range(self._end - kept_count, self._end)]
+        self._points = points + [_PLOT_BREAK] * (capacity - kept_count)
+        self._capacity = capacity
+        # the points got new positions
+        self._end = self._count = kept_count
+        self._generation += 1
+
+    def get_start(self) -> int:
+        """Absolute index of the oldest point in the buffer"""
+        return self._end - self._count
+
+    def get_end(self) -> int:
+        """Absolute index after the newest point"""
+        return self._end
+
+    def get_generation(self) -> int:
+        return self._generation
+
+    def get_max_series_count(self) -> int:
+        return self._max_series_count
+
+    def get_point(self, index: int) -> Tuple[Optional[Tuple[str, ...]], Tuple[float, ...]]:
+        assert self.get_start() <= index < self._end
+        return self._points[index % self._capacity]
+
+    def clear(self) -> None:
+        self._points = [_PLOT_BREAK] * self._capacity
+        self._end = 0
+        self._count = 0
+        self._max_series_count = 0
+        self._partial_line = ""
+        self._generation += 1
+
+    def copy(self) -> "PlotSeriesBuffer":
+        """Returns a snapshot, which doesn't change when this buffer gets new points"""
+        result = copy.copy(self)
+        result._points = list(self._points)
+        return result
+
+    def feed(self, text: str) -> None:
+        """Adds text printed after the text added before"""
+        lines = text.split("\n")
+        if self._partial_line is not None:
+            lines[0] = self._partial_line + lines[0]
+        elif len(lines) == 1:
+            return
+        else:
+            # end of a line, which is too long to be plotted
+            self._add_point(_PLOT_BREAK)
+            lines.pop(0)
+
+        for line in lines[:-1]:
+            self._add_line(line)
+
+        self._set_partial_line(lines[-1])
+
+    def discard_partial_line(self) -> None:
+        """Forgets the text of current line (eg. because of \\r)"""
+        self._partial_line = ""
+
+    def finish_line(self) -> None:
+        if self._partial_line:
+            self._add_line(self._partial_line)
+        self._partial_line = ""
+
+    def get_legend(self, end: int) -> Optional[List[str]]:
+        """Returns the pattern of last line, which occurs on 2 consecutive points before end"""
+        stop = max(self.get_start(), end - MAX_PLOT_LEGEND_LOOKBACK)
+        i = end - 1
+        while i > stop:
+            pattern = self.get_point(i)[0]
+            if pattern is not None and pattern == self.get_point(i - 1)[0]:
+                return list(pattern)
+            i -= 1
+
+        return None
+
+    def get_value_range(self, start: int, end: int) -> Optional[Tuple[float, float]]:
+        low = None
+        high = None
+        for i in range(start, end):
+            nums = self._points[i % self._capacity][1]
+            if nums:
+                if low is None:
+                    low = min(nums)
+                    high = max(nums)
+                else:
+                    low = min(low, *nums)
+                    high = max(high, *nums)
+
+        if low is None:
+            return None
+        return low, high
+
+    def get_decimated_runs(
+        self, series_nr: int, start: int, end: int, bucket_size: int
+    ) -> List[List[Tuple[int, float]]]:
+        """Returns the vertices of the connected lines of given series between start and end.
+
+        Vertices are pairs of bucket number (point index // bucket_size) and value. Each bucket
+        gives at most 2 vertices, the minimum and the maximum of the values in the bucket,
+        in the order of their occurrence. Lines, which connect less than 2 points, are not
+        included.
+        """
+        runs = []
+        vertices = None
+        run_point_count = 0
+        prev_pattern = None
+        bucket = None
+        low = high = 0.0
+        low_index = high_index = 0
+
+        for i in range(start, end):
+            pattern, nums = self._points[i % self._capacity]
+            if vertices is not None and (len(nums) <= series_nr or pattern != prev_pattern):
+                _add_bucket_vertices(vertices, bucket, low, low_index, high, high_index)
+                if run_point_count > 1:
+                    runs.append(vertices)
+                vertices = None
+
+            if len(nums) <= series_nr:
+                continue
+
+            value = nums[series_nr]
+            point_bucket = i // bucket_size
+            if vertices is None:
+                vertices = []
+                run_point_count = 0
+                prev_pattern = pattern
+                bucket = None
+
+            if point_bucket != bucket:
+                if bucket is not None:
+                    _add_bucket_vertices(vertices, bucket, low, low_index, high, high_index)
+                bucket = point_bucket
+                low = high = value
+                low_index = high_index = i
+            elif value < low:
+                low = value
+                low_index = i
+            elif value > high:
+                high = value
+                high_index = i
+
+            run_point_count += 1
+
+        if vertices is not None:
+            _add_bucket_vertices(vertices, bucket, low, low_index, high, high_index)
+            if run_point_count > 1:
+                runs.append(vertices)
+
+        return runs
+
+    def write_csv(self, fp) -> None:
+        """Writes the points (except breaks) to given text file.
+
+        The label column contains the pattern of the line with {} in place of numbers."""
+        writer = csv.writer(fp)
+        writer.writerow(
+            ["index", "label"] + ["value_%d" % (i + 1) for i in range(self._max_series_count)]
+        )
+        for i in range(self.get_start(), self._end):
+            pattern, nums = self.get_point(i)
+            if pattern is not None:
+                writer.writerow([i, "{}".join(pattern)] + list(nums))
+
+    def _set_partial_line(self, text: str) -> None:
+        if len(text) > MAX_PLOT_LINE_LENGTH:
+            self._partial_line = None
+        else:
+            self._partial_line = text
+
+    def _add_line(self, line: str) -> None:
+        if len(line) > MAX_PLOT_LINE_LENGTH:
+            self._add_point(_PLOT_BREAK)
+            return
+
+        pattern, numbers = extract_pattern_and_numbers(line)
+        if numbers:
+            self._add_point((tuple(pattern), tuple(numbers)))
+        else:
+            self._add_point(_PLOT_BREAK)
+
+    def _add_point(self, point) -> None:
+        if point is _PLOT_BREAK and (
+            self._count == 0 or self._points[(self._end - 1) % self._capacity] is _PLOT_BREAK
+        ):
+            # no need for repeated breaks
+            return
+
+        self._points[self._end % self._capacity] = point
+        self._end += 1
+        self._count = min(self._count + 1, self._capacity)
+        self._max_series_count = max(self._max_series_count, len(point[1]))
+
+
+def _add_bucket_vertices(
+    vertices: List[Tuple[int, float]],
+    bucket: int,
+    low: float,
+    low_index: int,
+    high: float,
+    high_index: int,
+) -> None:
+    if low_index == high_index:
+        vertices.append((bucket, low))
+    elif low_index < high_index:
+        vertices.append((bucket, low))
+        vertices.append((bucket, high))
+    else:
+        vertices.append((bucket, high))
+        vertices.append((bucket, low))
+
+
+def extract_pattern_and_numbers(line: str) -> Tuple[List[str], List[float]]:
+    parts = NUMBER_SPLIT_REGEX.split(line)
+    if len(parts) < 2:
+        return ([], [])
+
+    assert len(parts) % 2 == 1
+
+    pattern = []
+    numbers = []
+    for i in range(0, len(parts), 2):
+        pattern.append(parts[i])
+
+    for i in range(1, len(parts), 2):
+        numbers.append(float(parts[i]))
+
+    return (pattern, numbers)
+
+
+@dataclass
+class LanguageServerContextEntry:
+    lines: List[str]
+    # names bound by the statements, which are not bound by later statements
+    names: Set[str]
+    is_import: bool
+
+
+class LanguageServerContext:
+    """Statements executed in the shell, which tell the language server about the names
+    available for shell input.
+
+    Only top-level statements binding names are kept (imports, definitions, assignments and
+    compound statements containing these). A statement gets dropped when all its names get
+    bound by later statements or disappear from the globals. When the text exceeds the size
+    limit, oldest statements get dropped (imports last).
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries: List[LanguageServerContextEntry] = []
+        self._size = 0
+        self._lines: Optional[List[str]] = []
+
+    def clear(self) -> None:
+        self._entries = []
+        self._size = 0
+        self._lines = []
+
+    def get_size(self) -> int:
+        return self._size
+
+    def get_lines(self) -> List[str]:
+        if self._lines is None:
+            self._lines = [line for entry in self._entries for line in entry.lines]
+        return self._lines
+
+    def add_source(self, source: str) -> None:
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            # the source didn't execute either (or it was not Python)
+            return
+
+        source_lines = source.splitlines(keepends=True)
+        new_entries: List[LanguageServerContextEntry] = []
+        last_end_lineno = 0
+        for node in tree.body:
+            start_lineno = min(
+                [node.lineno] + [dec.lineno for dec in getattr(node, "decorator_list", [])]
+            )
+            names = _get_bound_names(node)
+            is_import = isinstance(node, (ast.Import, ast.ImportFrom))
+            if new_entries and start_lineno <= last_end_lineno:
+                # statements sharing a line belong to the same entry
+                entry = new_entries[-1]
+                entry.lines += source_lines[last_end_lineno : node.end_lineno]
+                entry.names |= names
+                entry.is_import = entry.is_import and is_import
+            else:
+                entry = LanguageServerContextEntry(
+                    source_lines[start_lineno - 1 : node.end_lineno], names, is_import
+                )
+                new_entries.append(entry)
+            last_end_lineno = max(last_end_lineno, node.end_lineno)
+
+        for entry in new_entries:
+            if not entry.names:
+                continue
+            if not entry.lines[-1].endswith("\n"):
+                entry.lines[-1] += "\n"
+            for old_entry in self._entries:
+                old_entry.names -= entry.names
+            self._entries.append(entry)
+
+        self._remove_entries(lambda entry: not entry.names)
+        self._enforce_size()
+
+    def retain_names(self, names: Collection[str]) -> None:
+        """Forgets the names not in the given collection (eg. current globals)"""
+        for entry in self._entries:
+            entry.names = {name for name in entry.names if name == "*" or name in names}
+
+        self._remove_entries(lambda entry: not entry.names)
+
+    def _remove_entries(self, predicate: Callable[[LanguageServerContextEntry], bool]) -> None:
+        kept_entries = []
+        for entry in self._entries:
+            if predicate(entry):
+                self._lines = None
+            else:
+                kept_entries.append(entry)
+
+        self._entries = kept_entries
+        self._size = sum(len(line) for entry in self._entries for line in entry.lines)
+
+    def _enforce_size(self) -> None:
+        while self._size > self._max_size:
+            entry = next(
+                (entry for entry in self._entries if not entry.is_import), self._entries[0]
+            )
+            self._entries.remove(entry)
+            self._size -= sum(len(line) for line in entry.lines)
+            self._lines = None
+
+
+def _get_bound_names(node: ast.AST) -> Set[str]:
+    """Returns the global names bound by given top-level statement"""
+    names = set()
+    nodes = [node]
+    while nodes:
+        current = nodes.pop()
+        if isinstance(current, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            # the body has its own scope
+            names.add(current.name)
+        elif isinstance(current, (ast.Import, ast.ImportFrom)):
+            for alias in current.names:
+                names.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(current, ast.Name):
+            if isinstance(current.ctx, ast.Store):
+                names.add(current.id)
+        elif not isinstance(
+            current, (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+        ):
+            nodes.extend(ast.iter_child_nodes(current))
+
+    return names
+
+
+def _get_ls_end_position(lines: List[str]) -> Position:
+    """Returns the position after given lines of a document"""
+    if not lines or lines[-1].endswith("\n"):
+        return Position(line=len(lines), character=0)
+
+    # positions are in UTF-16 code units
+    return Position(line=len(lines) - 1, character=len(lines[-1].encode("utf-16-le")) // 2)
+
+
 class ShellView(tk.PanedWindow):
     def __init__(self, master):
         self._osc_title = None
+        self._last_scroll_first = 0.0
+        self._scrollback_page_in_scheduled = False
         self.containing_notebook: Optional[CustomNotebook] = None
         super().__init__(
             master,
@@ -140,6 +1227,8 @@ class ShellView(tk.PanedWindow):
         get_workbench().set_default("shell.auto_inspect_values", True)
         get_workbench().set_default("shell.clear_for_new_process", True)
         get_workbench().set_default("shell.io_tab_width", 8)
+        get_workbench().set_default("shell.scrollback_memory_mb", 8)
+        get_workbench().set_default("shell.scrollback_disk_mb", 100)
 
         self.text = ShellText(
             main_frame,
@@ -159,8 +1248,6 @@ class ShellView(tk.PanedWindow):
         )
 
         get_workbench().event_generate("ShellTextCreated", text_widget=self.text)
-        get_workbench().bind("TextInsert", self.text_inserted, True)
-        get_workbench().bind("TextDelete", self.text_deleted, True)
         get_workbench().bind("OscEvent", self.handle_osc_event, True)
 
         self.text.grid(row=1, column=1, sticky=tk.NSEW)
@@ -191,6 +1278,8 @@ class ShellView(tk.PanedWindow):
         self.plotter = None
         get_workbench().set_default("view.show_plotter", False)
         get_workbench().set_default("view.shell_sash_position", 400)
+        get_workbench().set_default("view.plotter_history", 100000)
+        self.plot_series = PlotSeriesBuffer(get_workbench().get_option("view.plotter_history"))
 
         self.plotter_visibility_var = get_workbench().get_variable("view.show_plotter")
 
@@ -227,7 +1316,7 @@ class ShellView(tk.PanedWindow):
             get_workbench().show_view("ShellView", True)
 
         if self.plotter is None:
-            self.plotter = PlotterCanvas(self, self.text)
+            self.plotter = PlotterCanvas(self, self.plot_series)
 
         if not self.plotter.winfo_ismapped():
             self.add(self.plotter, minsize=100)
@@ -299,23 +1388,36 @@ class ShellView(tk.PanedWindow):
 
     def set_scrollbar(self, *args):
         self.vert_scrollbar.set(*args)
-        self.update_plotter()
 
-    def text_deleted(self, event):
-        if event.text_widget == self.text:
-            self.update_plotter()
+        first = float(args[0])
+        if first == 0 and self._last_scroll_first > 0 and not self._scrollback_page_in_scheduled:
+            # reached the top, show older output
+            self._scrollback_page_in_scheduled = True
+            self.text.after_idle(self._page_in_scrollback)
+        self._last_scroll_first = first
 
-    def text_inserted(self, event):
-        if (
-            event.text_widget == self.text
-            and "\n" in event.text
-            # only when scrollbar doesn't move, because otherwise
-            # the update gets triggered by scrollbar anyway
-            and self.vert_scrollbar.get() == (0.0, 1.0)
-        ):
-            self.update_plotter()
+    def _page_in_scrollback(self):
+        self._scrollback_page_in_scheduled = False
+        self.text.page_in_scrollback()
+
+    def add_plotter_output(self, events: List[IOEvent]) -> None:
+        for event in events:
+            if isinstance(event, CursorMove) and event.delta == "line":
+                self.plot_series.discard_partial_line()
+            elif isinstance(event, OutputRun):
+                self.plot_series.feed(event.text)
+
+    def finish_plotter_line(self) -> None:
+        self.plot_series.finish_line()
+
+    def clear_plotter(self) -> None:
+        self.plot_series.clear()
 
     def update_plotter(self):
+        history = get_workbench().get_option("view.plotter_history")
+        if history != self.plot_series.get_capacity():
+            self.plot_series.set_capacity(history)
+
         if self.plotter is not None and self.plotter.winfo_ismapped():
             self.plotter.update_plot()
 
@@ -337,6 +1439,7 @@ class ShellMenu(TextMenu):
     def add_extra_items(self):
         self.add_separator()
         self.add_command(label=tr("Clear"), command=self.text._clear_shell)
+        self.add_command(label=tr("Find") + "...", command=self.text._find_text)
 
         def toggle_from_menu():
             # I don't like that Tk menu toggles checbutton variable
@@ -380,23 +1483,21 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         self._last_ls_cwd: str = get_workbench().get_local_cwd()
         self._last_ls_uri: Optional[lsp_types.URI] = None
         self._last_ls_version: Optional[int] = None
-        self._context_lines_for_language_server: List[str] = []
-        self._session_num_executed_lines_sent_to_ls: int = 0
+        self._ls_context = LanguageServerContext(MAX_LS_CONTEXT_SIZE)
+        # names of __main__ globals, None if unknown
+        self._ls_global_names: Optional[Set[str]] = None
+        # current content of the document at the language server
+        self._ls_document_lines: List[str] = []
 
-        # logs of IO events for current toplevel block
+        # log of IO events for current toplevel block
         # (enables undoing and redoing the events)
-        self._applied_io_events = []
-        self._queued_io_events = []
+        self._io_events = IOEventLog()
+        self._output_tokenizers = {}
+        # lines discarded from the top
+        self._scrollback = ScrollbackStore()
+        self._last_found_text = ""
         self._images = set()
 
-        self._ansi_foreground = None
-        self._ansi_background = None
-        self._ansi_inverse = False
-        self._ansi_intensity = None
-        self._ansi_italic = False
-        self._ansi_underline = False
-        self._ansi_conceal = False
-        self._ansi_strikethrough = False
         self._io_cursor_offset = 0
         self._squeeze_buttons = set()
 
@@ -504,20 +1605,19 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         self._ensure_visible()
         self._append_to_io_queue(msg.data, msg.stream_name)
 
-        if not self._applied_io_events:
+        if not self._io_events.has_applied():
             # this is first line of io, add padding below command line
             self.tag_add("before_io", "output_insert -1 line linestart")
 
         self._update_visible_io(None)
+        if self.view is not None:
+            self.view.update_plotter()
 
     def _handle_toplevel_response(self, msg: ToplevelResponse) -> None:
         was_scrolled_to_end = self.is_scrolled_to_end()
         if "source_for_language_server" in msg:
-            self._context_lines_for_language_server += msg["source_for_language_server"].splitlines(
-                keepends=True
-            )
-            if not self._context_lines_for_language_server[-1].endswith("\n"):
-                self._context_lines_for_language_server[-1] += os.linesep
+            self._ls_context.add_source(msg["source_for_language_server"])
+        self._update_ls_global_names(msg)
 
         if msg.get("error"):
             self._ensure_visible()
@@ -537,8 +1637,11 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
 
         self.mark_set("output_end", self.index("end-1c"))
         self._discard_old_content()
+        # the program won't complete its escape sequences anymore
+        self._flush_output_tokenizers()
         self._update_visible_io(None)
-        self._reset_ansi_attributes()
+        if self.view is not None:
+            self.view.update_plotter()
         self._io_cursor_offset = 0
         self._insert_prompt()
         self._try_submit_input()  # Trying to submit leftover code (eg. second magic command)
@@ -560,19 +1663,39 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         return get_workbench().get_option("shell.squeeze_threshold")
 
     def _append_to_io_queue(self, data, stream_name):
-        # Make sure ANSI CSI codes and object links are stored as separate events
-        # TODO: try to complete previously submitted incomplete code
-        parts = re.split(OUTPUT_SPLIT_REGEX, data)
-        for part in parts:
-            if part:  # split may produce empty string in the beginning or start
-                # split the data so that very long lines separated
-                for block in re.split("(.{%d,})" % (self._get_squeeze_threshold() + 1), part):
-                    if block:
-                        self._queued_io_events.append((block, stream_name))
+        # Make sure styled text, cursor moves and object links are stored as separate events
+        tokenizer = self._output_tokenizers.get(stream_name)
+        if tokenizer is None:
+            # According to https://github.com/tartley/colorama/blob/master/demos/demo04.py
+            # codes sent to stderr shouldn't affect later output in stdout
+            # It makes sense, but Ubuntu terminal does not confirm it.
+            # For now I'm just trimming stderr color codes
+            tokenizer = self._output_tokenizers[stream_name] = OutputTokenizer(
+                styled=stream_name == "stdout"
+            )
+
+        events = tokenizer.feed(data, self._get_squeeze_threshold(), self.tty_mode)
+        for event in events:
+            self._io_events.append(event, stream_name)
+
+        if stream_name == "stdout" and self.view is not None:
+            self.view.add_plotter_output(events)
+
+    def _flush_output_tokenizers(self):
+        for stream_name, tokenizer in self._output_tokenizers.items():
+            events = tokenizer.flush()
+            for event in events:
+                self._io_events.append(event, stream_name)
+
+            if stream_name == "stdout" and self.view is not None:
+                self.view.add_plotter_output(events)
+
+        if self.view is not None:
+            self.view.finish_plotter_line()
 
     def _update_visible_io(self, target_num_visible_chars):
         was_scrolled_to_end = self.is_scrolled_to_end()
-        current_num_visible_chars = sum(map(lambda x: len(x[0]), self._applied_io_events))
+        current_num_visible_chars = self._io_events.get_applied_char_count()
 
         if (
             target_num_visible_chars is not None
@@ -580,58 +1703,64 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         ):
             # hard to undo complex renderings (squeezed texts and ANSI codes)
             # easier to clean everything and start again
-            self._queued_io_events = self._applied_io_events + self._queued_io_events
-            self._applied_io_events = []
+            self._io_events.requeue_applied()
             self.direct_delete("command_io_start", "output_end")
-            current_num_visible_chars = 0
-            self._reset_ansi_attributes()
+            current_num_visible_chars = self._io_events.get_trimmed_char_count()
+            # can't go back further than the trimmed events
+            target_num_visible_chars = max(target_num_visible_chars, current_num_visible_chars)
 
-        while self._queued_io_events and current_num_visible_chars != target_num_visible_chars:
-            data, stream_name = self._queued_io_events.pop(0)
+        while (
+            self._io_events.has_queued()
+            and current_num_visible_chars != target_num_visible_chars
+        ):
+            data, stream_name = self._io_events.pop_queued()
 
             if target_num_visible_chars is not None:
                 leftover_count = current_num_visible_chars + len(data) - target_num_visible_chars
 
                 if leftover_count > 0:
+                    if not isinstance(data, OutputRun):
+                        # control sequences can't be applied partially
+                        self._io_events.push_back_queued(data, stream_name)
+                        break
                     # add suffix to the queue
-                    self._queued_io_events.insert(0, (data[-leftover_count:], stream_name))
-                    data = data[:-leftover_count]
+                    data, suffix = data.split(len(data) - leftover_count)
+                    self._io_events.push_back_queued(suffix, stream_name)
 
             self._apply_io_event(data, stream_name)
             current_num_visible_chars += len(data)
 
         self.mark_set("output_end", self.index("end-1c"))
+
+        if (
+            not self._io_events.has_queued()
+            and self._io_events.get_rewindable_event_count() > REWINDABLE_IO_EVENTS_LIMIT
+        ):
+            # Trimming all at once keeps the cost per event constant.
+            # Going back in time can't remove the output shown so far.
+            self.mark_set("command_io_start", "output_end")
+            self._io_events.trim_applied()
         if was_scrolled_to_end:
             self.see("end")
 
-    def _apply_io_event(self, data, stream_name):
-        if not data:
+    def _apply_io_event(self, event: IOEvent, stream_name):
+        if not len(event):
             return
 
-        original_data = data
-
-        if self.tty_mode and re.match(TERMINAL_CONTROL_REGEX, data):
-            if data == "\a":
-                get_workbench().bell()
-            elif data == "\b":
-                self._change_io_cursor_offset(-1)
-            elif data == "\r":
-                self._change_io_cursor_offset("line")
-            elif data.startswith("\x1b]"):
-                self._handle_osc_sequence(data)
-            elif data.endswith("D") or data.endswith("C"):
-                self._change_io_cursor_offset_csi(data)
-            elif stream_name == "stdout":
-                # According to https://github.com/tartley/colorama/blob/master/demos/demo04.py
-                # codes sent to stderr shouldn't affect later output in stdout
-                # It makes sense, but Ubuntu terminal does not confirm it.
-                # For now I'm just trimming stderr color codes
-                self._update_ansi_attributes(data)
-            else:
-                logger.warning("Don't know what to do with %r" % data)
+        if isinstance(event, CursorMove):
+            self._change_io_cursor_offset(event.delta)
+
+        elif isinstance(event, OutputRun):
+            self._apply_output_run(event, stream_name)
+
+        elif event == "\a":
+            get_workbench().bell()
+
+        elif event.startswith("\x1b]"):
+            self._handle_osc_sequence(event)
 
-        elif re.match(OBJECT_INFO_START_REGEX, data):
-            id_str = data[data.index("=") + 1 : data.index("]")]
+        elif re.match(OBJECT_INFO_START_REGEX, event):
+            id_str = event[event.index("=") + 1 : event.index("]")]
             self.active_extra_tags.append("value")
             self.active_extra_tags.append(id_str)
             if get_workbench().get_option("shell.auto_inspect_values"):
@@ -642,7 +1771,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                     memory.format_object_id(int(id_str)), tuple(self.active_extra_tags)
                 )
 
-        elif re.match(OBJECT_INFO_END_REGEX, data):
+        elif re.match(OBJECT_INFO_END_REGEX, event):
             try:
                 self.active_extra_tags.pop()
                 self.active_extra_tags.pop()
@@ -651,115 +1780,97 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                 # because of an error.
                 logger.exception("Could not close object info", exc_info=e)
 
-        elif "value" in self.active_extra_tags and get_workbench().in_heap_mode():
-            # id was already printed and value should be suppressed
-            pass
         else:
-            if "value" in self.active_extra_tags:
-                tags = set(self.active_extra_tags)
-            else:
-                tags = set(self.active_extra_tags) | {"io", stream_name}
+            logger.warning("Don't know what to do with %r" % event)
 
-            if stream_name == "stdout" and self.tty_mode:
-                tags |= self._get_ansi_tags()
+        self._io_events.add_applied(event, stream_name)
 
-            non_url_length = len(data)
-            for url_match in SIMPLE_URL_SPLIT_REGEX.finditer(data):
-                non_url_length -= url_match.end() - url_match.start()
+    def _apply_output_run(self, run: OutputRun, stream_name):
+        data = run.text
+        if not data:
+            # only consumed control sequences
+            return
 
-            if (
-                non_url_length > self._get_squeeze_threshold()
-                and "\n" not in data
-                and not (data.startswith(OBJECT_LINK_START))
-            ):
-                self._io_cursor_offset = 0  # ignore the effect of preceding \r and \b
-                actual_text = data
-                button_text = actual_text[:70] + " …"
-                btn = tk.Label(
-                    self,
-                    text=button_text,
-                    # width=len(button_text),
-                    cursor="arrow",
-                    borderwidth=2,
-                    relief="raised",
-                    font="IOFont",
-                )
-                btn.bind("<1>", lambda e: self._show_squeezed_text(btn), True)
-                btn.contained_text = actual_text
-                btn.tags = tags
-                self._squeeze_buttons.add(btn)
-                create_tooltip(btn, "%d characters squeezed. " % len(data) + "Click for details.")
-
-                # TODO: refactor
-                # (currently copied from insert_text_directly)
-                self.mark_gravity("input_start", tk.RIGHT)
-                self.mark_gravity("output_insert", tk.RIGHT)
-
-                self.window_create("output_insert", window=btn)
-                for tag_name in tags:
-                    self.tag_add(tag_name, "output_insert -1 chars")
-                data = ""
-
-            elif self._io_cursor_offset < 0:
-                overwrite_len = min(len(data), -self._io_cursor_offset)
-
-                if 0 <= data.find("\n") < overwrite_len:
-                    overwrite_len = data.find("\n")
-
-                overwrite_data = data[:overwrite_len]
-                self.direct_insert(
-                    "output_insert -%d chars" % -self._io_cursor_offset, overwrite_data, tuple(tags)
-                )
-                del_start = self.index("output_insert -%d chars" % -self._io_cursor_offset)
-                del_end = self.index(
-                    "output_insert -%d chars" % (-self._io_cursor_offset - overwrite_len)
-                )
-                self.direct_delete(del_start, del_end)
+        if "value" in self.active_extra_tags and get_workbench().in_heap_mode():
+            # id was already printed and value should be suppressed
+            return
 
-                # compute leftover data to be printed normally
-                data = data[overwrite_len:]
+        if "value" in self.active_extra_tags:
+            tags = set(self.active_extra_tags)
+        else:
+            tags = set(self.active_extra_tags) | {"io", stream_name}
+
+        tags.update(run.tags)
+
+        if run.squeeze:
+            self._io_cursor_offset = 0  # ignore the effect of preceding \r and \b
+            actual_text = data
+            button_text = actual_text[:70] + " …"
+            btn = tk.Label(
+                self,
+                text=button_text,
+                # width=len(button_text),
+                cursor="arrow",
+                borderwidth=2,
+                relief="raised",
+                font="IOFont",
+            )
+            btn.bind("<1>", lambda e: self._show_squeezed_text(btn), True)
+            btn.contained_text = actual_text
+            btn.tags = tags
+            self._squeeze_buttons.add(btn)
+            create_tooltip(btn, "%d characters squeezed. " % len(data) + "Click for details.")
+
+            # TODO: refactor
+            # (currently copied from insert_text_directly)
+            self.mark_gravity("input_start", tk.RIGHT)
+            self.mark_gravity("output_insert", tk.RIGHT)
+
+            self.window_create("output_insert", window=btn)
+            for tag_name in tags:
+                self.tag_add(tag_name, "output_insert -1 chars")
+            data = ""
+
+        elif self._io_cursor_offset < 0:
+            overwrite_len = min(len(data), -self._io_cursor_offset)
+
+            if 0 <= data.find("\n") < overwrite_len:
+                overwrite_len = data.find("\n")
+
+            overwrite_data = data[:overwrite_len]
+            self.direct_insert(
+                "output_insert -%d chars" % -self._io_cursor_offset, overwrite_data, tuple(tags)
+            )
+            del_start = self.index("output_insert -%d chars" % -self._io_cursor_offset)
+            del_end = self.index(
+                "output_insert -%d chars" % (-self._io_cursor_offset - overwrite_len)
+            )
+            self.direct_delete(del_start, del_end)
 
-                if "\n" in data:
-                    # cursor offset doesn't apply on new line
-                    self._io_cursor_offset = 0
-                else:
-                    # offset becomes closer to 0
-                    self._io_cursor_offset += overwrite_len
+            # compute leftover data to be printed normally
+            data = data[overwrite_len:]
 
-            elif self._io_cursor_offset > 0:
-                # insert spaces before actual data
-                # NB! Print without formatting tags
-                self._insert_text_directly(" " * self._io_cursor_offset, ("io", stream_name))
+            if "\n" in data:
+                # cursor offset doesn't apply on new line
                 self._io_cursor_offset = 0
+            else:
+                # offset becomes closer to 0
+                self._io_cursor_offset += overwrite_len
 
-            if data:
-                # if any data is still left, then this should be output normally
-                self._insert_text_directly(data, tuple(tags))
+        elif self._io_cursor_offset > 0:
+            # insert spaces before actual data
+            # NB! Print without formatting tags
+            self._insert_text_directly(" " * self._io_cursor_offset, ("io", stream_name))
+            self._io_cursor_offset = 0
 
-        self._applied_io_events.append((original_data, stream_name))
+        if data:
+            # if any data is still left, then this should be output normally
+            self._insert_text_directly(data, tuple(tags))
 
     def _show_squeezed_text(self, button):
         dlg = SqueezedTextDialog(self, button)
         show_dialog(dlg)
 
-    def _change_io_cursor_offset_csi(self, marker):
-        ints = re.findall(INT_REGEX, marker)
-        if len(ints) != 1:
-            logger.warning("bad CSI cursor positioning: %s", marker)
-            # do nothing
-            return
-
-        try:
-            delta = int(ints[0])
-        except ValueError:
-            logger.warning("bad CSI cursor positioning: %s", marker)
-            return
-
-        if marker.endswith("D"):
-            delta = -delta
-
-        self._change_io_cursor_offset(delta)
-
     def _change_io_cursor_offset(self, delta):
         line = self.get("output_insert linestart", "output_insert")
         if delta == "line":
@@ -770,16 +1881,6 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                 # cap
                 self._io_cursor_offset = -len(line)
 
-    def _reset_ansi_attributes(self):
-        self._ansi_foreground = None
-        self._ansi_background = None
-        self._ansi_inverse = False
-        self._ansi_intensity = None
-        self._ansi_italic = False
-        self._ansi_underline = False
-        self._ansi_conceal = False
-        self._ansi_strikethrough = False
-
     def _handle_osc_sequence(self, data: str) -> None:
         assert data.startswith("\x1b]") and (data.endswith("\a") or data.endswith("\x1b\\"))
         if data.endswith("\a"):
@@ -793,155 +1894,6 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         else:
             logger.warning("Unsupported OSC sequence %r", data)
 
-    def _update_ansi_attributes(self, marker):
-        if not marker.endswith("m"):
-            # ignore
-            return
-
-        codes = re.findall(INT_REGEX, marker)
-        if not codes:
-            self._reset_ansi_attributes()
-
-        while codes:
-            code = codes.pop(0)
-
-            if code == "0":
-                self._reset_ansi_attributes()
-            elif code in ["1", "2"]:
-                self._ansi_intensity = code
-            elif code == "3":
-                self._ansi_italic = True
-            elif code == "4":
-                self._ansi_underline = True
-            elif code == "7":
-                self._ansi_inverse = True
-            elif code == "8":
-                self._ansi_conceal = True
-            elif code == "9":
-                self._ansi_strikethrough = True
-            elif code == "22":
-                self._ansi_intensity = None
-            elif code == "23":
-                self._ansi_italic = False
-            elif code == "24":
-                self._ansi_underline = False
-            elif code == "27":
-                self._ansi_inverse = False
-            elif code == "28":
-                self._ansi_conceal = False
-            elif code == "29":
-                self._ansi_strikethrough = False
-            if code in [
-                "30",
-                "31",
-                "32",
-                "33",
-                "34",
-                "35",
-                "36",
-                "37",
-                "90",
-                "91",
-                "92",
-                "93",
-                "94",
-                "95",
-                "96",
-                "97",
-            ]:
-                self._ansi_foreground = code
-            elif code == "39":
-                self._ansi_foreground = None
-            elif code in [
-                "40",
-                "41",
-                "42",
-                "43",
-                "44",
-                "45",
-                "46",
-                "47",
-                "100",
-                "101",
-                "102",
-                "103",
-                "104",
-                "105",
-                "106",
-                "107",
-            ]:
-                self._ansi_background = code
-            elif code == "49":
-                self._ansi_background = None
-            elif code in ["38", "48"]:
-                # multipart code, ignore for now,
-                # but make sure all arguments are ignored
-                if not codes:
-                    # nothing follows, ie. invalid code
-                    break
-                mode = codes.pop(0)
-                if mode == "5":
-                    # 256-color code, just ignore for now
-                    if not codes:
-                        break
-                    codes = codes[1:]
-                elif mode == "2":
-                    # 24-bit code, ignore
-                    if len(codes) < 3:
-                        # invalid code
-                        break
-                    codes = codes[3:]
-            else:
-                # ignore other codes
-                pass
-
-    def _get_ansi_tags(self):
-        result = set()
-
-        if self._ansi_foreground:
-            fg = ANSI_COLOR_NAMES[self._ansi_foreground[-1]]
-            if self._ansi_intensity == "1" or self._ansi_foreground[0] == "9":
-                fg = "bright_" + fg
-            elif self._ansi_intensity == "2":
-                fg = "dim_" + fg
-        else:
-            fg = "fore"
-            if self._ansi_intensity == "1":
-                fg = "bright_" + fg
-            elif self._ansi_intensity == "2":
-                fg = "dim_" + fg
-
-        if self._ansi_background:
-            bg = ANSI_COLOR_NAMES[self._ansi_background[-1]]
-            if self._ansi_background.startswith("10"):
-                bg = "bright_" + bg
-        else:
-            bg = "back"
-
-        if self._ansi_inverse:
-            result.add(fg + "_bg")
-            result.add(bg + "_fg")
-        else:
-            if fg != "fore":
-                result.add(fg + "_fg")
-            if bg != "back":
-                result.add(bg + "_bg")
-
-        if self._ansi_intensity == "1" and self._ansi_italic:
-            result.add("intense_italic_io")
-        elif self._ansi_intensity == "1":
-            result.add("intense_io")
-        elif self._ansi_italic:
-            result.add("italic_io")
-
-        if self._ansi_underline:
-            result.add("underline")
-
-        if self._ansi_strikethrough:
-            result.add("strikethrough")
-
-        return result
-
     def _insert_prompt(self):
         # if previous output didn't put a newline, then do it now
         if not self.index("output_insert").endswith(".0"):
@@ -991,6 +1943,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
             and not was_running
         ):
             self._clear_content("end")
+            self._scrollback.clear()
         else:
             if (
                 "restart_line" in self.tag_names("output_insert -2 chars")
@@ -1010,8 +1963,9 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
 
         self._last_ls_uri = None
         self._last_ls_version = None
-        self._context_lines_for_language_server = []
-        self._session_num_executed_lines_sent_to_ls = 0
+        self._ls_context.clear()
+        self._ls_global_names = None
+        self._ls_document_lines = []
 
     def intercept_insert(self, index, chars, tags=None, **kw):
         if tags is None:
@@ -1032,7 +1986,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
             EnhancedTextWithLogging.intercept_insert(self, index, chars, tags)
 
             if not get_runner().is_waiting_toplevel_command():
-                if not self._applied_io_events:
+                if not self._io_events.has_applied():
                     # tag preceding command line differently
                     self.tag_add("before_io", "input_start -1 lines linestart")
 
@@ -1374,8 +2328,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                 self.mark_set("command_io_start", "output_insert")
                 self.mark_gravity("command_io_start", "left")
                 # discard old io events
-                self._applied_io_events = []
-                self._queued_io_events = []
+                self._io_events.clear()
             except Exception:
                 get_workbench().report_exception()
                 self._insert_prompt()
@@ -1386,7 +2339,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
             assert get_runner().is_running()
             get_runner().send_program_input(text_to_be_submitted)
             get_workbench().event_generate("ShellInput", input_text=text_to_be_submitted)
-            self._applied_io_events.append((text_to_be_submitted, "stdin"))
+            self._io_events.add_applied(OutputRun(text_to_be_submitted), "stdin")
 
     def _arrow_up(self, event):
         if not get_runner().is_waiting_toplevel_command():
@@ -1476,6 +2429,10 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
     def _clear_shell(self):
         end_index = self.index("output_end")
         self._clear_content(end_index)
+        self._scrollback.clear()
+        if self.view is not None:
+            self.view.clear_plotter()
+            self.view.update_plotter()
 
     def _on_backend_terminated(self, event=None):
         logger.info("BaseShellText._on_backend_terminated")
@@ -1580,7 +2537,72 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         if not next_prompt:
             pass  # TODO: disable stepping back
 
+        top_line = None
+        if self.winfo_ismapped() and not self.is_scrolled_to_end():
+            # Don't take away the lines the user is reading. Otherwise the view would jump
+            # to the top and page the same text in again.
+            top_index = self.index("@0,0 linestart")
+            if self.compare(top_index, "<", proposed_cut):
+                proposed_cut = top_index
+                if proposed_cut == "1.0":
+                    return
+            top_line = index2line(top_index)
+
+        self._scrollback.set_budgets(
+            get_workbench().get_option("shell.scrollback_memory_mb") * 1024 * 1024,
+            get_workbench().get_option("shell.scrollback_disk_mb") * 1024 * 1024,
+        )
+        self._scrollback.push(self.get("1.0", proposed_cut))
         self._clear_content(proposed_cut)
+        if top_line is not None:
+            # keep showing the same lines
+            self.yview("%d.0" % (top_line - index2line(proposed_cut) + 1))
+
+    def page_in_scrollback(self) -> int:
+        """Moves the newest chunk of scrollback back to the top of the text.
+        Returns the number of added lines."""
+        text = self._scrollback.pop()
+        if text is None:
+            return 0
+
+        top_line = index2line(self.index("@0,0"))
+        # discarded text was stored without formatting
+        self.direct_insert("1.0", text, ("io", "stdout"))
+        line_count = text.count("\n")
+        # keep showing the same lines
+        self.yview("%d.0" % (top_line + line_count))
+        return line_count
+
+    def _find_text(self):
+        """Searches upwards from the selection (or end), continuing in the scrollback"""
+        text = ask_string(
+            tr("Find"), tr("Text to find:"), initial_value=self._last_found_text, master=self
+        )
+        if not text:
+            return
+        self._last_found_text = text
+
+        start = self.index("sel.first") if self.tag_ranges("sel") else "end"
+        while True:
+            index = self.search(text, start, "1.0", backwards=True, nocase=True)
+            if index:
+                self.tag_remove("sel", "1.0", "end")
+                self.tag_add("sel", index, "%s + %d chars" % (index, len(text)))
+                self.see(index)
+                return
+
+            chunk_count = self._scrollback.find(text, nocase=True)
+            if chunk_count is None:
+                messagebox.showinfo(
+                    tr("Find"), tr("The specified text was not found!"), master=self
+                )
+                return
+
+            # search in the newly added lines
+            line_count = 0
+            for _ in range(chunk_count):
+                line_count += self.page_in_scrollback()
+            start = "%d.0" % (line_count + 1)
 
     def _clear_content(self, cut_idx):
         proposed_cut_float = float(self.index(cut_idx))
@@ -1731,13 +2753,16 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
             self._context_lines_for_language_server_are_sent_to_ls = False
             return
 
+        new_lines = self._ls_context.get_lines() + self.get_pending_input().splitlines(
+            keepends=True
+        )
+
         ls_uri = self.get_ls_uri()
         if ls_uri != self._last_ls_uri:
             if self._last_ls_uri is not None:
                 ls_proxy.notify_did_close_text_document(
                     DidCloseTextDocumentParams(TextDocumentIdentifier(uri=self._last_ls_uri))
                 )
-                self._session_num_executed_lines_sent_to_ls = 0
 
             version = 1
             ls_proxy.notify_did_open_text_document(
@@ -1745,40 +2770,45 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                     textDocument=TextDocumentItem(
                         version=version,
                         uri=ls_uri,
-                        text="".join(self._context_lines_for_language_server),
+                        text="".join(new_lines),
                         languageId="python",
                     )
                 )
             )
             self._last_ls_version = version
             self._last_ls_uri = ls_uri
-            self._session_num_executed_lines_sent_to_ls = len(
-                self._context_lines_for_language_server
-            )
+            self._ls_document_lines = new_lines
+        else:
+            self._send_ls_document_change(ls_proxy, new_lines)
+
+    def _send_ls_document_change(self, ls_proxy: LanguageServerProxy, new_lines: List[str]) -> None:
+        """Replaces the changed lines of the document at the language server"""
+        old_lines = self._ls_document_lines
+        max_common_count = min(len(old_lines), len(new_lines))
 
-        if self._session_num_executed_lines_sent_to_ls < len(
-            self._context_lines_for_language_server
+        prefix_count = 0
+        while (
+            prefix_count < max_common_count
+            and old_lines[prefix_count] == new_lines[prefix_count]
         ):
-            self._replace_suffix_at_ls(
-                ls_proxy,
-                self._session_num_executed_lines_sent_to_ls,
-                "".join(
-                    self._context_lines_for_language_server[
-                        self._session_num_executed_lines_sent_to_ls :
-                    ]
-                ),
-            )
-            self._session_num_executed_lines_sent_to_ls = len(
-                self._context_lines_for_language_server
-            )
+            prefix_count += 1
 
-        self._replace_suffix_at_ls(
-            ls_proxy, self._session_num_executed_lines_sent_to_ls, self.get_pending_input()
-        )
+        if prefix_count == len(old_lines) == len(new_lines):
+            return
+
+        suffix_count = 0
+        while (
+            suffix_count < max_common_count - prefix_count
+            and old_lines[-suffix_count - 1] == new_lines[-suffix_count - 1]
+        ):
+            suffix_count += 1
+
+        old_end = len(old_lines) - suffix_count
+        if suffix_count > 0:
+            end_position = Position(line=old_end, character=0)
+        else:
+            end_position = _get_ls_end_position(old_lines)
 
-    def _replace_suffix_at_ls(
-        self, ls_proxy: LanguageServerProxy, unchanged_line_count: int, suffix_text: str
-    ) -> None:
         version = self._last_ls_version + 1
         ls_proxy.notify_did_change_text_document(
             DidChangeTextDocumentParams(
@@ -1788,18 +2818,28 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                 contentChanges=[
                     RangedTextDocumentContentChangeEvent(
                         range=Range(
-                            start=Position(line=unchanged_line_count, character=0),
-                            end=Position(
-                                line=unchanged_line_count + len(suffix_text.splitlines()),
-                                character=0,
-                            ),
+                            start=Position(line=prefix_count, character=0), end=end_position
                         ),
-                        text=suffix_text,
+                        text="".join(new_lines[prefix_count : len(new_lines) - suffix_count]),
                     )
                 ],
             )
         )
         self._last_ls_version = version
+        self._ls_document_lines = new_lines
+
+    def _update_ls_global_names(self, msg: ToplevelResponse) -> None:
+        if "globals" in msg:
+            self._ls_global_names = set(msg["globals"])
+        elif "globals_delta" in msg and self._ls_global_names is not None:
+            for name, value_info in msg["globals_delta"].items():
+                if value_info is None:
+                    self._ls_global_names.discard(name)
+                else:
+                    self._ls_global_names.add(name)
+
+        if self._ls_global_names is not None:
+            self._ls_context.retain_names(self._ls_global_names)
 
     def get_current_line_ls_offset(self) -> int:
         """
@@ -1808,7 +2848,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         """
         input_start_line = int(float(self.index("input_start")))
         num_preceding_lines_in_shell = input_start_line - 1
-        num_preceding_lines_in_ls = len(self._context_lines_for_language_server)
+        num_preceding_lines_in_ls = len(self._ls_context.get_lines())
         return num_preceding_lines_in_ls - num_preceding_lines_in_shell
 
     def get_current_column_ls_offset(self) -> int:
@@ -1945,7 +2985,16 @@ class SqueezedTextDialog(CommonDialog):
 
 
 class PlotterCanvas(tk.Canvas):
-    def __init__(self, master, text):
+    """Draws the series of a PlotSeriesBuffer.
+
+    The x-axis covers a span of points (at least get_num_steps), which starts at a multiple
+    of the bucket size. When there are more points than pixels, each bucket of points is
+    drawn as its minimum and maximum. Updates draw only the points added since the last
+    update. Everything gets redrawn when the new points don't fit into the span or the
+    value range anymore.
+    """
+
+    def __init__(self, master, series: PlotSeriesBuffer):
         self.master = master
         self.background = get_syntax_options_for_tag("TEXT")["background"]
         self.foreground = get_syntax_options_for_tag("TEXT")["foreground"]
@@ -1957,10 +3006,10 @@ class PlotterCanvas(tk.Canvas):
             width=10000,
             highlightthickness=0,
         )
-        self.text = text
+        self.series = series
 
         self.x_scale = None
-        self.x_scale = None
+        self.y_scale = None
         self.range_start = -1
         self.range_end = 2
         self.range_block_size = 0
@@ -1971,7 +3020,17 @@ class PlotterCanvas(tk.Canvas):
         self.y_padding = self.linespace
         self.x_padding_left = -1  # makes sharper cut for partly hidden line
         self.x_padding_right = self.linespace
-        self.fresh_range = True
+
+        # the span of points on the x-axis
+        self.view_start = 0
+        self.view_capacity = 0
+        self.bucket_size = 1
+        # points before this are drawn with complete buckets
+        self.committed_end = 0
+        self.series_generation = None
+        # the points shown while paused. The ring buffer keeps overwriting the old points.
+        self.paused_series: Optional[PlotSeriesBuffer] = None
+        self.paused_var = tk.BooleanVar(self, False)
 
         self.colors = [
             "#1f77b4",
@@ -2004,6 +3063,21 @@ class PlotterCanvas(tk.Canvas):
         ]
         self.bind("<Configure>", self.on_resize, True)
         self.bind("<Button-1>", self.reset_range, True)
+        self.bind("<3>", self.on_secondary_click, True)
+        if running_on_mac_os():
+            self.bind("<2>", self.on_secondary_click, True)
+            self.bind("<Control-1>", self.on_secondary_click, True)
+
+        self.menu = MenuEx(self)
+        self.menu.add_checkbutton(
+            label=tr("Pause"), command=self.toggle_pause, variable=self.paused_var
+        )
+        self.menu.add_command(
+            label=tr("Export as CSV") + "...",
+            command=self.export_csv,
+            tester=lambda: self.series.get_end() > self.series.get_start(),
+        )
+        self.menu.add_command(label=tr("Clear"), command=self.clear)
 
         self.create_close_button()
 
@@ -2048,44 +3122,69 @@ class PlotterCanvas(tk.Canvas):
         assert isinstance(self.master, ShellView)
         self.master.toggle_plotter()
 
+    def on_secondary_click(self, event):
+        self.menu.tk_popup(event.x_root, event.y_root)
+
     def reset_range(self, event=None):
-        self.fresh_range = True
+        self.update_plot(True)
+
+    def toggle_pause(self):
+        # the menu has already toggled the variable
+        if self.paused_var.get():
+            self.paused_series = self.series.copy()
+        else:
+            self.paused_series = None
+        self.update_plot(True)
+
+    def export_csv(self):
+        path = asksaveasfilename(
+            filetypes=[(tr("CSV files"), ".csv"), (tr("all files"), ".*")],
+            defaultextension=".csv",
+            initialdir=get_workbench().get_local_cwd(),
+            parent=get_workbench(),
+        )
+        if not path:
+            return
+
+        try:
+            with open(path, "w", encoding="utf-8", newline="") as fp:
+                self.series.write_csv(fp)
+        except OSError as e:
+            messagebox.showerror(tr("Error"), str(e), master=get_workbench())
+
+    def clear(self):
+        self.series.clear()
+        if self.paused_series is not None:
+            self.paused_series.clear()
+        self.update_plot(True)
 
     def get_num_steps(self):
         return 30
 
-    def update_plot(self, force_clean=False):
-        data_lines = []
-        bottom_index = self.text.index(
-            "@%d,%d" % (self.text.winfo_width(), self.text.winfo_height())
-        )
-        bottom_lineno = int(float(bottom_index))
+    def get_drawn_series(self) -> PlotSeriesBuffer:
+        if self.paused_series is not None:
+            return self.paused_series
+        return self.series
 
-        for i in range(bottom_lineno - self.get_num_steps(), bottom_lineno + 1):
-            line_start_index = "%d.0" % i
-            if i < 1 or "stdout" not in self.text.tag_names(line_start_index):
-                data_lines.append(([], []))
-            else:
-                content = self.text.get(line_start_index, line_start_index + " lineend")
-                data_lines.append(self.extract_pattern_and_numbers(content))
-
-        # data_lines need to be transposed
-        segments_by_color = []
-        for i in range(100):
-            segments = list(self.extract_series_segments(data_lines, i))
-            if segments:
-                segments_by_color.append(segments)
-            else:
-                break
+    def update_plot(self, force_clean=False):
+        if self.paused_series is not None and not force_clean:
+            return
 
-        self.delete("segment")
+        series = self.get_drawn_series()
+        end = series.get_end()
+        if (
+            force_clean
+            or self.x_scale is None
+            or self.series_generation != series.get_generation()
+            or end > self.view_start + self.view_capacity
+            or not self.draw_new_points(end)
+        ):
+            self.redraw_all(end)
 
-        self.update_range(segments_by_color, force_clean)
-        segment_count = self.draw_segments(segments_by_color)
-        self.update_legend(data_lines, force_clean)
+        self.update_legend(series.get_legend(end), force_clean)
 
         self.delete("info")
-        if segment_count == 0:
+        if not self.find_withtag("segment"):
             info_text = (
                 tr("Plotter visualizes series of\n" + "numbers printed to the Shell.")
                 + "\n\n"
@@ -2100,37 +3199,103 @@ class PlotterCanvas(tk.Canvas):
                 justify="center",
                 tags=("info",),
             )
-            # self.delete("guide", "tick", "legend")
-            # self.range_start = 0
-            # self.range_end = 0
             self.tag_raise("info")
 
-        self.fresh_range = False
+        self.delete("paused")
+        if self.paused_series is not None:
+            self.create_text_with_background(
+                self.winfo_width() / 2,
+                self.linespace,
+                " " + tr("Paused") + " ",
+                anchor="center",
+                tags=("paused",),
+            )
+
+    def redraw_all(self, end):
+        series = self.get_drawn_series()
+        start = series.get_start()
+        max_capacity = series.get_capacity() + series.get_capacity() // 4
+        capacity = self.get_num_steps()
+        while capacity < end - start and capacity < max_capacity:
+            capacity *= 2
+        capacity = min(capacity, max_capacity)
 
-    def update_legend(self, data_lines, force_clean=False):
-        legend = None
-        i = len(data_lines) - 2  # one before last
-        while i >= 0:
-            legend = data_lines[i][0]
-            if legend and legend == data_lines[i + 1][0]:
-                # found last legend, which covers at least 2 consecutive points
-                break
-            i -= 1
+        available_width = self.winfo_width() - self.x_padding_left - self.x_padding_right
+        self.bucket_size = max(1, math.ceil(capacity / max(available_width, 1)))
+        self.view_start = start - start % self.bucket_size
+        self.view_capacity = max(capacity, end - self.view_start)
+        self.committed_end = self.view_start
+        self.series_generation = series.get_generation()
+        self.x_scale = available_width / max(
+            math.ceil(self.view_capacity / self.bucket_size) - 1, 1
+        )
+
+        self.delete("segment")
+        value_range = series.get_value_range(start, end)
+        if value_range is not None:
+            self.update_range(*value_range)
+        self.draw_new_points(end)
+
+    def draw_new_points(self, end):
+        """Returns False if the new points don't fit into current value range"""
+        series = self.get_drawn_series()
+        start = max(series.get_start(), self.committed_end - self.bucket_size)
+        value_range = series.get_value_range(start, end)
+        if value_range is not None and (
+            self.y_scale is None
+            or value_range[0] < self.range_start
+            or value_range[1] > self.range_end
+        ):
+            return False
+
+        complete_end = end - (end - self.view_start) % self.bucket_size
+        if complete_end > self.committed_end:
+            self.draw_points(start, complete_end, ("segment",))
+            self.committed_end = complete_end
+
+        # the points of incomplete bucket get redrawn when the bucket grows
+        self.delete("tail")
+        if end > complete_end:
+            tail_start = max(series.get_start(), complete_end - self.bucket_size)
+            self.draw_points(tail_start, end, ("segment", "tail"))
+
+        # raise certain elements above segments
+        self.tag_raise("tick")
+        self.tag_raise("close")
+        self.tag_raise("legend")
+        return True
+
+    def draw_points(self, start, end, tags):
+        first_bucket = self.view_start // self.bucket_size
+        series = self.get_drawn_series()
+        for series_nr in range(series.get_max_series_count()):
+            for vertices in series.get_decimated_runs(
+                series_nr, start, end, self.bucket_size
+            ):
+                args = []
+                for bucket, num in vertices:
+                    args.append(self.x_padding_left + (bucket - first_bucket) * self.x_scale)
+                    args.append(self.y_padding + (self.range_end - num) * self.y_scale)
+
+                self.create_line(
+                    *args,
+                    width=2,
+                    fill=self.colors[series_nr % len(self.colors)],
+                    tags=tags,
+                )
 
+    def update_legend(self, legend, force_clean=False):
         if self.last_legend == legend and not force_clean:
             # just make sure it remains topmost
             self.tag_raise("legend")
             return
 
         self.delete("legend")
+        self.last_legend = legend
 
         if legend is None:
             return
 
-        # add horizontal padding
-        # legend[0] = " " + legend[0]
-        # legend[-1] = legend[-1] + " "
-
         marker = "●"  # "●" "•"
         marker_width = self.font.measure(marker)
         full_text_width = self.font.measure(marker.join(legend))
@@ -2163,82 +3328,10 @@ class PlotterCanvas(tk.Canvas):
             self.create_text(x, y, text=part, anchor="sw", tags=("legend",), fill=self.foreground)
             x += self.font.measure(part)
 
-        self.last_legend = legend
-
-    def draw_segments(self, segments_by_color):
-        count = 0
-        for color, segments in enumerate(segments_by_color):
-            for pos, nums in segments:
-                self.draw_segment(color, pos, nums)
-                count += 1
-
-        # raise certain elements above segments
-        self.tag_raise("tick")
-        self.tag_raise("close")
-        return count
-
-    def draw_segment(self, color, pos, nums):
-        x = self.x_padding_left + pos * self.x_scale
-
-        args = []
-        for num in nums:
-            y = self.y_padding + (self.range_end - num) * self.y_scale
-            args.extend([x, y])
-            x += self.x_scale
-
-        self.create_line(
-            *args,
-            width=2,
-            fill=self.colors[color % len(self.colors)],
-            tags=("segment",),
-            # arrow may be confusing
-            # and doesn't play nice with distinguishing between
-            # scrollback view and fresh_range view
-            # arrow="last",
-            # arrowshape=(3,5,3)
-        )
-        # self.current_segment_ids.append(line_id)
-
-    def update_range(self, segments_by_color, clean):
-        if not segments_by_color:
-            return
-
-        range_start = 2**15
-        range_end = -(2**15)
-
-        # if new block is using 3/4 of the width,
-        # then don't consider old block's values anymore
-        interest_position = 0
-        for start_pos, nums in reversed(segments_by_color[0]):
-            if start_pos < self.get_num_steps() / 10:
-                interest_position = start_pos
-                break
-
-        assert isinstance(interest_position, int)
-        for segments in segments_by_color:
-            for start_pos, nums in segments:
-                if start_pos >= interest_position:
-                    range_start = min(range_start, *nums)
-                    range_end = max(range_end, *nums)
-
-        if interest_position == 0 and not self.fresh_range:
-            # meaning we still care about old line's values
-            range_start = min(range_start, self.range_start)
-            range_end = max(range_end, self.range_end)
-
+    def update_range(self, range_start, range_end):
         if range_end == range_start:
             range_end += 1
 
-        if (
-            not clean
-            and not self.fresh_range
-            and self.x_scale is not None
-            and range_end == self.range_end
-            and range_start == self.range_start
-        ):
-            # don't recompute as nothing was changed
-            return
-
         value_range = range_end - range_start
         range_block_size = value_range // 4
         # prefer round blocks
@@ -2254,10 +3347,6 @@ class PlotterCanvas(tk.Canvas):
         if range_start % range_block_size != 0:
             range_start -= range_start % range_block_size
 
-        # not sure about these assertions when using floats
-        # assert range_start % range_block_size == 0
-        # assert range_end % range_block_size == 0, "range_end: %s, bs: %s" % (range_end, range_block_size)
-
         # remember
         self.range_start = range_start
         self.range_end = range_end
@@ -2265,10 +3354,6 @@ class PlotterCanvas(tk.Canvas):
         self.range_block_size = range_block_size
 
         available_height = self.winfo_height() - 2 * self.y_padding
-        available_width = self.winfo_width() - self.x_padding_left - self.x_padding_right
-        num_steps = self.get_num_steps()
-
-        self.x_scale = available_width / (num_steps - 1)
         self.y_scale = available_height / self.value_range
 
         self.update_guides_and_ticks()
@@ -2294,43 +3379,6 @@ class PlotterCanvas(tk.Canvas):
             )
             value += self.range_block_size
 
-    def extract_pattern_and_numbers(self, line):
-        parts = NUMBER_SPLIT_REGEX.split(line)
-        if len(parts) < 2:
-            return ([], [])
-
-        assert len(parts) % 2 == 1
-
-        pattern = []
-        numbers = []
-        for i in range(0, len(parts), 2):
-            pattern.append(parts[i])
-
-        for i in range(1, len(parts), 2):
-            numbers.append(float(parts[i]))
-
-        return (pattern, numbers)
-
-    def extract_series_segments(self, data_lines, series_nr):
-        """Yields numbers which form connected multilines on graph
-        Each segment is pair of starting position and numbers"""
-        segment = (0, [])
-        prev_pattern = None
-        for i, (pattern, nums) in enumerate(data_lines):
-            if len(nums) <= series_nr or pattern != prev_pattern:
-                # break the segment
-                if len(segment[1]) > 1:
-                    yield segment
-                segment = (i, [])
-
-            if len(nums) > series_nr:
-                segment[1].append(nums[series_nr])
-
-            prev_pattern = pattern
-
-        if len(segment[1]) > 1:
-            yield segment
-
     def create_text_with_background(
         self, x, y, text, anchor="w", justify="left", background=None, tags=()
     ):
@@ -0,0 +1,114 @@
+"""
+Measures the latency of step_into in the fast debugger while a recursive function keeps
+creating new frames.
+
+Run with: python -m pystart.test.benchmarks.bench_debugger_steps
+"""
+
+import os.path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from pystart.common import (
+    DebuggerCommand,
+    DebuggerResponse,
+    StackDecoder,
+    ToplevelCommand,
+    ToplevelResponse,
+    parse_message,
+    read_one_incoming_message_str,
+    serialize_message,
+)
+
+PROGRAM = '''
+def bench_walk(depth):
+    """Recursive function with a long body, most of which doesn't get executed"""
+    if depth < 0:
+%s
+    if depth > 0:
+        bench_walk(depth - 1)
+    return depth
+
+
+bench_walk(%d)
+'''
+
+BODY_STATEMENT = "        value_%d = depth * %d\n"
+
+
+def run_steps(filename, step_count):
+    import pystart
+
+    launcher = os.path.join(
+        os.path.dirname(pystart.__file__), "plugins", "cpython_backend", "cp_launcher.py"
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-u", launcher, os.path.dirname(filename), "{}"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        encoding="utf-8",
+    )
+    assert proc.stdout.readline().strip() == "OK"
+    decoder = StackDecoder()
+
+    def send(cmd):
+        proc.stdin.write(serialize_message(cmd) + "\n")
+        proc.stdin.flush()
+
+    def wait_for_stop():
+        while True:
+            msg = parse_message(read_one_incoming_message_str(proc.stdout.readline))
+            if isinstance(msg, DebuggerResponse):
+                decoder.decode(msg)
+                return msg
+            elif isinstance(msg, ToplevelResponse):
+                return None
+
+    durations = []
+    try:
+        send(ToplevelCommand("FastDebug", args=[filename], breakpoints={}))
+        msg = wait_for_stop()
+        for _ in range(step_count):
+            if msg is None:
+                break
+            frame = msg["stack"][-1]
+            start_time = time.perf_counter()
+            send(
+                DebuggerCommand(
+                    "step_into",
+                    frame_id=frame.id,
+                    breakpoints={},
+                    state=frame.event,
+                    focus=frame.focus,
+                    exception=None,
+                )
+            )
+            msg = wait_for_stop()
+            durations.append(time.perf_counter() - start_time)
+    finally:
+        proc.kill()
+
+    return durations
+
+
+def main():
+    depth = 300
+    source = PROGRAM % ("".join(BODY_STATEMENT % (i, i) for i in range(200)), depth)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, "bench_program.py")
+        with open(filename, "w", encoding="utf-8") as fp:
+            fp.write(source)
+
+        durations = run_steps(filename, depth * 4)
+
+    print("steps: %d" % len(durations))
+    print("mean step latency:   %6.2f ms" % (statistics.mean(durations) * 1000))
+    print("median step latency: %6.2f ms" % (statistics.median(durations) * 1000))
+
+
+if __name__ == "__main__":
+    main()
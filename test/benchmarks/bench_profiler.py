@@ -0,0 +1,111 @@
+"""
+Measures how much the sampling profiler slows down a CPU-bound program and
+reports the hottest line it found.
+
+Run with: python -m pystart.test.benchmarks.bench_profiler
+"""
+
+import os.path
+import subprocess
+import sys
+import tempfile
+import time
+
+from pystart.common import (
+    BackendEvent,
+    ToplevelCommand,
+    ToplevelResponse,
+    parse_message,
+    read_one_incoming_message_str,
+    serialize_message,
+)
+
+PROGRAM = """
+def bench_collatz_length(n):
+    length = 1
+    while n != 1:
+        n = n // 2 if n %% 2 == 0 else 3 * n + 1
+        length += 1
+    return length
+
+
+def bench_longest_collatz(limit):
+    return max(range(1, limit), key=bench_collatz_length)
+
+
+bench_result = bench_longest_collatz(%d)
+"""
+
+
+def run_command(filename, command_name):
+    import pystart
+
+    launcher = os.path.join(
+        os.path.dirname(pystart.__file__), "plugins", "cpython_backend", "cp_launcher.py"
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-u", launcher, os.path.dirname(filename), "{}"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        encoding="utf-8",
+    )
+    assert proc.stdout.readline().strip() == "OK"
+
+    batches = []
+    try:
+        start_time = time.perf_counter()
+        proc.stdin.write(serialize_message(ToplevelCommand(command_name, args=[filename])) + "\n")
+        proc.stdin.flush()
+        while True:
+            msg = parse_message(read_one_incoming_message_str(proc.stdout.readline))
+            if isinstance(msg, BackendEvent) and msg.event_type == "ProfileSamples":
+                batches.append(msg)
+            elif isinstance(msg, ToplevelResponse):
+                assert "user_exception" not in msg, msg["user_exception"]
+                return time.perf_counter() - start_time, batches
+    finally:
+        proc.kill()
+
+
+def measure(filename, command_name, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        duration, batches = run_command(filename, command_name)
+        best = min(best, duration)
+
+    print("%-8s %8.3f s" % (command_name, best))
+    return best, batches
+
+
+def main():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, "bench_program.py")
+        with open(filename, "w", encoding="utf-8") as fp:
+            fp.write(PROGRAM % 300000)
+
+        baseline, _ = measure(filename, "Run")
+        duration, batches = measure(filename, "Profile")
+
+    print("overhead %8.1f %%" % ((duration / baseline - 1) * 100))
+
+    locations = []
+    line_counts = {}
+    for batch in batches:
+        locations.extend(batch.locations)
+        for stack, count in batch.samples:
+            lineno = locations[stack[-1]][3]
+            line_counts[lineno] = line_counts.get(lineno, 0) + count
+
+    sample_count = sum(line_counts.values())
+    hottest = max(line_counts, key=line_counts.get)
+    print("batches  %8d" % len(batches))
+    print("samples  %8d" % sample_count)
+    print(
+        "hottest line %d with %.1f %% of samples"
+        % (hottest, 100 * line_counts[hottest] / sample_count)
+    )
+
+
+if __name__ == "__main__":
+    main()
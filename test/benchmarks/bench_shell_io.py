@@ -0,0 +1,65 @@
+"""
+Measures the bookkeeping of shell IO events without the text widget.
+
+Events go through the queue like in ShellText._update_visible_io (present mode, one
+event per update). The list based log, which summed the applied events on every update,
+is measured on fewer events, as its cost grows quadratically.
+
+Run with: python -m pystart.test.benchmarks.bench_shell_io
+"""
+
+import time
+
+from pystart.shell import REWINDABLE_IO_EVENTS_LIMIT, IOEventLog
+
+
+def feed_event_log(event_count):
+    log = IOEventLog()
+    for i in range(event_count):
+        log.append("line %d\n" % i, "stdout")
+
+        current_num_visible_chars = log.get_applied_char_count()
+        while log.has_queued():
+            data, stream_name = log.pop_queued()
+            log.add_applied(data, stream_name)
+            current_num_visible_chars += len(data)
+
+        if log.get_rewindable_event_count() > REWINDABLE_IO_EVENTS_LIMIT:
+            log.trim_applied()
+
+    return log.get_applied_char_count()
+
+
+def feed_lists(event_count):
+    applied = []
+    queued = []
+    for i in range(event_count):
+        queued.append(("line %d\n" % i, "stdout"))
+
+        current_num_visible_chars = sum(map(lambda x: len(x[0]), applied))
+        while queued:
+            data, stream_name = queued.pop(0)
+            applied.append((data, stream_name))
+            current_num_visible_chars += len(data)
+
+    return current_num_visible_chars
+
+
+def measure(label, func, event_count):
+    start = time.perf_counter()
+    func(event_count)
+    duration = time.perf_counter() - start
+    print(
+        "%-14s %9d events %8.2f s %10.0f events/s"
+        % (label, event_count, duration, event_count / duration)
+    )
+
+
+def main():
+    measure("IOEventLog", feed_event_log, 1_000_000)
+    for event_count in [10_000, 30_000]:
+        measure("lists", feed_lists, event_count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Compares turning program output into shell IO events with OutputTokenizer and with the
+former regex splitting, which left resolving the styles to the shell. The output resembles
+progress bars of tqdm and pip (rich) and colored pip logs. It is fed in pieces of the
+back-end's output buffer size, so that some escape sequences get split between pieces.
+
+Run with: python -m pystart.test.benchmarks.bench_shell_output
+"""
+
+import re
+import time
+
+from pystart.shell import OUTPUT_SPLIT_REGEX, CursorMove, OutputRun, OutputTokenizer
+
+SQUEEZE_THRESHOLD = 1000
+PIECE_SIZE = 4096
+
+
+def create_tqdm_output(count):
+    parts = []
+    for i in range(count):
+        percent = 100 * i // count
+        bar = "█" * (percent // 5) + " " * (20 - percent // 5)
+        parts.append("\r%3d%%|%s| %d/%d [00:01<00:02, 123.45it/s]" % (percent, bar, i, count))
+    return "".join(parts) + "\n"
+
+
+def create_rich_progress_output(count):
+    parts = []
+    for i in range(count):
+        done = 40 * i // count
+        parts.append(
+            "\r\x1b[2K   \x1b[38;5;197m%s\x1b[0m\x1b[38;5;237m%s\x1b[0m "
+            "\x1b[32m%.1f/12.3 MB\x1b[0m \x1b[31m2.1 MB/s\x1b[0m eta \x1b[36m0:00:%02d\x1b[0m"
+            % ("━" * done, "━" * (40 - done), 12.3 * i / count, (count - i) % 60)
+        )
+    return "\x1b[?25l" + "".join(parts) + "\n\x1b[?25h"
+
+
+def create_pip_log_output(count):
+    parts = []
+    for i in range(count):
+        parts.append("Collecting package-%d\n" % i)
+        parts.append("  Downloading package_%d-1.0-py3-none-any.whl (%d kB)\n" % (i, i % 900))
+        if i % 5 == 0:
+            parts.append(
+                "\x1b[33mWARNING: The script tool-%d is installed in '/home/user/.local/bin' "
+                "which is not on PATH.\x1b[0m\n" % i
+            )
+        if i % 17 == 0:
+            parts.append("\x1b[1;31mERROR: Could not build wheels for package-%d\x1b[0m\n" % i)
+    return "".join(parts)
+
+
+def split_with_regexes(piece):
+    events = []
+    for part in re.split(OUTPUT_SPLIT_REGEX, piece):
+        if part:
+            for block in re.split("(.{%d,})" % (SQUEEZE_THRESHOLD + 1), part):
+                if block:
+                    events.append(block)
+    return events
+
+
+def split_with_tokenizer(pieces):
+    tokenizer = OutputTokenizer()
+    events = []
+    for piece in pieces:
+        events.extend(tokenizer.feed(piece, SQUEEZE_THRESHOLD))
+    events.extend(tokenizer.flush())
+    return events
+
+
+def split_with_regexes_all(pieces):
+    events = []
+    for piece in pieces:
+        events.extend(split_with_regexes(piece))
+    return events
+
+
+def get_shown_text(event):
+    if isinstance(event, OutputRun):
+        return event.text
+    elif isinstance(event, CursorMove):
+        return ""
+    else:
+        return OUTPUT_SPLIT_REGEX.sub("", event)
+
+
+def measure(label, func, pieces, char_count, rounds=5):
+    best = float("inf")
+    events = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        events = func(pieces)
+        best = min(best, time.perf_counter() - start)
+
+    # escape sequences, which ended up in the shell as text
+    broken_count = sum(1 for event in events if "\x1b" in get_shown_text(event))
+    print(
+        "  %-10s %8.1f MB/s %9d events %5d broken escapes"
+        % (label, char_count / best / 1e6, len(events), broken_count)
+    )
+
+
+def main():
+    for name, output in [
+        ("tqdm", create_tqdm_output(100_000)),
+        ("rich progress", create_rich_progress_output(20_000)),
+        ("pip log", create_pip_log_output(20_000)),
+    ]:
+        pieces = [output[i : i + PIECE_SIZE] for i in range(0, len(output), PIECE_SIZE)]
+        print("%s (%.1f MB)" % (name, len(output) / 1e6))
+        measure("regexes", split_with_regexes_all, pieces, len(output))
+        measure("tokenizer", split_with_tokenizer, pieces, len(output))
+
+
+if __name__ == "__main__":
+    main()
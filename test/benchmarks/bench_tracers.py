@@ -0,0 +1,93 @@
+"""
+Measures how much the fast debugger slows down a CPU-bound program
+before it reaches a breakpoint at the end of the program.
+
+Run with: python -m pystart.test.benchmarks.bench_tracers
+(MonitoringTracer needs Python 3.12 or later)
+"""
+
+import os.path
+import sys
+import tempfile
+import time
+
+from pystart.common import BreakpointInfo, DebuggerResponse, ToplevelCommand
+from pystart.plugins.cpython_backend.cp_tracers import FastTracer, MonitoringTracer
+from pystart.test.plugins.fake_backend import FakeBackend
+
+PROGRAM = """
+def bench_collatz_length(n):
+    length = 1
+    while n != 1:
+        n = n // 2 if n %% 2 == 0 else 3 * n + 1
+        length += 1
+    return length
+
+
+def bench_longest_collatz(limit):
+    return max(range(1, limit), key=bench_collatz_length)
+
+
+bench_result = bench_longest_collatz(%d)
+bench_done = True
+"""
+
+
+class BenchmarkBackend(FakeBackend):
+    """Remembers when the program reached the breakpoint"""
+
+    def __init__(self):
+        super().__init__()
+        self.breakpoint_time = None
+
+    def send_message(self, msg):
+        if isinstance(msg, DebuggerResponse) and self.breakpoint_time is None:
+            self.breakpoint_time = time.perf_counter()
+
+    def _export_stack(self, frame, frame_filter):
+        return []
+
+
+def measure(label, tracer_class, source, filename, breakpoint_lineno, rounds=3):
+    best = float("inf")
+    for _ in range(rounds):
+        backend = BenchmarkBackend()
+        start_time = time.perf_counter()
+        if tracer_class is None:
+            exec(compile(source, filename, "exec"), {"__name__": "__main__"})
+            backend.breakpoint_time = time.perf_counter()
+        else:
+            cmd = ToplevelCommand(
+                "FastDebug", breakpoints={filename: {breakpoint_lineno: BreakpointInfo()}}
+            )
+            tracer_class(backend, cmd).execute_source(source, filename, "exec", [])
+        assert backend.breakpoint_time is not None, "breakpoint was not reached"
+        best = min(best, backend.breakpoint_time - start_time)
+
+    print("%-18s %8.3f s" % (label, best))
+    return best
+
+
+def main():
+    source = PROGRAM % 100000
+    breakpoint_lineno = source.splitlines().index("bench_done = True") + 1
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, "bench_program.py")
+        with open(filename, "w", encoding="utf-8") as fp:
+            fp.write(source)
+
+        baseline = measure("without debugger", None, source, filename, breakpoint_lineno)
+        for label, tracer_class in [
+            ("FastTracer", FastTracer),
+            ("MonitoringTracer", MonitoringTracer),
+        ]:
+            if tracer_class is MonitoringTracer and not hasattr(sys, "monitoring"):
+                print("%-18s needs Python 3.12+" % label)
+                continue
+            duration = measure(label, tracer_class, source, filename, breakpoint_lineno)
+            print("%-18s %8.1f x" % ("", duration / baseline))
+
+
+if __name__ == "__main__":
+    main()
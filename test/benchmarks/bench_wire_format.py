@@ -0,0 +1,98 @@
+"""
+Compares encoding and decoding throughput of the text and binary message formats.
+
+Run with: python -m pystart.test.benchmarks.bench_wire_format
+"""
+
+import io
+import time
+
+from pystart.common import (
+    BINARY_WIRE_FORMAT,
+    TEXT_WIRE_FORMAT,
+    BackendEvent,
+    FrameInfo,
+    TextRange,
+    ToplevelResponse,
+    ValueInfo,
+    parse_message,
+    read_one_incoming_message_str,
+    serialize_message,
+)
+
+
+def create_output_messages(count):
+    return [
+        BackendEvent("ProgramOutput", stream_name="stdout", data="line number %d\n" % i)
+        for i in range(count)
+    ]
+
+
+def create_globals_response(global_count):
+    globals_ = {
+        "var_%d" % i: ValueInfo(id=140000000 + i, repr="[%s]" % ", ".join(map(str, range(20))))
+        for i in range(global_count)
+    }
+    stack = [
+        FrameInfo(
+            id=1,
+            filename="/home/user/script.py",
+            module_name="__main__",
+            code_name="<module>",
+            source="x = 1\n" * 200,
+            lineno=10,
+            firstlineno=1,
+            in_library=False,
+            locals=None,
+            globals=globals_,
+            freevars=(),
+            event="line",
+            focus=TextRange(10, 0, 11, 0),
+            node_tags=None,
+            current_statement=None,
+            current_root_expression=None,
+            current_evaluations=None,
+        )
+    ]
+    return ToplevelResponse(command_name="execute_source", globals=globals_, stack=stack)
+
+
+def measure(label, messages, wire_format, rounds=3):
+    best_encode = best_decode = float("inf")
+    total_chars = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        encoded = [serialize_message(msg, wire_format=wire_format) + "\n" for msg in messages]
+        best_encode = min(best_encode, time.perf_counter() - start)
+
+        stream = io.StringIO("".join(encoded))
+        total_chars = len(stream.getvalue())
+        start = time.perf_counter()
+        for _ in messages:
+            parse_message(read_one_incoming_message_str(stream.readline))
+        best_decode = min(best_decode, time.perf_counter() - start)
+
+    print(
+        "%-22s %-6s encode %8.1f msg/s   decode %8.1f msg/s   %6.2f MB on wire"
+        % (
+            label,
+            wire_format,
+            len(messages) / best_encode,
+            len(messages) / best_decode,
+            total_chars / 1024 / 1024,
+        )
+    )
+
+
+def main():
+    scenarios = [
+        ("10000 output events", create_output_messages(10000)),
+        ("50 x 500 globals", [create_globals_response(500) for _ in range(50)]),
+    ]
+    for label, messages in scenarios:
+        for wire_format in [TEXT_WIRE_FORMAT, BINARY_WIRE_FORMAT]:
+            measure(label, messages, wire_format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import sys
+import tempfile
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from pystart.common import DebuggerCommand, DebuggerResponse
+from pystart.plugins.cpython_backend.cp_back import COMPILATION_VERSION, MainCPythonBackend
+from pystart.plugins.cpython_backend.cp_code_cache import CodeCache
+
+
+class FakeBackend:
+    """Provides the parts of MainCPythonBackend which executors and tracers use.
+
+    Sent messages and program output get recorded. When a tracer asks for the next
+    command, the program gets resumed with given breakpoints.
+
+    Compiled code gets cached like in the real back-end. Unless code_cache_dir is given,
+    the disk cache lives in a temporary directory.
+    """
+
+    def __init__(self, breakpoints=None, code_cache_dir=None):
+        self.breakpoints = breakpoints or {}
+        self.messages = []
+        self.output = []
+
+        if code_cache_dir is None:
+            self._code_cache_tempdir = tempfile.TemporaryDirectory()
+            code_cache_dir = self._code_cache_tempdir.name
+        self._compiled_code_cache = OrderedDict()
+        self._compiled_code_disk_cache = CodeCache(code_cache_dir, COMPILATION_VERSION)
+
+    def get_messages(self, msg_class=object, event_type=None):
+        return [
+            msg
+            for msg in self.messages
+            if isinstance(msg, msg_class)
+            and (event_type is None or msg.get("event_type") == event_type)
+        ]
+
+    def get_stops(self):
+        """Returns the innermost frame of each DebuggerResponse, as exported by _export_stack"""
+        return [msg["stack"][-1] for msg in self.get_messages(DebuggerResponse)]
+
+    def send_message(self, msg):
+        self.messages.append(msg)
+
+    def _send_output(self, data, stream_name):
+        self.output.append((stream_name, data))
+
+    def _fetch_next_incoming_message(self):
+        return DebuggerCommand(
+            "resume",
+            state=None,
+            focus=None,
+            frame_id=None,
+            exception=None,
+            breakpoints=self.breakpoints,
+        )
+
+    def _export_stack(self, frame, frame_filter):
+        # a snapshot, as the frame keeps changing
+        return [
+            SimpleNamespace(id=id(frame), lineno=frame.f_lineno, variables=dict(frame.f_locals))
+        ]
+
+    def is_doing_io(self):
+        return False
+
+    def _install_custom_import(self):
+        pass
+
+    _get_compiled_code = MainCPythonBackend._get_compiled_code
+
+    def _prepare_user_exception(self):
+        raise sys.exc_info()[1]
@@ -0,0 +1,74 @@
+import os.path
+import subprocess
+import sys
+
+import pytest
+
+import pystart
+from pystart.common import (
+    BINARY_MESSAGE_MARKER,
+    MESSAGE_MARKER,
+    ToplevelCommand,
+    ToplevelResponse,
+    parse_message,
+    read_one_incoming_message_str,
+    serialize_message,
+)
+
+
+def _run_in_backend(tmp_path, source):
+    """Returns program output and the lines written directly to the back-end's stdout"""
+    launcher = os.path.join(
+        os.path.dirname(pystart.__file__), "plugins", "cpython_backend", "cp_launcher.py"
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-u", launcher, str(tmp_path), "{}"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        encoding="utf-8",
+    )
+    try:
+        assert proc.stdout.readline().strip() == "OK"
+        proc.stdin.write(
+            serialize_message(ToplevelCommand("execute_source", source=source, tty_mode=False))
+            + "\n"
+        )
+        proc.stdin.flush()
+
+        output = ""
+        while True:
+            msg_str = read_one_incoming_message_str(proc.stdout.readline)
+            if msg_str[:1] not in (MESSAGE_MARKER, BINARY_MESSAGE_MARKER):
+                # eg. the output of a subprocess
+                output += msg_str
+                continue
+            msg = parse_message(msg_str)
+            if isinstance(msg, ToplevelResponse):
+                return output
+            elif msg.get("event_type") == "ProgramOutput":
+                output += msg["data"]
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_subprocess_output_follows_flushed_output(tmp_path):
+    source = "import os, sys\nprint('after')\nsys.stdout.flush()\n_ = os.system('echo x')\n"
+    output = _run_in_backend(tmp_path, source)
+    assert output.replace("\r", "") == "after\nx\n"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_does_not_repeat_parent_output(tmp_path):
+    source = (
+        "import os\n"
+        "print('before', end='')\n"
+        "pid = os.fork()\n"
+        "if pid == 0:\n"
+        "    print('child', end='')\n"
+        "    os._exit(0)\n"
+        "_ = os.waitpid(pid, 0)\n"
+        "print('parent')\n"
+    )
+    assert _run_in_backend(tmp_path, source) == "beforechildparent\n"
@@ -0,0 +1,57 @@
+import os
+
+from pystart.plugins.cpython_backend.cp_code_cache import CodeCache
+from pystart.test.plugins.fake_backend import FakeBackend
+
+
+def test_cache_round_trip(tmp_path):
+    cache = CodeCache(str(tmp_path), version=1)
+    key = cache.get_key("x = 1", "a.py")
+
+    assert cache.get(key) is None
+    cache.put(key, (compile("x = 1", "a.py", "exec"), [1, 2]))
+    code, records = cache.get(key)
+    assert records == [1, 2]
+
+    assert cache.get_key("x = 1", "b.py") != key
+    assert cache.get_key("x = 1", "a.py", "repl") != key
+    assert CodeCache(str(tmp_path), version=2).get_key("x = 1", "a.py") != key
+
+
+def test_cache_removes_least_recently_used_entries(tmp_path):
+    cache = CodeCache(str(tmp_path), version=1, max_size=250)
+    keys = [cache.get_key(str(i), "a.py") for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, b"x" * 100)
+        os.utime(os.path.join(str(tmp_path), key + ".marshal"), (i, i))
+
+    cache.get(keys[0])
+    cache.put(keys[2], b"x" * 100)
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_backend_reuses_compiled_code(tmp_path):
+    created = []
+
+    def compile_module(backend, source):
+        def create_code():
+            created.append(source)
+            return compile(source, "prog.py", "exec")
+
+        return backend._get_compiled_code(source, "prog.py", "exec", create_code)
+
+    backend = FakeBackend(code_cache_dir=str(tmp_path))
+    code = compile_module(backend, "x = 1")
+    assert compile_module(backend, "x = 1") is code
+    assert created == ["x = 1"]
+
+    # next Run starts with a new process
+    backend = FakeBackend(code_cache_dir=str(tmp_path))
+    assert compile_module(backend, "x = 1") == code
+    assert created == ["x = 1"]
+
+    compile_module(backend, "x = 2")
+    assert created == ["x = 1", "x = 2"]
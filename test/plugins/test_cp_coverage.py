@@ -0,0 +1,98 @@
+import sys
+
+import pytest
+
+from pystart.common import ToplevelCommand, bitmap_to_lines
+from pystart.plugins.cpython_backend.cp_coverage import (
+    CoverageTracer,
+    MonitoringCoverageTracer,
+    get_coverage_tracer_class,
+)
+from pystart.test.plugins.fake_backend import FakeBackend
+
+PROGRAM = """
+def used(n):
+    total = 0
+    for i in range(n):
+        total += i
+    return total
+
+def unused():
+    return 42
+
+used(5)
+"""
+
+
+@pytest.mark.parametrize(
+    "tracer_class", sorted({CoverageTracer, get_coverage_tracer_class()}, key=str)
+)
+@pytest.mark.parametrize("count_hits", [True, False])
+def test_executed_lines_and_hit_counts(tmp_path, tracer_class, count_hits):
+    path = tmp_path / "covered.py"
+    path.write_text(PROGRAM)
+    filename = str(path)
+
+    backend = FakeBackend()
+    tracer = tracer_class(backend, ToplevelCommand("Coverage", count_hits=count_hits))
+    tracer._main_module_path = filename
+    statements = compile(PROGRAM, filename, "exec")
+    tracer._execute_prepared_user_code(statements, {"__name__": "__main__"})
+
+    (coverage_data,) = backend.get_messages(event_type="CoverageData")
+    data = coverage_data.files[filename]
+    lines = bitmap_to_lines(data["lines"])
+    assert lines == [2, 3, 4, 5, 6, 8, 9, 11]
+    assert bitmap_to_lines(data["executed"]) == [2, 3, 4, 5, 6, 8, 11]
+
+    if count_hits:
+        counts = dict(zip(lines, data["counts"]))
+        assert counts[5] == 5
+        assert counts[9] == 0
+    else:
+        assert data["counts"] is None
+
+
+LOOPS_ON_ONE_LINE = """
+squares = [i * i for i in range(5)]
+total = 0
+for i in range(3): total += i
+while total < 10: total += 1
+"""
+
+
+@pytest.mark.skipif(not hasattr(sys, "monitoring"), reason="sys.monitoring is not available")
+def test_monitoring_counts_like_settrace(tmp_path):
+    path = tmp_path / "loops.py"
+    path.write_text(LOOPS_ON_ONE_LINE)
+    filename = str(path)
+
+    results = []
+    for tracer_class in [CoverageTracer, MonitoringCoverageTracer]:
+        backend = FakeBackend()
+        tracer = tracer_class(backend, ToplevelCommand("Coverage", count_hits=True))
+        tracer._main_module_path = filename
+        statements = compile(LOOPS_ON_ONE_LINE, filename, "exec")
+        tracer._execute_prepared_user_code(statements, {"__name__": "__main__"})
+        (coverage_data,) = backend.get_messages(event_type="CoverageData")
+        results.append(coverage_data.files[filename]["counts"])
+
+    assert results[0] == results[1]
+
+
+@pytest.mark.skipif(not hasattr(sys, "monitoring"), reason="sys.monitoring is not available")
+def test_monitoring_records_lines_disabled_in_previous_run(tmp_path):
+    path = tmp_path / "covered.py"
+    path.write_text(PROGRAM)
+    filename = str(path)
+    statements = compile(PROGRAM, filename, "exec")
+
+    for _ in range(2):
+        backend = FakeBackend()
+        tracer = MonitoringCoverageTracer(backend, ToplevelCommand("Coverage", count_hits=False))
+        tracer._main_module_path = filename
+        tracer._execute_prepared_user_code(statements, {"__name__": "__main__"})
+
+        (coverage_data,) = backend.get_messages(event_type="CoverageData")
+        executed = bitmap_to_lines(coverage_data.files[filename]["executed"])
+        assert executed == [2, 3, 4, 5, 6, 8, 11]
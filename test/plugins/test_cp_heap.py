@@ -0,0 +1,109 @@
+import gc
+
+from pystart.plugins.cpython_backend.cp_heap import HEAP_KEEP_GENERATIONS, ObjectHeap
+
+
+class Item:
+    pass
+
+
+def test_old_objects_get_released():
+    heap = ObjectHeap()
+    kept_elsewhere = Item()
+    heap[id(kept_elsewhere)] = kept_elsewhere
+    only_in_heap = Item()
+    only_in_heap_id = id(only_in_heap)
+    heap[only_in_heap_id] = only_in_heap
+    del only_in_heap
+
+    for _ in range(HEAP_KEEP_GENERATIONS):
+        heap.end_generation()
+    assert only_in_heap_id in heap
+
+    heap.end_generation()
+    gc.collect()
+    assert only_in_heap_id not in heap
+    # still alive, so still reachable via weak reference
+    assert heap[id(kept_elsewhere)] is kept_elsewhere
+    assert heap.get_stats()["strong_count"] == 1
+
+
+def test_inspector_history_stays_pinned():
+    heap = ObjectHeap()
+    visited = [1, 2, 3]
+    heap[id(visited)] = visited
+    heap.set_history_ids([id(visited)])
+    del visited
+
+    for _ in range(HEAP_KEEP_GENERATIONS + 2):
+        heap.end_generation()
+    gc.collect()
+    assert heap.get_stats()["strong_count"] == 1
+
+    heap.set_history_ids([])
+    heap.end_generation()
+    assert heap.get_stats()["strong_count"] == 0
+
+
+def test_old_repl_value_link_still_works(tmp_path):
+    import os.path
+    import re
+    import subprocess
+    import sys
+
+    import pystart
+    from pystart.common import (
+        OBJECT_LINK_START,
+        InlineCommand,
+        InlineResponse,
+        ToplevelCommand,
+        ToplevelResponse,
+        parse_message,
+        read_one_incoming_message_str,
+        serialize_message,
+    )
+
+    launcher = os.path.join(
+        os.path.dirname(pystart.__file__), "plugins", "cpython_backend", "cp_launcher.py"
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-u", launcher, str(tmp_path), "{}"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        encoding="utf-8",
+    )
+
+    def send(cmd):
+        proc.stdin.write(serialize_message(cmd) + "\n")
+        proc.stdin.flush()
+
+    def wait_for(msg_class):
+        output = ""
+        while True:
+            msg = parse_message(read_one_incoming_message_str(proc.stdout.readline))
+            if isinstance(msg, msg_class):
+                return msg, output
+            elif msg.get("event_type") == "ProgramOutput":
+                output += msg["data"]
+
+    try:
+        assert proc.stdout.readline().strip() == "OK"
+
+        send(ToplevelCommand("execute_source", source="[1, 2, 3]", tty_mode=False))
+        _, output = wait_for(ToplevelResponse)
+        link_regex = re.escape(OBJECT_LINK_START).replace("%d", r"(\d+)")
+        list_id = int(re.search(link_regex, output).group(1))
+
+        for i in range(2 * HEAP_KEEP_GENERATIONS + 1):
+            send(ToplevelCommand("execute_source", source="x = %d" % i, tty_mode=False))
+            wait_for(ToplevelResponse)
+
+        # click on the link
+        send(InlineCommand("get_object_info", object_id=list_id, include_attributes=False))
+        response, _ = wait_for(InlineResponse)
+        assert "error" not in response["info"]
+        assert response["info"]["repr"] == "[1, 2, 3]"
+    finally:
+        proc.kill()
+        proc.wait()
@@ -0,0 +1,47 @@
+import tracemalloc
+
+from pystart.plugins.cpython_backend.cp_memory import MemoryTracker
+
+PROGRAM = """
+kept = []
+
+def grow(n):
+    for i in range(n):
+        kept.append(bytearray(1000))
+"""
+
+
+def test_growth_is_attributed_to_user_lines(tmp_path):
+    path = tmp_path / "growing.py"
+    path.write_text(PROGRAM)
+    filename = str(path)
+    global_vars = {"__name__": "growing"}
+    exec(compile(PROGRAM, filename, "exec"), global_vars)
+
+    tracker = MemoryTracker()
+    tracker.start()
+    try:
+        global_vars["grow"](10)
+        first = tracker.create_snapshot_event()
+        global_vars["grow"](20)
+        second = tracker.create_snapshot_event()
+    finally:
+        tracker.stop()
+
+    assert not tracemalloc.is_tracing()
+    assert filename in first.filenames
+
+    file_index = second.filenames.index(filename)
+    growth = {
+        lineno: (size_diff, count_diff)
+        for index, lineno, size_diff, count_diff in second.growth_lines
+        if index == file_index
+    }
+    size_diff, count_diff = growth[6]
+    assert count_diff >= 20
+    assert size_diff >= 20 * 1000
+
+    sizes = {
+        lineno: size for index, lineno, size, count in second.top_lines if index == file_index
+    }
+    assert sizes[6] >= 30 * 1000
@@ -0,0 +1,47 @@
+from pystart.common import ToplevelCommand
+from pystart.plugins.cpython_backend.cp_profiler import SamplingProfiler
+from pystart.test.plugins.fake_backend import FakeBackend
+
+PROGRAM = """
+import time
+
+def spin(seconds):
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time:
+        pass
+
+spin(0.3)
+"""
+
+
+def test_samples_are_aggregated_by_stack(tmp_path):
+    filename = str(tmp_path / "spinner.py")
+    backend = FakeBackend()
+    profiler = SamplingProfiler(backend, ToplevelCommand("Profile"))
+    statements = compile(PROGRAM, filename, "exec")
+    profiler._execute_prepared_user_code(statements, {"__name__": "__main__"})
+
+    locations = []
+    stack_counts = {}
+    batches = backend.get_messages(event_type="ProfileSamples")
+    assert len(batches) == len(backend.messages)
+    for batch in batches:
+        locations.extend(batch.locations)
+        for stack, count in batch.samples:
+            stack_counts[stack] = stack_counts.get(stack, 0) + count
+
+    # each location is sent only once
+    assert len(set(locations)) == len(locations)
+    assert sum(batch.duration for batch in batches) >= 0.3
+
+    # stacks are rooted at the module and the profiler's own frames are not included
+    for stack in stack_counts:
+        assert locations[stack[0]][:3] == (filename, 1, "<module>")
+        assert all(locations[i][0] == filename for i in stack)
+
+    spinning_count = sum(
+        count
+        for stack, count in stack_counts.items()
+        if len(stack) == 2 and locations[stack[-1]][2] == "spin"
+    )
+    assert spinning_count > 0.8 * sum(stack_counts.values())
@@ -0,0 +1,36 @@
+from pystart.plugins.cpython_backend.cp_repr import TRUNCATION_MARKER, bounded_repr
+
+
+def test_bounded_repr_matches_repr():
+    recursive = [1, 2]
+    recursive.append(recursive)
+    for value in [
+        "abc",
+        b"abc",
+        (1,),
+        (),
+        set(),
+        {1, 2},
+        frozenset([3]),
+        {"a": [1, (2, 3)], "b": {}},
+        recursive,
+        None,
+    ]:
+        assert bounded_repr(value, 1000) == repr(value)
+
+
+def test_bounded_repr_truncates_big_values():
+    big_list = list(range(10_000_000))
+    assert bounded_repr(big_list, 20) == repr(big_list[:20])[:20] + TRUNCATION_MARKER
+    assert bounded_repr("x" * 10_000_000, 5) == "'xxxx" + TRUNCATION_MARKER
+
+
+def test_bounded_repr_falls_back_to_summary():
+    class Slow:
+        def __repr__(self):
+            import time
+
+            time.sleep(0.001)
+            return "Slow()"
+
+    assert bounded_repr([Slow()] * 1000, 100000, 0.01) == "<list object with 1000 items>"
@@ -0,0 +1,136 @@
+import pytest
+
+from pystart.common import BreakpointInfo, DebuggerCommand, ToplevelCommand
+from pystart.plugins.cpython_backend.cp_tracers import (
+    FastTracer,
+    StateHistory,
+    get_fast_tracer_class,
+)
+from pystart.test.plugins.fake_backend import FakeBackend
+
+
+def test_history_forgets_oldest_states():
+    history = StateHistory(memory_limit=250)
+    for i in range(10):
+        history.append({"index": i}, 100)
+
+    assert len(history) == 10
+    assert history.first_index == 8
+    assert history[-1]["index"] == 9
+    assert history[8]["index"] == 8
+    with pytest.raises(IndexError):
+        history[7]
+
+    info = history.get_info()
+    assert info["state_count"] == 2
+    assert info["dropped_state_count"] == 8
+    assert info["estimated_memory"] == 200
+
+
+def test_history_keeps_last_state_over_limit():
+    history = StateHistory(memory_limit=10)
+    history.append({"index": 0}, 100)
+    history.append({"index": 1}, 100)
+
+    assert history.first_index == 1
+    assert history[1]["index"] == 1
+
+
+@pytest.mark.parametrize(
+    "tracer_class", sorted({FastTracer, get_fast_tracer_class()}, key=str)
+)
+def test_conditional_breakpoints_and_logpoints(tmp_path, tracer_class):
+    source = "for i in range(10):\n    x = i\n    y = i\n"
+    filename = str(tmp_path / "prog.py")
+    with open(filename, "w", encoding="utf-8") as fp:
+        fp.write(source)
+
+    backend = FakeBackend(
+        {
+            filename: {
+                2: BreakpointInfo(condition="i % 2 == 1", hit_count=2),
+                3: BreakpointInfo(log_message="i={i}", condition="i > 7"),
+            }
+        }
+    )
+    cmd = ToplevelCommand("FastDebug", breakpoints=backend.breakpoints)
+    tracer_class(backend, cmd).execute_source(source, filename, "exec", [])
+
+    assert [stop.variables["i"] for stop in backend.get_stops()] == [3, 5, 7, 9]
+    assert backend.output == [("stdout", "i=8\n"), ("stdout", "i=9\n")]
+
+
+@pytest.mark.parametrize(
+    "tracer_class", sorted({FastTracer, get_fast_tracer_class()}, key=str)
+)
+def test_logpoint_with_both_kinds_of_quotes(tmp_path, tracer_class):
+    source = "d = {'k': 'x'}\ny = 1\n"
+    filename = str(tmp_path / "prog.py")
+    with open(filename, "w", encoding="utf-8") as fp:
+        fp.write(source)
+
+    backend = FakeBackend({filename: {2: BreakpointInfo(log_message="""{d['k']!r:>5} said "hi\"""")}})
+    cmd = ToplevelCommand("FastDebug", breakpoints=backend.breakpoints)
+    tracer_class(backend, cmd).execute_source(source, filename, "exec", [])
+
+    assert backend.get_stops() == []
+    assert backend.output == [("stdout", """  'x' said "hi"\n""")]
+
+
+class SteppingBackend(FakeBackend):
+    def __init__(self, breakpoints, command_names):
+        super().__init__(breakpoints)
+        self.command_names = list(command_names)
+
+    def _fetch_next_incoming_message(self):
+        return DebuggerCommand(
+            self.command_names.pop(0),
+            state=None,
+            focus=None,
+            frame_id=self.get_stops()[-1].id,
+            exception=None,
+            breakpoints=self.breakpoints,
+        )
+
+
+@pytest.mark.parametrize(
+    "tracer_class", sorted({FastTracer, get_fast_tracer_class()}, key=str)
+)
+def test_logpoint_on_the_line_where_step_over_completes(tmp_path, tracer_class):
+    source = "for i in range(3):\n    x = i\n    y = i\n"
+    filename = str(tmp_path / "prog.py")
+    with open(filename, "w", encoding="utf-8") as fp:
+        fp.write(source)
+
+    backend = SteppingBackend(
+        {
+            filename: {
+                2: BreakpointInfo(condition="i == 0"),
+                3: BreakpointInfo(log_message="y={i}"),
+            }
+        },
+        ["step_over", "resume"],
+    )
+    cmd = ToplevelCommand("FastDebug", breakpoints=backend.breakpoints)
+    tracer_class(backend, cmd).execute_source(source, filename, "exec", [])
+
+    assert [stop.lineno for stop in backend.get_stops()] == [2, 3]
+    assert backend.output == [("stdout", "y=%d\n" % i) for i in range(3)]
+
+
+@pytest.mark.parametrize(
+    "tracer_class", sorted({FastTracer, get_fast_tracer_class()}, key=str)
+)
+def test_step_into_and_out_of_function(tmp_path, tracer_class):
+    source = "def f(a):\n    b = a + 1\n    return b\n\nx = f(1)\ny = x\n"
+    filename = str(tmp_path / "prog.py")
+    with open(filename, "w", encoding="utf-8") as fp:
+        fp.write(source)
+
+    backend = SteppingBackend(
+        {filename: {5: BreakpointInfo()}}, ["step_into", "step_out", "resume"]
+    )
+    cmd = ToplevelCommand("FastDebug", breakpoints=backend.breakpoints)
+    tracer_class(backend, cmd).execute_source(source, filename, "exec", [])
+
+    assert [stop.lineno for stop in backend.get_stops()] == [5, 2, 6]
@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 from pystart.common import path_startswith
 
 
@@ -31,3 +33,86 @@ def test_path_startswith():
         assert path_startswith("c:\\foo\\bar.txt/kala\\pala", "C:\\")
 
         assert not path_startswith("C:\\kalapala\\pala", "C:\\kala")
+
+
+def test_binary_message_roundtrip():
+    import io
+
+    from pystart.common import (
+        BINARY_WIRE_FORMAT,
+        FrameInfo,
+        OscEvent,
+        TextRange,
+        ToplevelResponse,
+        ValueInfo,
+        parse_message,
+        read_one_incoming_message_str,
+        serialize_message,
+    )
+
+    msg = ToplevelResponse(
+        globals={"x": ValueInfo(1, "'" + "a" * 1000 + "'")},
+        focus=TextRange(1, 2, 3, 4),
+        frame=FrameInfo(*range(17)),
+        tricky_tuple=(b"\x00R", "not a record"),
+        ids={1, 2, 3},
+    )
+    msg_str = serialize_message(msg, max_line_length=100, wire_format=BINARY_WIRE_FORMAT)
+    assert msg_str.count("\n") > 1
+
+    reader = io.StringIO(msg_str + "\n" + serialize_message(OscEvent("title")) + "\n").readline
+    assert parse_message(read_one_incoming_message_str(reader)) == msg
+    assert parse_message(read_one_incoming_message_str(reader)).text == "title"
+
+    for empty in ["", "\n"]:
+        with pytest.raises(ValueError):
+            parse_message(empty)
+
+
+def test_stack_delta_roundtrip():
+    from pystart.common import (
+        BINARY_WIRE_FORMAT,
+        DebuggerResponse,
+        FrameInfo,
+        StackDecoder,
+        StackEncoder,
+        ValueInfo,
+        parse_message,
+        serialize_message,
+    )
+
+    def frame(frame_id, lineno, locals_, globals_):
+        return FrameInfo(
+            frame_id, __file__, "__main__", "f", "source %d" % frame_id, lineno, frame_id, False,
+            locals_, globals_, (), "line", None, None, None, None, None,
+        )  # fmt: skip
+
+    big_globals = {"g%d" % i: ValueInfo(i, repr(i)) for i in range(1000)}
+    changed_globals = dict(big_globals, g0=ValueInfo(-1, "-1"))
+    del changed_globals["g1"]
+    stacks = [
+        [frame(1, 1, None, big_globals)],
+        [frame(1, 2, None, big_globals), frame(2, 5, {"x": ValueInfo(5, "5")}, big_globals)],
+        [frame(1, 2, None, big_globals), frame(2, 6, {"y": ValueInfo(6, "6")}, big_globals)],
+        [frame(1, 2, None, changed_globals), frame(3, 5, {}, changed_globals)],
+    ]
+
+    encoder = StackEncoder()
+    decoder = StackDecoder()
+    sizes = []
+    for stack in stacks:
+        msg_str = serialize_message(
+            DebuggerResponse(stack=list(stack)), wire_format=BINARY_WIRE_FORMAT
+        )
+        encoded = DebuggerResponse(stack=list(stack))
+        encoder.encode(encoded)
+        encoded_str = serialize_message(encoded, wire_format=BINARY_WIRE_FORMAT)
+        sizes.append((len(msg_str), len(encoded_str)))
+
+        decoded = parse_message(encoded_str)
+        decoder.decode(decoded)
+        assert decoded == DebuggerResponse(stack=stack)
+
+    # unchanged frames and globals are not sent again
+    assert sizes[1][1] < sizes[1][0] / 10
+    assert sizes[2][1] < sizes[2][0] / 10
@@ -0,0 +1,51 @@
+import threading
+import time
+
+from pystart.common import BackendEvent, InlineResponse, ToplevelResponse
+from pystart.running import BackendMessageQueue
+
+
+def _output(data, stream_name="stdout"):
+    return BackendEvent("ProgramOutput", stream_name=stream_name, data=data)
+
+
+def test_message_queue_ordering():
+    arrivals = []
+    queue = BackendMessageQueue(lambda: arrivals.append(True))
+    queue.put(_output("a"))
+    queue.put(_output("b"))
+    queue.put(InlineResponse(command_name="get_globals"))
+    queue.put(ToplevelResponse(command_name="execute_source"))
+    queue.put(_output("c"))
+
+    # inline response overtakes output, prompt waits for preceding output
+    assert isinstance(queue.get(), InlineResponse)
+    assert queue.get()["data"] == "ab"
+    assert isinstance(queue.get(), ToplevelResponse)
+    assert queue.get()["data"] == "c"
+    assert queue.get() is None
+    assert queue.get_stats()["merged"] == 1
+
+    # listener is notified only when queue stops being empty
+    assert len(arrivals) == 1
+    queue.put(_output("d"))
+    assert len(arrivals) == 2
+
+
+def test_message_queue_backpressure():
+    queue = BackendMessageQueue(max_output_messages=2)
+    queue.put(_output("a"))
+    queue.put(_output("b", "stderr"))
+
+    def write():
+        queue.put(_output("c"))
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    assert thread.is_alive()
+
+    assert queue.get()["data"] == "a"
+    thread.join(1)
+    assert not thread.is_alive()
+    assert queue.get_stats()["blocked_count"] == 1
@@ -0,0 +1,191 @@
+import io
+
+from pystart.shell import (
+    SCROLLBACK_CHUNK_SIZE,
+    IOEventLog,
+    CursorMove,
+    LanguageServerContext,
+    OutputRun,
+    OutputTokenizer,
+    PlotSeriesBuffer,
+    ScrollbackStore,
+)
+
+
+def test_io_event_log_replays_and_trims():
+    log = IOEventLog()
+    for data in ["ab", "cde", "f"]:
+        log.append(data, "stdout")
+
+    log.add_applied(*log.pop_queued())
+    log.add_applied(*log.pop_queued())
+    assert log.get_applied_char_count() == 5
+
+    log.requeue_applied()
+    assert log.get_applied_char_count() == 0
+    assert [log.pop_queued()[0] for _ in range(3)] == ["ab", "cde", "f"]
+    assert not log.has_queued()
+
+    log.add_applied("ab", "stdout")
+    log.trim_applied()
+    log.add_applied("cde", "stdout")
+    assert log.has_applied()
+    assert log.get_rewindable_event_count() == 1
+    assert log.get_applied_char_count() == 5
+
+    log.requeue_applied()
+    assert log.get_applied_char_count() == log.get_trimmed_char_count() == 2
+    assert log.pop_queued() == ("cde", "stdout")
+
+
+def test_scrollback_moves_old_chunks_to_disk_and_forgets_them():
+    store = ScrollbackStore()
+    store.set_budgets(memory_budget=SCROLLBACK_CHUNK_SIZE, disk_budget=10 * SCROLLBACK_CHUNK_SIZE)
+    blocks = [
+        "".join("block %d line %d %r\n" % (i, j, j * 7919) for j in range(3000)) for i in range(60)
+    ]
+    for block in blocks:
+        store.push(block)
+
+    assert 0 < store.get_line_count() < 60 * 3000
+    assert store.find("block 59 line 2999") == 1
+    assert store.find("BLOCK 0 LINE 0", nocase=True) is None
+
+    popped = []
+    while True:
+        text = store.pop()
+        if text is None:
+            break
+        popped.insert(0, text)
+
+    assert store.get_line_count() == 0
+    restored = "".join(popped)
+    assert blocks[-1] in restored
+    assert "".join(blocks).endswith(restored)
+
+
+def test_output_tokenizer_keeps_escapes_split_between_chunks():
+    tokenizer = OutputTokenizer()
+    assert tokenizer.feed("\x1b[1m\x1b[3", 1000) == [
+        OutputRun("", ("bright_fore_fg", "intense_io"), hidden=[(0, 4)], hidden_length=4)
+    ]
+    assert tokenizer.feed("1mred\x1b[0m\rdone\x1b]0;title\x1b", 1000) == [
+        OutputRun("red", ("bright_red_fg", "intense_io"), hidden=[(0, 5), (3, 4)], hidden_length=9),
+        CursorMove("line", "\r"),
+        OutputRun("done"),
+    ]
+    assert tokenizer.feed("\\", 1000) == ["\x1b]0;title\x1b\\"]
+    assert tokenizer.feed("\x1b[3D\x1b[", 1000) == [CursorMove(-3, "\x1b[3D")]
+    assert tokenizer.flush() == [OutputRun("\x1b[")]
+
+
+def test_output_tokenizer_merges_runs_of_equal_style():
+    tokenizer = OutputTokenizer()
+    data = "a\x1b[31mred\x1b[0m\x1b[31m more\x1b[0m\nplain"
+    events = tokenizer.feed(data, 1000)
+    assert [(event.text, event.tags) for event in events] == [
+        ("a", ()),
+        ("red more", ("red_fg",)),
+        ("\nplain", ()),
+    ]
+    # consumed sequences are counted, so that debugger's character counts stay valid
+    assert sum(len(event) for event in events) == len(data)
+
+    head, tail = events[1].split(5)
+    assert (head.text, head.hidden) == ("red", [(3, 2)])
+    assert (tail.text, tail.hidden) == (" more", [(0, 2), (0, 5), (5, 4)])
+    assert len(tail) == len(events[1]) - 5
+
+    events = OutputTokenizer(styled=False).feed("\x1b[31mx\x1b[0m", 1000)
+    assert [(event.text, event.tags, len(event)) for event in events] == [("x", (), 10)]
+
+    events = tokenizer.feed("x" * 5 + "\n" + "y" * 20 + "\nz", 10)
+    assert [(event.text, event.squeeze) for event in events] == [
+        ("xxxxx\n", False),
+        ("y" * 20, True),
+        ("\nz", False),
+    ]
+
+
+def test_plot_series_buffer_keeps_newest_points_and_decimates():
+    series = PlotSeriesBuffer(8)
+    series.feed("x=1 y=")
+    series.feed("5\nhello\n\nx=2 y=3\n")
+    series.feed("progress 10\r")
+    series.discard_partial_line()
+    series.feed("x=3 y=4\nx=4 y=1\nx=5")
+    series.finish_line()
+
+    assert series.get_start() == 0
+    assert series.get_end() == 6
+    assert series.get_point(1) == (None, ())
+    assert series.get_legend(series.get_end()) == ["x=", " y=", ""]
+    assert series.get_value_range(0, 6) == (1.0, 5.0)
+
+    # the break and the pattern change split the series
+    assert series.get_decimated_runs(1, 0, 6, 1) == [[(2, 3.0), (3, 4.0), (4, 1.0)]]
+    assert series.get_decimated_runs(0, 0, 6, 2) == [[(1, 2.0), (1, 3.0), (2, 4.0)]]
+
+    for i in range(10):
+        series.feed("%d\n" % (i * i))
+    assert series.get_end() - series.get_start() == 8
+    assert series.get_decimated_runs(0, series.get_start(), series.get_end(), 4) == [
+        [(2, 4.0), (2, 25.0), (3, 36.0), (3, 81.0)]
+    ]
+
+    fp = io.StringIO()
+    series.write_csv(fp)
+    rows = fp.getvalue().splitlines()
+    assert rows[0] == "index,label,value_1,value_2"
+    assert rows[-1] == "15,{},81.0"
+
+
+def test_plot_series_snapshot_keeps_points_overwritten_in_buffer():
+    series = PlotSeriesBuffer(4)
+    series.feed("".join("%d\n" % i for i in range(4)))
+    snapshot = series.copy()
+
+    series.feed("".join("%d\n" % i for i in range(10, 20)))
+    series.set_capacity(2)
+
+    assert (snapshot.get_start(), snapshot.get_end()) == (0, 4)
+    assert snapshot.get_value_range(0, 4) == (0.0, 3.0)
+    assert snapshot.get_decimated_runs(0, 0, 4, 1) == [[(0, 0.0), (1, 1.0), (2, 2.0), (3, 3.0)]]
+    assert series.get_value_range(series.get_start(), series.get_end()) == (18.0, 19.0)
+
+
+def test_language_server_context_keeps_relevant_bindings():
+    context = LanguageServerContext(200)
+    context.add_source("import os, json as js\nx = 1\nprint(x)\n")
+    context.add_source("@decorator\ndef f(a):\n    y = a\n    return y\n")
+    context.add_source("for i in range(3): pass\nx = 2; z = [n for n in 'ab']\n")
+    context.add_source("this is not python")
+    assert context.get_lines() == [
+        "import os, json as js\n",
+        "@decorator\n",
+        "def f(a):\n",
+        "    y = a\n",
+        "    return y\n",
+        "for i in range(3): pass\n",
+        "x = 2; z = [n for n in 'ab']\n",
+    ]
+
+    context.retain_names({"os", "js", "x", "z"})
+    assert context.get_lines() == ["import os, json as js\n", "x = 2; z = [n for n in 'ab']\n"]
+
+    # oldest non-imports go first
+    for i in range(20):
+        context.add_source("value_%d = %d\n" % (i, i))
+    assert context.get_size() <= 200
+    assert context.get_lines()[0] == "import os, json as js\n"
+    assert context.get_lines()[-1] == "value_19 = 19\n"
+
+
+def test_scrollback_finds_text_split_between_chunks():
+    store = ScrollbackStore()
+    store.set_budgets(memory_budget=SCROLLBACK_CHUNK_SIZE, disk_budget=10 * SCROLLBACK_CHUNK_SIZE)
+    store.push("x" * (SCROLLBACK_CHUNK_SIZE - 2) + "needle" + "y" * 10 + "\n")
+    store.push("last line\n")
+
+    assert store.find("NEEDLE", nocase=True) == 2
+    assert store.find("needles") is None
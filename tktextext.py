@@ -8,6 +8,7 @@ from logging import getLogger
 from tkinter import TclError
 from tkinter import font as tkfont
 from tkinter import ttk
+from typing import Dict, Optional
 
 logger = getLogger(__name__)
 
@@ -907,8 +908,13 @@ class TextFrame(tk.Frame):
         super().destroy()
 
 
+# Gutter backgrounds for lines which didn't run and for increasingly hotter lines
+GUTTER_COLD_COLOR = "#f4c4c0"
+GUTTER_HEAT_COLORS = ["#d6edc8", "#e8f0b2", "#f7e7a1", "#fbd08a", "#f8ac6c"]
+
+
 class EnhancedTextFrame(TextFrame):
-    "Adds line numbers and print margin"
+    "Adds line numbers, print margin and optional heat map of lines"
 
     def __init__(
         self,
@@ -979,6 +985,11 @@ class EnhancedTextFrame(TextFrame):
         # need tags for justifying and rmargin
         self._gutter.tag_configure("content", justify="right", rmargin=3)
 
+        self._gutter_heat: Dict[int, Optional[float]] = {}
+        self._gutter.tag_configure("heat_cold", background=GUTTER_COLD_COLOR, foreground="#333333")
+        for i, color in enumerate(GUTTER_HEAT_COLORS):
+            self._gutter.tag_configure("heat_%d" % i, background=color, foreground="#333333")
+
         # gutter will be gridded later
         assert first_line_number is not None
         self._first_line_number = first_line_number
@@ -1093,6 +1104,30 @@ class EnhancedTextFrame(TextFrame):
         elif text_line_count > 998:
             self._gutter.configure(width=6)
 
+        if self._gutter_heat and (clean or text_line_count != gutter_line_count):
+            self._update_gutter_heat()
+
+    def set_gutter_heat(self, heat: Dict[int, Optional[float]]) -> None:
+        """Paints the gutter of given line numbers. None means the line didn't run,
+        a number between 0.0 and 1.0 tells how hot the line was."""
+        if heat or self._gutter_heat:
+            self._gutter_heat = heat
+            self._update_gutter_heat()
+
+    def _update_gutter_heat(self):
+        for tag in ["heat_cold"] + ["heat_%d" % i for i in range(len(GUTTER_HEAT_COLORS))]:
+            self._gutter.tag_remove(tag, "1.0", "end")
+
+        for lineno, value in self._gutter_heat.items():
+            if value is None:
+                tag = "heat_cold"
+            else:
+                level = min(int(value * len(GUTTER_HEAT_COLORS)), len(GUTTER_HEAT_COLORS) - 1)
+                tag = "heat_%d" % level
+            # including the newline paints the whole width of the gutter
+            start = "%d.0" % (lineno - self._first_line_number + 1)
+            self._gutter.tag_add(tag, start, start + " +1 lines")
+
     def _update_gutter_active_line(self):
         self._gutter.tag_remove("active", "1.0", "end")
         insert = self.text.index("insert")